@@ -48,8 +48,9 @@ def possible_files(dirpath, possible_file_test):
 
 
 def is_possible_data_file(p):
-    # Retain files that are neither zip nor .gitignore
-    return p.is_file() and p.suffix != '.zip' and p.suffix != '.csv' and not p.stem.startswith('.')
+    # Retain files that are neither zip nor .gitignore, nor time indexes
+    return p.is_file() and p.suffix != '.zip' and p.suffix != '.csv' \
+        and p.suffix != '.timeindex' and not p.stem.startswith('.')
 
 
 def is_possible_dbc_file(p):
@@ -0,0 +1,137 @@
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from time import perf_counter
+
+import main
+from dbc_cache import load_dbc
+from autofile import *
+
+# DBC shared by all the files exported by a worker process
+worker_dbc = None
+
+
+def initialize_worker(dbc_file):
+    # The DBC is loaded once per worker process rather than once per file,
+    # from the cache filled by run_batch when enabled
+    global worker_dbc
+    with contextlib.redirect_stdout(io.StringIO()):
+        worker_dbc = load_dbc(dbc_file, main.DBC_CACHE_DIR)
+
+
+def export_batch_file(data_file, output_dir, stream_dir):
+    # The console output of each export is kept in its own log file, since
+    # the exports running in parallel would otherwise be interleaved
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    with open(Path(output_dir, 'export.log'), 'w') as log, contextlib.redirect_stdout(log):
+        try:
+            summary = main.export_file(data_file, worker_dbc, output_dir,
+                                       stream_dir=stream_dir, show_progress=False,
+                                       blf_workers=1)
+            summary['status'] = 'ok'
+        except Exception as e:
+            print(f'> Export failed: {e!r}')
+            summary = {'data_file': str(data_file), 'status': 'failed', 'error': repr(e)}
+
+    summary['output_dir'] = str(output_dir)
+    return summary
+
+
+def find_data_files(pattern):
+    if Path(pattern).is_dir():
+        files = possible_files(pattern, is_possible_data_file)
+    else:
+        files = [Path(p) for p in glob.glob(pattern, recursive=True)]
+        files = [p for p in files if is_possible_data_file(p)]
+    return sorted(files)
+
+
+def output_dirs(data_files, output_dir):
+    # Each file is exported into a subdirectory named after it, with a suffix
+    # for files having the same name in different directories
+    dirs = []
+    used = set()
+    for data_file in data_files:
+        name = data_file.name
+        index = 1
+        while name in used:
+            index += 1
+            name = f'{data_file.name}_{index}'
+        used.add(name)
+        dirs.append(Path(output_dir, name))
+    return dirs
+
+
+def run_batch(pattern, dbc_file, output_dir, workers=None, stream_dir=None):
+    data_files = find_data_files(pattern)
+    print(f'> Found {len(data_files)} data file(s) matching {pattern}')
+    if not data_files:
+        return None
+
+    workers = workers or min(len(data_files), os.cpu_count() or 1)
+    print(f'> Exporting with {workers} worker process(es), DBC file: {dbc_file}')
+
+    jobs = []
+    for data_file, file_output_dir in zip(data_files, output_dirs(data_files, output_dir)):
+        file_stream_dir = Path(stream_dir, file_output_dir.name) if stream_dir else None
+        jobs.append((data_file, file_output_dir, file_stream_dir))
+
+    time_start = perf_counter()
+    if main.DBC_CACHE_DIR is not None:
+        # Parsed once here if needed, rather than by every worker at once
+        load_dbc(dbc_file, main.DBC_CACHE_DIR)
+    summaries = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker,
+                             initargs=(str(dbc_file),)) as executor:
+        futures = {executor.submit(export_batch_file, *job): job[0] for job in jobs}
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries[futures[future]] = summary
+            print(f'> [{len(summaries)}/{len(jobs)}] {summary["status"]}: {futures[future]}')
+    time_stop = perf_counter()
+
+    files = [summaries[data_file] for data_file in data_files]
+    failed_count = sum(1 for summary in files if summary['status'] != 'ok')
+    report = {
+        'dbc_file': str(dbc_file),
+        'workers': workers,
+        'elapsed_time': time_stop - time_start,
+        'file_count': len(files),
+        'failed_count': failed_count,
+        'total_frame_count': sum(summary.get('total_frame_count', 0) for summary in files),
+        'files': files,
+    }
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    summary_path = Path(output_dir, 'summary.json')
+    with open(summary_path, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    print(f'> Exported {len(files) - failed_count}/{len(files)} file(s) in {round(time_stop - time_start)}s')
+    print(f'> Batch summary written to: {os.path.abspath(summary_path)}')
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Export several CAN log files in parallel, one process per file.')
+    parser.add_argument('data', nargs='?', default=main.DATA_DIR,
+                        help='directory searched recursively, or glob pattern (e.g. "../data/**/*.blf")')
+    parser.add_argument('--dbc', help='DBC file, by default the most recent one in DBC_DIR')
+    parser.add_argument('--output', default=main.OUTPUT_DIR,
+                        help='directory receiving one subdirectory per data file')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes, by default the number of CPUs')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    dbc_file = args.dbc or guess_dbc_file(main.DBC_DIR)
+    if dbc_file:
+        run_batch(args.data, dbc_file, args.output, args.workers, main.STREAM_DIR)
@@ -0,0 +1,219 @@
+import numpy as np
+from cantools.database.conversion import BaseConversion
+
+
+# Converts a cantools start bit (sawtooth numbering for big endian signals)
+# into the position of the most significant bit in network bit order, where
+# bit 0 is the most significant bit of the first byte.
+def network_msb(signal):
+    return 8 * (signal.start // 8) + (7 - signal.start % 8)
+
+
+# Extracts the values of one signal from a matrix of payloads, one row per
+# frame, using vectorized shifts and masks derived once from the DBC.
+class SignalExtractor:
+    def __init__(self, signal):
+        self.signal = signal
+        self.name = signal.name
+        self.length = signal.length
+
+        if signal.byte_order == 'little_endian':
+            self.first_byte = signal.start // 8
+            self.shift = signal.start % 8
+            self.byte_count = (self.shift + signal.length + 7) // 8
+        else:
+            msb = network_msb(signal)
+            lead = msb % 8
+            self.first_byte = msb // 8
+            self.byte_count = (lead + signal.length + 7) // 8
+            self.shift = 8 * self.byte_count - lead - signal.length
+
+        self.mask = np.uint64((1 << signal.length) - 1)
+
+        # Choices are never decoded by the exporter, so the conversion of a
+        # signal with a value table is the plain linear conversion.
+        conversion = signal.conversion
+        if conversion.choices is not None:
+            conversion = BaseConversion.factory(conversion.scale, conversion.offset,
+                                                None, conversion.is_float)
+        self.conversion = conversion
+
+    def extract_raw(self, payloads):
+        # The raw value of each frame is accumulated in an unsigned 64-bit
+        # integer. Signals spanning 9 bytes (unaligned 64-bit signals) get
+        # their last byte merged separately.
+        column = payloads[:, self.first_byte:self.first_byte + self.byte_count].astype(np.uint64)
+        accumulated_count = min(self.byte_count, 8)
+        raw = np.zeros(len(payloads), dtype=np.uint64)
+
+        if self.signal.byte_order == 'little_endian':
+            for i in range(accumulated_count):
+                raw |= column[:, i] << np.uint64(8 * i)
+            raw >>= np.uint64(self.shift)
+            if self.byte_count > 8:
+                raw |= column[:, 8] << np.uint64(64 - self.shift)
+        else:
+            for i in range(accumulated_count):
+                raw |= column[:, i] << np.uint64(8 * (accumulated_count - 1 - i))
+            if self.byte_count > 8:
+                raw = (raw << np.uint64(8 - self.shift)) | (column[:, 8] >> np.uint64(self.shift))
+            else:
+                raw >>= np.uint64(self.shift)
+
+        if self.length < 64:
+            raw &= self.mask
+        return raw
+
+    def extract(self, payloads):
+        # NaN payloads of floating point signals are legitimate
+        with np.errstate(invalid='ignore'):
+            return self.scale(*self.extract_unscaled(payloads))
+
+    def extract_unscaled(self, payloads):
+        raw = self.extract_raw(payloads)
+        signal = self.signal
+        length = self.length
+
+        if self.conversion.is_float:
+            if length == 64:
+                raw = raw.view(np.float64)
+            elif length == 32:
+                raw = raw.astype(np.uint32).view(np.float32).astype(np.float64)
+            else:
+                raw = raw.astype(np.uint16).view(np.float16).astype(np.float64)
+            raw_min = raw_max = None
+        elif signal.is_signed:
+            if length == 64:
+                raw = raw.view(np.int64)
+            else:
+                sign = np.int64(1 << (length - 1))
+                raw = (raw.astype(np.int64) ^ sign) - sign
+            raw_min, raw_max = -(1 << (length - 1)), (1 << (length - 1)) - 1
+        else:
+            raw_min, raw_max = 0, (1 << length) - 1
+            raw = raw.astype(np.int64) if length < 64 else raw.astype(object)
+
+        return raw, raw_min, raw_max
+
+    def scale(self, raw, raw_min, raw_max):
+        # Mirrors 'raw_value * scale + offset' of the cantools conversions,
+        # including their int/float result types. Integer arithmetic that
+        # could overflow 64 bits is carried out on Python integers.
+        scale = self.conversion.scale
+        offset = self.conversion.offset
+        if scale == 1 and offset == 0:
+            return raw
+
+        if raw.dtype != np.float64 and isinstance(scale, int):
+            bound = max(abs(raw_min), abs(raw_max)) * abs(scale) + abs(int(offset))
+            if bound >= 1 << 63 and raw.dtype != object:
+                raw = raw.astype(object)
+            product = raw * scale
+            if isinstance(offset, int):
+                return product + offset
+            return product.astype(np.float64) + offset
+
+        return raw.astype(np.float64) * scale + offset
+
+
+# Decodes the payloads of one DBC message in batches. Only payloads at least
+# as long as the message are handled: the caller is expected to fall back to
+# Message.decode for shorter payloads and for the rows reported as errors
+# (unknown multiplexer values), so that the exception raised is unchanged.
+#
+# Given signal_names, only these signals and the multiplexers are decoded.
+class BatchDecoder:
+    def __init__(self, msg, signal_names=None):
+        self.msg = msg
+        self.length = msg.length
+        self.supported = not msg.is_container
+
+        # Multiplexers must be extracted before the signals they select
+        def depth(signal):
+            level = 0
+            while signal.multiplexer_signal is not None:
+                signal = msg.get_signal_by_name(signal.multiplexer_signal)
+                level += 1
+            return level
+
+        signals = [signal for signal in msg.signals if signal_names is None
+                   or signal.name in signal_names or signal.is_multiplexer]
+        signals = sorted(signals, key=depth)
+        self.extractors = [SignalExtractor(signal) for signal in signals]
+
+        self.multiplexer_ids = {}
+        for signal in msg.signals:
+            if signal.multiplexer_signal is not None:
+                allowed = self.multiplexer_ids.setdefault(signal.multiplexer_signal, set())
+                allowed.update(signal.multiplexer_ids)
+        self.multiplexer_ids = {name: np.array(sorted(ids), dtype=np.int64)
+                                for name, ids in self.multiplexer_ids.items()}
+
+    def decode_matrix(self, payloads):
+        # Returns the values of each signal, the rows where it is present (None
+        # when present in every row) and the rows that cantools would reject.
+        values = {}
+        presence = {}
+        mux_numbers = {}
+        errors = np.zeros(len(payloads), dtype=bool)
+
+        for extractor in self.extractors:
+            signal = extractor.signal
+            name = extractor.name
+            values[name] = extractor.extract(payloads)
+
+            if signal.multiplexer_signal is None:
+                presence[name] = None
+            else:
+                parent = signal.multiplexer_signal
+                present = np.isin(mux_numbers[parent], signal.multiplexer_ids)
+                if presence[parent] is not None:
+                    present &= presence[parent]
+                presence[name] = present
+
+            if name in self.multiplexer_ids:
+                column = values[name]
+                if column.dtype == np.float64:
+                    numbers = np.trunc(column).astype(np.int64)
+                elif column.dtype == object:
+                    numbers = np.array([int(v) for v in column], dtype=np.int64)
+                else:
+                    numbers = column
+                mux_numbers[name] = numbers
+                unknown = ~np.isin(numbers, self.multiplexer_ids[name])
+                if presence[name] is not None:
+                    unknown &= presence[name]
+                errors |= unknown
+
+        return values, presence, errors
+
+    def decode(self, payloads):
+        # Returns one dict of decoded values per payload, or None for the
+        # payloads that must be decoded by Message.decode instead.
+        results = [None] * len(payloads)
+        length = self.length
+        selected = [i for i, payload in enumerate(payloads) if len(payload) >= length]
+        if not self.supported or not selected:
+            return results
+
+        buffer = b''.join(bytes(payloads[i][:length]) for i in selected)
+        matrix = np.frombuffer(buffer, dtype=np.uint8).reshape(len(selected), length)
+        values, presence, errors = self.decode_matrix(matrix)
+
+        names = [extractor.name for extractor in self.extractors]
+        columns = [values[name].tolist() for name in names]
+        error_rows = errors.tolist()
+
+        if all(presence[name] is None for name in names):
+            for row, (index, row_values) in enumerate(zip(selected, zip(*columns))):
+                if not error_rows[row]:
+                    results[index] = dict(zip(names, row_values))
+        else:
+            masks = [[True] * len(selected) if presence[name] is None else presence[name].tolist()
+                     for name in names]
+            for row, (index, row_values, row_masks) in enumerate(zip(selected, zip(*columns),
+                                                                      zip(*masks))):
+                if not error_rows[row]:
+                    results[index] = {name: value for name, value, present
+                                      in zip(names, row_values, row_masks) if present}
+        return results
@@ -0,0 +1,370 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+import can
+import cantools
+import numpy as np
+
+import synthetic
+from dbc_cache import load_dbc
+from live import LatencyRecorder, LiveExport
+from pipeline import Pipeline
+from helpers_hvhv import hvhv_shortname
+from logexport import *
+
+# Configurations of LogExport compared by the processing and writing benchmarks
+EXPORT_VARIANTS = {
+    'tree': dict(use_time_grouping=True),
+    'table': dict(use_time_grouping=False),
+    'table_sample_and_hold': dict(use_time_grouping=False, use_sample_and_hold=True),
+    'tree_columnar': dict(use_time_grouping=True, use_columnar_storage=True),
+    'tree_columnar_batch': dict(use_time_grouping=True, use_columnar_storage=True,
+                                use_batch_decoding=True),
+    'tree_columnar_spill': dict(use_time_grouping=True, memory_limit=1024 * 1024),
+}
+
+
+# Records the arguments given to the frame listeners, so that the verifiers
+# can be timed on their own
+class ListenerRecorder:
+    def __init__(self):
+        self.calls = []
+
+    def process_frame(self, frame, msg, decoded_values, error):
+        self.calls.append((frame, msg, decoded_values, error))
+
+
+def measure(function, repeat, setup=None):
+    # Returns the shortest duration, the least disturbed by other processes,
+    # along with all of them and the result of the last call. The messages
+    # printed by the export are left out.
+    times = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = perf_counter()
+            result = function()
+            times.append(perf_counter() - start)
+    return min(times), times, result
+
+
+def new_export(dbc, dbc_filter=None, **kwargs):
+    return LogExport(dbc, dbc_filter or DbcFilter(accept_all=True), signal_renamer=hvhv_shortname,
+                     target_channel=AutoChannel, show_progress=False, **kwargs)
+
+
+def evict_from_cache(path):
+    # Drops the pages of the file from the page cache where supported, so that
+    # it is read from the disk again
+    if hasattr(os, 'posix_fadvise'):
+        with open(path, 'rb') as f:
+            os.fsync(f.fileno())
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def read_log(path):
+    return list(open_log(path)(path))
+
+
+# Reads and processes a log as main.export_file does, the reading overlapping
+# with the decoding when pipelined
+def export_log(dbc, path, pipelined):
+    export = new_export(dbc, use_time_grouping=True, use_columnar_storage=True,
+                        use_batch_decoding=True)
+    reader_class = open_log(path)
+    reader, _ = open_log_reader(path, reader_class, False, frame_filter=export.is_frame_listed)
+    if pipelined:
+        Pipeline(export).run(reader, allow_truncated=True)
+    else:
+        for frame in reader:
+            export.process_frame(frame, allow_truncated=True)
+        export.flush()
+    if reader_class is not can.BLFReader:
+        export.skip_frames(reader.skipped_count)
+    return export
+
+
+def process_frames(dbc, frames, options):
+    export = new_export(dbc, **options)
+    for frame in frames:
+        export.process_frame(frame, allow_truncated=True)
+    export.flush()
+    return export
+
+
+# Number of bits of a CAN 2.0 data frame, from its start to the end of the
+# following interframe space, leaving out the stuff bits
+def frame_bits(frame):
+    return (67 if frame.is_extended_id else 47) + 8 * len(frame.data)
+
+
+def send_saturated(bus, frames, bitrate, stopped):
+    # Sends the frames back to back, at the pace of a bus of bitrate fully
+    # used by them. The frames due while sleeping are sent at once on waking.
+    start = perf_counter()
+    due = 0
+    for frame in frames:
+        if stopped.is_set():
+            return
+        due += frame_bits(frame) / bitrate
+        delay = start + due - perf_counter()
+        if delay > 0.001:
+            time.sleep(delay)
+        bus.send(frame)
+
+
+def capture_live(dbc, frames, bitrate, output_dir, segment_count=4):
+    """
+    Captures the frames sent by a producer thread on a saturated virtual bus
+    with a LiveExport rolling segment_count segments. Returns the summary of
+    the capture, the duration of the frames on the bus, and the delays of the
+    accepted frames between their sending and their decoding.
+    """
+    channel = f'benchmark_{os.getpid()}'
+    recorder = LatencyRecorder()
+
+    def new_live_export():
+        export = new_export(dbc, use_time_grouping=True, use_columnar_storage=True,
+                            use_batch_decoding=True)
+        export.add_listener(recorder)
+        return export
+
+    bus_time = sum(map(frame_bits, frames)) / bitrate
+    with can.Bus(interface='virtual', channel=channel) as receiver, \
+            can.Bus(interface='virtual', channel=channel) as sender:
+        live = LiveExport(receiver, new_live_export, output_dir,
+                          roll_frames=-(-len(frames) // segment_count))
+        producer = threading.Thread(target=send_saturated,
+                                    args=(sender, frames, bitrate, live.stopped),
+                                    name='benchmark-producer', daemon=True)
+        producer.start()
+        try:
+            summary = live.run(duration=2 * bus_time + 10, frame_count=len(frames))
+        finally:
+            live.stop()
+            producer.join()
+    return summary, bus_time, recorder
+
+
+def run_benchmarks(dbc_file, logs, repeat=3, cold=False, live_frames=20000, bitrate=1000000):
+    results = {}
+
+    def record(name, measurement, count=None):
+        best, times, _ = measurement
+        entry = {'time': round(best, 6), 'times': [round(t, 6) for t in times]}
+        if count:
+            entry['frames'] = count
+            entry['frames_per_second'] = round(count / best) if best else None
+        results[name] = entry
+        print(f'> {name}: {best:.3f}s')
+
+    # Startup: parsing the DBC, and loading it from the cache filled by the
+    # first load
+    record('load_dbc.parse', measure(lambda: load_dbc(dbc_file), repeat))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        measure(lambda: load_dbc(dbc_file, cache_dir), 1)
+        measurement = measure(lambda: load_dbc(dbc_file, cache_dir), repeat)
+        record('load_dbc.cached', measurement)
+    dbc = measurement[2]
+
+    # With cold, the logs are read from the disk rather than the page cache
+    frames = None
+    for file_format, path in logs.items():
+        setup = (lambda: evict_from_cache(path)) if cold else None
+        measurement = measure(lambda: read_log(path), repeat, setup)
+        frames = frames or measurement[2]
+        count = len(measurement[2])
+        record(f'read.{file_format}', measurement, count)
+        for name, pipelined in (('export', False), ('export_pipeline', True)):
+            record(f'{name}.{file_format}',
+                   measure(lambda: export_log(dbc, path, pipelined), repeat, setup), count)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        for variant, options in EXPORT_VARIANTS.items():
+            measurement = measure(lambda: process_frames(dbc, frames, options), repeat)
+            record(f'process_frame.{variant}', measurement, len(frames))
+            export = measurement[2]
+            if export.use_columnar_storage:
+                record(f'wide_table.{variant}', measure(lambda: export.wide_table(0.01), repeat))
+
+            writes = {'write_csv': {}}
+            if export.use_time_grouping:
+                # The groups are written into a directory which is then
+                # archived, or directly into the archive
+                writes['write_csv.direct_zip'] = {'use_direct_zip': True}
+            for name, write_options in writes.items():
+                record(f'{name}.{variant}', measure(
+                    lambda: export.write_csv(output_dir, str(Path(output_dir, 'benchmark')),
+                                             **write_options), repeat))
+
+    # Exports keeping the first signal of each message, the other signals
+    # being decoded and dropped, or not decoded at all with selective decoding
+    dbc_filter = DbcFilter(partly_accepted={msg.name: [msg.signals[0].name]
+                                            for msg in dbc.messages})
+    batch = {'use_columnar_storage': True, 'use_batch_decoding': True}
+    for variant, options in (('filtered', {}),
+                             ('filtered_selective', {'use_selective_decoding': True}),
+                             ('filtered_batch', batch),
+                             ('filtered_selective_batch', dict(batch, use_selective_decoding=True))):
+        options = dict(options, dbc_filter=dbc_filter)
+        record(f'process_frame.{variant}',
+               measure(lambda: process_frames(dbc, frames, options), repeat), len(frames))
+
+    # The verifiers are given the frames as decoded by the export
+    recorder = ListenerRecorder()
+    export = new_export(dbc)
+    export.add_listener(recorder)
+    measure(lambda: [export.process_frame(frame, allow_truncated=True) for frame in frames], 1)
+    calls = recorder.calls
+
+    # Each verifier is only given the frames it subscribed to, as by the export
+    for verifier_class in (MuxVerifier, RollingCounterVerifier):
+        def verify():
+            verifier = verifier_class()
+            subscriptions = {}
+            for frame, msg, decoded_values, error in calls:
+                events = subscriptions.get(msg.name)
+                if events is None:
+                    events = subscriptions[msg.name] = verifier.subscribe(msg)
+                if (DECODED if error is None else DECODE_ERROR) in events:
+                    verifier.process_frame(frame, msg, decoded_values, error)
+        record(f'verifier.{verifier_class.__name__}', measure(verify, repeat), len(calls))
+
+    for name, batch_size in (('CrcVerifier', None), ('CrcVerifier_batch', 4096)):
+        def verify():
+            verifier = CrcVerifier(dbc, batch_size)
+            for frame, msg, _, _ in calls:
+                verifier.check_frame(frame, msg)
+            verifier.flush()
+        record(f'verifier.{name}', measure(verify, repeat), len(calls))
+
+    # Live capture of a saturated bus: the frames must be received at the
+    # pace of the bus, with the delays of the frames staying bounded
+    if live_frames:
+        live_frames = list(synthetic.generate_frames(dbc, live_frames, 1))
+        with tempfile.TemporaryDirectory() as output_dir, \
+                contextlib.redirect_stdout(io.StringIO()):
+            summary, bus_time, recorder = capture_live(dbc, live_frames, bitrate, output_dir)
+        results['live.capture'] = {
+            'time': round(summary['elapsed_time'], 6),
+            'frames': summary['received_frame_count'],
+            'frames_per_second': round(summary['frames_per_second']),
+            'bus_frames_per_second': round(len(live_frames) / bus_time),
+            'segment_count': summary['segment_count'],
+        }
+        print(f'> live.capture: {summary["received_frame_count"]}/{len(live_frames)} frames in '
+              f'{summary["elapsed_time"]:.3f}s (bus time {bus_time:.3f}s)')
+        for name, value in recorder.statistics().items():
+            if name != 'frame_count':
+                results[f'live.latency_{name}'] = {'time': round(value, 6)}
+                print(f'> live.latency_{name}: {value:.4f}s')
+
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, reference_file, threshold=1.1):
+    # Lists the benchmarks slower than the reference by more than threshold
+    with open(reference_file) as f:
+        reference = json.load(f)['results']
+
+    print(f'> Comparison with {reference_file} (ratio of durations, new / reference)')
+    regressions = []
+    for name, entry in results.items():
+        if name not in reference or not reference[name]['time']:
+            continue
+        ratio = entry['time'] / reference[name]['time']
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = '  <-- slower'
+        print(f'> {name}: {reference[name]["time"]:.3f}s -> {entry["time"]:.3f}s (x{ratio:.2f}){flag}')
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Time each stage of the export on synthetic logs and store the results as JSON.')
+    parser.add_argument('--frames', type=int, default=200000, help='number of frames of each log')
+    parser.add_argument('--channels', type=int, default=2, help='number of CAN channels')
+    parser.add_argument('--messages', type=int, default=8, help='number of messages of the DBC')
+    parser.add_argument('--formats', default='asc,blf,trc', help='comma-separated log formats')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the generated frames')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs of each benchmark, the shortest being kept')
+    parser.add_argument('--cold', action='store_true',
+                        help='drop the logs from the page cache before each reading')
+    parser.add_argument('--data-dir', help='directory where the generated files are kept, '
+                                           'by default a temporary directory')
+    parser.add_argument('--output', default='../output/benchmarks/',
+                        help='directory receiving the JSON results')
+    parser.add_argument('--label', help='name of the results file, by default the git commit')
+    parser.add_argument('--compare', help='JSON results to compare the new results with')
+    parser.add_argument('--live-frames', type=int, default=20000,
+                        help='number of frames sent on a saturated virtual bus for the live '
+                             'capture, 0 to skip it')
+    parser.add_argument('--bitrate', type=int, default=1000000,
+                        help='bitrate of the virtual bus of the live capture')
+    return parser.parse_args()
+
+
+def main(args):
+    commit = git_commit()
+    config = {'frames': args.frames, 'channels': args.channels, 'messages': args.messages,
+              'formats': args.formats.split(','), 'seed': args.seed, 'repeat': args.repeat,
+              'cold': args.cold, 'live_frames': args.live_frames, 'bitrate': args.bitrate}
+
+    with contextlib.ExitStack() as stack:
+        data_dir = args.data_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        print(f'> Generating {args.frames} frames on {args.channels} channel(s) in: {data_dir}')
+        dbc_file, logs = synthetic.write_dataset(data_dir, args.frames, args.channels,
+                                                 args.messages, config['formats'],
+                                                 seed=args.seed)
+        results = run_benchmarks(dbc_file, logs, args.repeat, args.cold,
+                                 args.live_frames, args.bitrate)
+
+    report = {
+        'label': args.label or commit,
+        'commit': commit,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'packages': {'python-can': can.__version__, 'cantools': cantools.__version__,
+                     'numpy': np.__version__},
+        'config': config,
+        'results': results,
+    }
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / f'benchmark_{report["label"] or "results"}.json'
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'> Benchmark results written to: {output_file}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,125 @@
+import json
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+# Parquet and Arrow exports are only available when pyarrow is installed
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# DataFrames are only available when pandas is installed
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+# Columns of a group as NumPy arrays, keyed by field name ('timestamp' first),
+# along with the metadata written to the binary files
+GroupArrays = namedtuple('GroupArrays', ['arrays', 'metadata'])
+
+
+def default_binary_format():
+    return 'npz' if pyarrow is None else 'parquet'
+
+
+# Gathers the information written to the CSV unit line and to the signals JSON
+# file, so that binary exports are self-describing.
+def group_metadata(group, timestamps):
+    signals = {}
+    for fieldname in group.value_fieldnames():
+        signal = dict(group.sources[fieldname])
+        signal['unit'] = group.units.get(fieldname)
+        signals[fieldname] = signal
+
+    time_base = 'relative' if timestamps.dtype.kind == 'm' else 'absolute'
+    return {'group': group.name, 'timestamp': time_base,
+            'units': {f: u for f, u in group.units.items() if f in signals},
+            'signals': signals}
+
+
+# Each field is stored as an array named after it, along with the mask of the
+# rows where it is present, named '<field>__valid'. The metadata is stored as a
+# JSON string named '__metadata__', so that no pickling is needed to load it.
+def write_npz(group, directory):
+    timestamps, columns = group.column_data()
+    arrays = {'timestamp': timestamps}
+    for fieldname, (values, valid) in columns.items():
+        arrays[fieldname] = values
+        arrays[fieldname + '__valid'] = valid
+    arrays['__metadata__'] = np.array(json.dumps(group_metadata(group, timestamps)))
+
+    output = Path(directory, group.name + '.npz')
+    np.savez(output, **arrays)
+    return output
+
+
+def group_arrays(group):
+    timestamps, columns = group.column_data()
+    arrays = {'timestamp': timestamps}
+    for fieldname, (values, valid) in columns.items():
+        arrays[fieldname] = np.ma.MaskedArray(values, mask=~valid)
+    return GroupArrays(arrays, group_metadata(group, timestamps))
+
+
+def group_dataframe(group):
+    if pandas is None:
+        raise ImportError('pandas is required to get the groups as DataFrames')
+
+    timestamps, columns = group.column_data()
+    data = {'timestamp': timestamps}
+    for fieldname, (values, valid) in columns.items():
+        if valid.all():
+            data[fieldname] = values
+        elif values.dtype.kind == 'f':
+            data[fieldname] = np.where(valid, values, np.nan)
+        else:
+            # Nullable integers keep their values exact where floats would not
+            data[fieldname] = pandas.arrays.IntegerArray(values, ~valid)
+
+    frame = pandas.DataFrame(data, copy=False)
+    frame.attrs.update(group_metadata(group, timestamps))
+    return frame
+
+
+def arrow_table(group):
+    if pyarrow is None:
+        raise ImportError('pyarrow is required to export Parquet and Arrow files')
+
+    timestamps, columns = group.column_data()
+    metadata = group_metadata(group, timestamps)
+
+    arrays = [pyarrow.array(timestamps)]
+    fields = [pyarrow.field('timestamp', arrays[0].type)]
+    for fieldname, (values, valid) in columns.items():
+        column = pyarrow.array(values, mask=~valid)
+        unit = metadata['signals'][fieldname]['unit']
+        arrays.append(column)
+        fields.append(pyarrow.field(fieldname, column.type,
+                                    metadata=None if unit is None else {'unit': unit}))
+
+    schema = pyarrow.schema(fields, metadata={'logexport': json.dumps(metadata)})
+    return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(group, directory):
+    output = Path(directory, group.name + '.parquet')
+    pyarrow.parquet.write_table(arrow_table(group), output)
+    return output
+
+
+def write_arrow(group, directory):
+    output = Path(directory, group.name + '.arrow')
+    pyarrow.feather.write_feather(arrow_table(group), output)
+    return output
+
+
+BINARY_WRITERS = {
+    'npz': write_npz,
+    'parquet': write_parquet,
+    'arrow': write_arrow,
+}
@@ -0,0 +1,241 @@
+import os
+import struct
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import can
+from can.io.blf import (FILE_HEADER_STRUCT, OBJ_HEADER_BASE_STRUCT, LOG_CONTAINER_STRUCT,
+                        LOG_CONTAINER, NO_COMPRESSION, ZLIB_DEFLATE)
+
+from fast_readers import FrameRecord
+from logexport import LogExport, AutoChannel
+
+# Result of a worker: 'head' holds the bytes preceding the first object found
+# (the end of an object started in the previous chunk), and 'tail' the bytes
+# of an object continuing in the next chunk. When no object starts in the
+# chunk, 'head' holds the whole chunk and 'frames' is None.
+ChunkResult = namedtuple('ChunkResult', ['head', 'frames', 'decoded', 'unlisted_count', 'tail'])
+
+
+# Parses objects from data that was decompressed separately, using the parsing
+# loop of BLFReader, which only depends on these two attributes.
+class ChunkParser:
+    _parse_data = can.BLFReader._parse_data
+
+    def __init__(self, start_timestamp):
+        self.start_timestamp = start_timestamp
+        self._pos = 0
+
+    def parse(self, data, start=0):
+        # Returns the frames of the complete objects as FrameRecord tuples,
+        # which are much cheaper to send back from the worker processes than
+        # can.Message objects, and the position of the first byte that was
+        # not consumed, as BLFReader does for its tail
+        self._pos = 0
+        frames = []
+        try:
+            for frame in self._parse_data(data[start:] if start else data):
+                frames.append(FrameRecord(frame.timestamp, frame.arbitration_id,
+                                          frame.channel, frame.dlc, bytes(frame.data)))
+        except struct.error:
+            pass
+        return frames, start + self._pos
+
+
+# Lists the containers of a BLF file as (data offset, data size) pairs, without
+# reading their content, and returns them with the start timestamp of the file
+# and the offset following the last object listed. The objects are listed from
+# the given offset (by default the end of the file header) up to the last
+# complete one, so that a file still being written can be read up to there.
+def scan_containers(data_file, offset=None):
+    containers = []
+    with open(data_file, 'rb') as f:
+        header = FILE_HEADER_STRUCT.unpack(f.read(FILE_HEADER_STRUCT.size))
+        if header[0] != b'LOGG':
+            raise can.io.blf.BLFParseError('Unexpected file format')
+        next_offset = header[1] if offset is None else offset
+        f.seek(next_offset)
+        file_size = os.fstat(f.fileno()).st_size
+        with can.BLFReader(data_file) as reader:
+            start_timestamp = reader.start_timestamp
+
+        while True:
+            data = f.read(OBJ_HEADER_BASE_STRUCT.size)
+            if len(data) < OBJ_HEADER_BASE_STRUCT.size:
+                break
+            signature, _, _, obj_size, obj_type = OBJ_HEADER_BASE_STRUCT.unpack(data)
+            if signature != b'LOBJ':
+                raise can.io.blf.BLFParseError()
+            data_size = obj_size - OBJ_HEADER_BASE_STRUCT.size
+            # An object still being written is left for a later reading
+            if f.tell() + data_size > file_size:
+                break
+            if obj_type == LOG_CONTAINER:
+                containers.append((f.tell(), data_size))
+            f.seek(data_size + obj_size % 4, 1)
+            next_offset = min(f.tell(), file_size)
+
+    return start_timestamp, containers, next_offset
+
+
+def split_chunks(containers, chunk_size):
+    chunks = []
+    chunk = []
+    size = 0
+    for container in containers:
+        chunk.append(container)
+        size += container[1]
+        if size >= chunk_size:
+            chunks.append(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def read_containers(data_file, containers):
+    parts = []
+    with open(data_file, 'rb') as f:
+        for offset, size in containers:
+            f.seek(offset)
+            obj_data = f.read(size)
+            method, _ = LOG_CONTAINER_STRUCT.unpack_from(obj_data)
+            container_data = obj_data[LOG_CONTAINER_STRUCT.size:]
+            if method == NO_COMPRESSION:
+                parts.append(container_data)
+            elif method == ZLIB_DEFLATE:
+                parts.append(zlib.decompressobj().decompress(container_data))
+    return b''.join(parts)
+
+
+# Finds the first object of a chunk that does not start on an object boundary.
+# A candidate signature is only accepted when the objects parsed from it chain
+# up to the end of the chunk; the result is checked again against the end of
+# the previous chunk when the chunks are put back together.
+def find_first_object(parser, data):
+    start = data.find(b'LOBJ')
+    while start != -1:
+        try:
+            frames, end = parser.parse(data, start)
+        except (can.io.blf.BLFParseError, ValueError, IndexError):
+            pass
+        else:
+            if parser._pos > 0:
+                return start, frames, end
+        start = data.find(b'LOBJ', start + 1)
+    return None, [], len(data)
+
+
+# Decodes the frames of a chunk the same way as LogExport.process_frame, using
+# the decode plans of the given LogExport. Frames of IDs unknown to the DBC are
+# only counted, and only the accepted frames of the decoded channel (all of
+# them when None) are decoded.
+def decode_chunk_frames(export, frames, allow_truncated, channel=None):
+    listed = []
+    entries = []
+    positions = []
+    for frame in frames:
+        plan = export.decode_plans.get(frame.arbitration_id)
+        if plan is None:
+            plan = export.create_decode_plan(frame.arbitration_id)
+        if plan.msg is None:
+            continue
+        if plan.accepted and (channel is None or frame.channel == channel):
+            positions.append(len(listed))
+            entries.append((plan, frame, allow_truncated))
+        listed.append(frame)
+
+    decoded = [None] * len(listed)
+    for position, result in zip(positions, export.decode_frames(entries)):
+        decoded[position] = result
+    return listed, decoded, len(frames) - len(listed)
+
+
+worker_export = None
+
+
+def initialize_worker(dbc, dbc_filter):
+    # Each worker resolves its own decode plans, but never stores any frame
+    global worker_export
+    worker_export = LogExport(dbc, dbc_filter, show_progress=False)
+
+
+def decode_chunk(data_file, containers, start_timestamp, is_first, allow_truncated, channel):
+    data = read_containers(data_file, containers)
+    parser = ChunkParser(start_timestamp)
+    if is_first:
+        start = 0
+        frames, end = parser.parse(data)
+    else:
+        start, frames, end = find_first_object(parser, data)
+        if start is None:
+            return ChunkResult(data, None, None, 0, b'')
+
+    listed, decoded, unlisted_count = decode_chunk_frames(worker_export, frames,
+                                                          allow_truncated, channel)
+    return ChunkResult(data[:start], listed, decoded, unlisted_count, data[end:])
+
+
+def replay_frames(export, frames, decoded, unlisted_count):
+    for frame, result in zip(frames, decoded):
+        export.process_decoded_frame(frame, *(result or (None, None)))
+    export.skip_frames(unlisted_count)
+
+
+def process_blf_parallel(export, data_file, workers, chunk_size=16 * 1024 * 1024,
+                         allow_truncated=False):
+    """
+    Processes a BLF file with several worker processes, giving the same result
+    as calling export.process_frame for each frame of can.BLFReader.
+
+    The file is split into chunks of containers of about chunk_size compressed
+    bytes. Each worker decompresses a chunk, parses its objects and decodes
+    its frames, while the main process feeds the decoded frames to the export
+    in file order, so that the state spanning several chunks (rolling
+    counters, sample and hold, channel statistics, relative time origin) is
+    updated exactly as in a sequential run. The objects spanning two chunks
+    are parsed and decoded by the main process.
+    """
+    channel = None if export.target_channel is AutoChannel else export.target_channel
+    start_timestamp, containers, _ = scan_containers(data_file)
+    chunks = split_chunks(containers, chunk_size)
+    parser = ChunkParser(start_timestamp)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker,
+                             initargs=(export.dbc, export.dbc_filter)) as executor:
+        # A bounded number of chunks is in flight, so that the decoded frames
+        # do not pile up in memory when the workers outpace the export
+        pending = deque()
+        submitted = 0
+        carry = b''
+        while submitted < len(chunks) or pending:
+            while submitted < len(chunks) and len(pending) < 2 * workers:
+                pending.append((chunks[submitted], executor.submit(
+                    decode_chunk, data_file, chunks[submitted], start_timestamp,
+                    submitted == 0, allow_truncated, channel)))
+                submitted += 1
+
+            chunk, future = pending.popleft()
+            result = future.result()
+
+            # Objects completed by the head of the chunk
+            boundary = carry + result.head
+            frames, end = parser.parse(boundary)
+            replay_frames(export, *decode_chunk_frames(export, frames, allow_truncated, channel))
+            leftover = boundary[end:]
+
+            if result.frames is None:
+                # No object starts in this chunk
+                carry = leftover
+            elif len(leftover) < 8 and (leftover + b'LOBJ').find(b'LOBJ') == len(leftover):
+                replay_frames(export, result.frames, result.decoded, result.unlisted_count)
+                carry = result.tail
+            else:
+                # The first object found by the worker was not the actual one,
+                # so the chunk is parsed again following the previous chunk
+                data = leftover + read_containers(data_file, chunk)[len(result.head):]
+                frames, end = parser.parse(data)
+                replay_frames(export, *decode_chunk_frames(export, frames, allow_truncated, channel))
+                carry = data[end:]
@@ -0,0 +1,306 @@
+import hashlib
+import io
+import locale
+import os
+import pickle
+from pathlib import Path
+
+import can
+import cantools
+from can.io.blf import FILE_HEADER_STRUCT
+
+from blf_parallel import ChunkParser, scan_containers, split_chunks, read_containers
+from logexport import *
+
+CHECKPOINT_VERSION = 3
+
+
+def hash_range(file, start, end, sha256=None):
+    sha256 = hashlib.sha256() if sha256 is None else sha256
+    with open(file, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(1024 * 1024, remaining))
+            if not block:
+                break
+            sha256.update(block)
+            remaining -= len(block)
+    return sha256
+
+
+def find_line_end(file):
+    # Returns the offset following the last newline of a text file, the last
+    # line being possibly still written
+    with open(file, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        while position > 0:
+            block_start = max(0, position - 64 * 1024)
+            f.seek(block_start)
+            index = f.read(position - block_start).rfind(b'\n')
+            if index != -1:
+                return block_start + index + 1
+            position = block_start
+    return 0
+
+
+# Settings of an export that must be the same for its state to be resumed
+def export_options(export):
+    return {
+        'dbc': hashlib.sha256(export.dbc.as_dbc_string().encode()).hexdigest(),
+        'dbc_filter': vars(export.dbc_filter),
+        'signal_renamer': getattr(export.signal_renamer, '__qualname__', None),
+        'target_channel': repr(export.target_channel),
+        'use_time_grouping': export.use_time_grouping,
+        'use_sample_and_hold': export.use_sample_and_hold,
+        'use_relative_time': export.use_relative_time,
+        'use_columnar_storage': export.use_columnar_storage,
+        'use_batch_decoding': export.use_batch_decoding,
+        'stream_dir': None if export.stream_dir is None else str(export.stream_dir),
+        'time_window': repr((export.start_time, export.end_time)),
+    }
+
+
+# Attributes of a LogExport stored in the checkpoint: the stored values (or the
+# staged rows), the selected channel, the time range and the counters
+STATE_FIELDS = ['data', 'decode_error', 'target_channel', 'prescan_result', 'log_start',
+                'time_window', 'total_frame_count', 'listed_frame_count',
+                'accepted_frame_count']
+
+# Objects of a LogExport whose attributes are stored in the checkpoint, and
+# restored in place along with those of its frame listeners, so that the
+# objects referenced elsewhere (e.g. wrapped by a Profiler) are kept
+STATE_OBJECTS = ['channel_analyzer', 'timestamp_recorder', 'crc_verifier']
+
+
+def object_state(obj):
+    # Attributes of obj, without the methods replaced on the instance
+    return {name: value for name, value in vars(obj).items() if not callable(value)}
+
+
+def export_state(export):
+    return {'fields': {name: getattr(export, name) for name in STATE_FIELDS},
+            'objects': {name: object_state(getattr(export, name)) for name in STATE_OBJECTS},
+            'frame_listeners': [(type(listener).__name__, object_state(listener))
+                                for listener in export.frame_listeners]}
+
+
+# The objects that a LogExport shares with the rest of the program are not
+# stored in the checkpoint but referenced, and replaced on loading by those of
+# the LogExport being resumed: its DBC and the messages of the DBC (by name),
+# its filter, signal renamer, progress bar, timestamp recorder and staging
+# writer, and AutoChannel.
+class ExportPickler(pickle.Pickler):
+    def __init__(self, file, export):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.references = {id(export.dbc): ('dbc',),
+                           id(export.dbc_filter): ('dbc_filter',),
+                           id(export.signal_renamer): ('signal_renamer',),
+                           id(export.progressbar): ('progressbar',),
+                           id(export.timestamp_recorder): ('timestamp_recorder',),
+                           id(export.staging_writer): ('staging_writer',),
+                           id(AutoChannel): ('AutoChannel',)}
+
+    def persistent_id(self, obj):
+        reference = self.references.get(id(obj))
+        if reference is None and isinstance(obj, cantools.database.can.Message):
+            reference = ('message', obj.name)
+        return reference
+
+
+class ExportUnpickler(pickle.Unpickler):
+    def __init__(self, file, export):
+        super().__init__(file)
+        self.export = export
+
+    def persistent_load(self, reference):
+        if reference[0] == 'message':
+            return self.export.dbc.get_message_by_name(reference[1])
+        if reference[0] == 'AutoChannel':
+            return AutoChannel
+        return getattr(self.export, reference[0])
+
+
+class IncrementalExport:
+    """
+    Processes a log that keeps being appended to, such as the log of a logger
+    still recording, only decoding the part added since the previous run.
+
+    After each run, the checkpoint file records the position reached in the
+    log (the end of the last complete line, or of the last complete BLF
+    object) along with the state of the export: the stored values (or the
+    staged rows with stream_dir), the channel statistics, the time range, the
+    counters and the state of the verifiers. The next run restores that state
+    when the checkpoint matches the log and the export settings, and then
+    processes the frames added since. The outputs are then written as usual,
+    and contain all the frames of the log.
+
+    The bytes of the log preceding the position are hashed (after the file
+    header for BLF files, which is updated when the logger closes the file),
+    and the log is processed from the start when they have changed.
+    """
+
+    def __init__(self, export, data_file, checkpoint_file, reader_class):
+        # The spilled chunks are temporary files, removed along with the export
+        if export.memory_limit is not None:
+            raise ValueError('Incremental export does not support a memory limit')
+        self.export = export
+        self.data_file = data_file
+        self.checkpoint_file = Path(checkpoint_file)
+        self.reader_class = reader_class
+        self.options = export_options(export)
+        self.resumed = False
+        self.checkpoint = None
+        self.sha256 = None
+        self.sha = None
+
+    def load_checkpoint(self):
+        # Returns the checkpoint header, and the hash of the bytes preceding
+        # its position, when it applies to the log, and None otherwise
+        with open(self.checkpoint_file, 'rb') as f:
+            header = pickle.load(f)
+        if header.get('version') != CHECKPOINT_VERSION:
+            return None, 'checkpoint version changed'
+        if header['reader'] != self.reader_class.__name__:
+            return None, 'log format changed'
+        if header['options'] != self.options:
+            return None, 'DBC or export settings changed'
+        if os.path.getsize(self.data_file) < header['offset']:
+            return None, 'log is shorter than the checkpoint'
+
+        if self.reader_class is can.BLFReader:
+            with can.BLFReader(self.data_file) as reader:
+                if reader.start_timestamp != header['reader_state']['start_timestamp']:
+                    return None, 'start of the log changed'
+
+        sha256 = hash_range(self.data_file, header['prefix_start'], header['offset'])
+        if sha256.hexdigest() != header['prefix_sha256']:
+            return None, 'processed part of the log changed'
+        return header, sha256
+
+    def resume(self):
+        """
+        Restores the state of the export from the checkpoint file when it
+        matches the log, and returns whether it did.
+        """
+        if not self.checkpoint_file.exists():
+            return False
+
+        try:
+            header, result = self.load_checkpoint()
+            if header is not None:
+                with open(self.checkpoint_file, 'rb') as f:
+                    pickle.load(f)
+                    state = ExportUnpickler(f, self.export).load()
+                listener_names = [type(listener).__name__
+                                  for listener in self.export.frame_listeners]
+                if [name for name, _ in state['frame_listeners']] != listener_names:
+                    header, result = None, 'frame listeners changed'
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, KeyError,
+                TypeError, ValueError) as e:
+            header, result = None, repr(e)
+
+        if header is None:
+            print(f'> Checkpoint ignored ({result}), processing the whole log')
+            return False
+
+        export = self.export
+        for name, value in state['fields'].items():
+            setattr(export, name, value)
+        for name, attributes in state['objects'].items():
+            vars(getattr(export, name)).update(attributes)
+        for listener, (_, attributes) in zip(export.frame_listeners, state['frame_listeners']):
+            vars(listener).update(attributes)
+        # The decode plans refer to the groups replaced
+        export.decode_plans = {}
+        self.checkpoint = header
+        self.sha256 = result
+        self.resumed = True
+        print(f'> Resuming from checkpoint at byte {header["offset"]} '
+              f'({export.total_frame_count} frames already processed)')
+        return True
+
+    def process(self, show_progress=True, allow_truncated=False):
+        if self.reader_class is can.BLFReader:
+            self.process_blf(show_progress, allow_truncated)
+        else:
+            self.process_text(show_progress, allow_truncated)
+        self.export.flush()
+
+    def process_text(self, show_progress, allow_truncated):
+        export = self.export
+        start = self.checkpoint['offset'] if self.resumed else 0
+        reader_state = self.checkpoint['reader_state'] if self.resumed else None
+        end = max(start, find_line_end(self.data_file))
+
+        ingest = IngestFile(self.data_file, show_progress, start, end,
+                            self.sha256 if self.resumed else None)
+        stream = io.TextIOWrapper(io.BufferedReader(ingest),
+                                  encoding=locale.getpreferredencoding(False))
+        reader = self.reader_class(stream, frame_filter=export.is_frame_listed,
+                                   state=reader_state)
+        for frame in reader:
+            export.process_frame(frame, allow_truncated=allow_truncated)
+        export.skip_frames(reader.skipped_count)
+        prefix_sha256 = ingest.hexdigest()
+        # The lines following end (possibly incomplete) are hashed too
+        self.sha = hash_range(self.data_file, end, os.path.getsize(self.data_file),
+                              ingest.sha256.copy()).hexdigest()
+
+        self.checkpoint = {'offset': end, 'prefix_start': 0,
+                         'prefix_sha256': prefix_sha256,
+                         'reader_state': reader.reader_state()}
+
+    def process_blf(self, show_progress, allow_truncated, chunk_size=16 * 1024 * 1024):
+        export = self.export
+        if self.resumed:
+            start = self.checkpoint['offset']
+            carry = self.checkpoint['reader_state']['carry']
+        else:
+            # The objects follow the file header
+            with open(self.data_file, 'rb') as f:
+                start = FILE_HEADER_STRUCT.unpack(f.read(FILE_HEADER_STRUCT.size))[1]
+            carry = b''
+        start_timestamp, containers, end = scan_containers(self.data_file, start)
+
+        progressbar = tqdm(total=sum(size for _, size in containers), desc='> Processing file',
+                           unit='B', unit_scale=True, file=sys.stdout, ncols=100,
+                           disable=not show_progress)
+        parser = ChunkParser(start_timestamp)
+        for chunk in split_chunks(containers, chunk_size):
+            data = carry + read_containers(self.data_file, chunk)
+            frames, parsed = parser.parse(data)
+            for frame in frames:
+                export.process_frame(frame, allow_truncated=allow_truncated)
+            carry = data[parsed:]
+            progressbar.update(sum(size for _, size in chunk))
+        progressbar.close()
+
+        prefix_start = self.checkpoint['prefix_start'] if self.resumed else start
+        sha256 = hash_range(self.data_file, start, end, self.sha256 if self.resumed else None)
+        self.sha = get_sha(self.data_file)
+        self.checkpoint = {'offset': end, 'prefix_start': prefix_start,
+                         'prefix_sha256': sha256.hexdigest(),
+                         'reader_state': {'start_timestamp': start_timestamp, 'carry': carry}}
+
+    def save(self):
+        """
+        Writes the checkpoint file after process, before writing the outputs
+        (which drop the empty columns of the groups).
+        """
+        export = self.export
+        export.flush()
+        header = dict(self.checkpoint, version=CHECKPOINT_VERSION,
+                      reader=self.reader_class.__name__, options=self.options)
+
+        # The previous checkpoint is only replaced once the new one is complete
+        temporary_file = self.checkpoint_file.with_name(self.checkpoint_file.name + '.tmp')
+        try:
+            with open(temporary_file, 'wb') as f:
+                pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+                ExportPickler(f, export).dump(export_state(export))
+            os.replace(temporary_file, self.checkpoint_file)
+        finally:
+            if temporary_file.exists():
+                temporary_file.unlink()
+        print(f'> Checkpoint written to: {self.checkpoint_file}')
@@ -1,29 +1,36 @@
-def compute_crc8_h2f(data):
-    crc_8h2f_table = [
-        0x00, 0x2F, 0x5E, 0x71, 0xBC, 0x93, 0xE2, 0xCD, 0x57, 0x78, 0x09, 0x26,
-        0xEB, 0xC4, 0xB5, 0x9A, 0xAE, 0x81, 0xF0, 0xDF, 0x12, 0x3D, 0x4C, 0x63,
-        0xF9, 0xD6, 0xA7, 0x88, 0x45, 0x6A, 0x1B, 0x34, 0x73, 0x5C, 0x2D, 0x02,
-        0xCF, 0xE0, 0x91, 0xBE, 0x24, 0x0B, 0x7A, 0x55, 0x98, 0xB7, 0xC6, 0xE9,
-        0xDD, 0xF2, 0x83, 0xAC, 0x61, 0x4E, 0x3F, 0x10, 0x8A, 0xA5, 0xD4, 0xFB,
-        0x36, 0x19, 0x68, 0x47, 0xE6, 0xC9, 0xB8, 0x97, 0x5A, 0x75, 0x04, 0x2B,
-        0xB1, 0x9E, 0xEF, 0xC0, 0x0D, 0x22, 0x53, 0x7C, 0x48, 0x67, 0x16, 0x39,
-        0xF4, 0xDB, 0xAA, 0x85, 0x1F, 0x30, 0x41, 0x6E, 0xA3, 0x8C, 0xFD, 0xD2,
-        0x95, 0xBA, 0xCB, 0xE4, 0x29, 0x06, 0x77, 0x58, 0xC2, 0xED, 0x9C, 0xB3,
-        0x7E, 0x51, 0x20, 0x0F, 0x3B, 0x14, 0x65, 0x4A, 0x87, 0xA8, 0xD9, 0xF6,
-        0x6C, 0x43, 0x32, 0x1D, 0xD0, 0xFF, 0x8E, 0xA1, 0xE3, 0xCC, 0xBD, 0x92,
-        0x5F, 0x70, 0x01, 0x2E, 0xB4, 0x9B, 0xEA, 0xC5, 0x08, 0x27, 0x56, 0x79,
-        0x4D, 0x62, 0x13, 0x3C, 0xF1, 0xDE, 0xAF, 0x80, 0x1A, 0x35, 0x44, 0x6B,
-        0xA6, 0x89, 0xF8, 0xD7, 0x90, 0xBF, 0xCE, 0xE1, 0x2C, 0x03, 0x72, 0x5D,
-        0xC7, 0xE8, 0x99, 0xB6, 0x7B, 0x54, 0x25, 0x0A, 0x3E, 0x11, 0x60, 0x4F,
-        0x82, 0xAD, 0xDC, 0xF3, 0x69, 0x46, 0x37, 0x18, 0xD5, 0xFA, 0x8B, 0xA4,
-        0x05, 0x2A, 0x5B, 0x74, 0xB9, 0x96, 0xE7, 0xC8, 0x52, 0x7D, 0x0C, 0x23,
-        0xEE, 0xC1, 0xB0, 0x9F, 0xAB, 0x84, 0xF5, 0xDA, 0x17, 0x38, 0x49, 0x66,
-        0xFC, 0xD3, 0xA2, 0x8D, 0x40, 0x6F, 0x1E, 0x31, 0x76, 0x59, 0x28, 0x07,
-        0xCA, 0xE5, 0x94, 0xBB, 0x21, 0x0E, 0x7F, 0x50, 0x9D, 0xB2, 0xC3, 0xEC,
-        0xD8, 0xF7, 0x86, 0xA9, 0x64, 0x4B, 0x3A, 0x15, 0x8F, 0xA0, 0xD1, 0xFE,
-        0x33, 0x1C, 0x6D, 0x42
-    ]
+import numpy as np
+
+CRC8_H2F_TABLE = [
+    0x00, 0x2F, 0x5E, 0x71, 0xBC, 0x93, 0xE2, 0xCD, 0x57, 0x78, 0x09, 0x26,
+    0xEB, 0xC4, 0xB5, 0x9A, 0xAE, 0x81, 0xF0, 0xDF, 0x12, 0x3D, 0x4C, 0x63,
+    0xF9, 0xD6, 0xA7, 0x88, 0x45, 0x6A, 0x1B, 0x34, 0x73, 0x5C, 0x2D, 0x02,
+    0xCF, 0xE0, 0x91, 0xBE, 0x24, 0x0B, 0x7A, 0x55, 0x98, 0xB7, 0xC6, 0xE9,
+    0xDD, 0xF2, 0x83, 0xAC, 0x61, 0x4E, 0x3F, 0x10, 0x8A, 0xA5, 0xD4, 0xFB,
+    0x36, 0x19, 0x68, 0x47, 0xE6, 0xC9, 0xB8, 0x97, 0x5A, 0x75, 0x04, 0x2B,
+    0xB1, 0x9E, 0xEF, 0xC0, 0x0D, 0x22, 0x53, 0x7C, 0x48, 0x67, 0x16, 0x39,
+    0xF4, 0xDB, 0xAA, 0x85, 0x1F, 0x30, 0x41, 0x6E, 0xA3, 0x8C, 0xFD, 0xD2,
+    0x95, 0xBA, 0xCB, 0xE4, 0x29, 0x06, 0x77, 0x58, 0xC2, 0xED, 0x9C, 0xB3,
+    0x7E, 0x51, 0x20, 0x0F, 0x3B, 0x14, 0x65, 0x4A, 0x87, 0xA8, 0xD9, 0xF6,
+    0x6C, 0x43, 0x32, 0x1D, 0xD0, 0xFF, 0x8E, 0xA1, 0xE3, 0xCC, 0xBD, 0x92,
+    0x5F, 0x70, 0x01, 0x2E, 0xB4, 0x9B, 0xEA, 0xC5, 0x08, 0x27, 0x56, 0x79,
+    0x4D, 0x62, 0x13, 0x3C, 0xF1, 0xDE, 0xAF, 0x80, 0x1A, 0x35, 0x44, 0x6B,
+    0xA6, 0x89, 0xF8, 0xD7, 0x90, 0xBF, 0xCE, 0xE1, 0x2C, 0x03, 0x72, 0x5D,
+    0xC7, 0xE8, 0x99, 0xB6, 0x7B, 0x54, 0x25, 0x0A, 0x3E, 0x11, 0x60, 0x4F,
+    0x82, 0xAD, 0xDC, 0xF3, 0x69, 0x46, 0x37, 0x18, 0xD5, 0xFA, 0x8B, 0xA4,
+    0x05, 0x2A, 0x5B, 0x74, 0xB9, 0x96, 0xE7, 0xC8, 0x52, 0x7D, 0x0C, 0x23,
+    0xEE, 0xC1, 0xB0, 0x9F, 0xAB, 0x84, 0xF5, 0xDA, 0x17, 0x38, 0x49, 0x66,
+    0xFC, 0xD3, 0xA2, 0x8D, 0x40, 0x6F, 0x1E, 0x31, 0x76, 0x59, 0x28, 0x07,
+    0xCA, 0xE5, 0x94, 0xBB, 0x21, 0x0E, 0x7F, 0x50, 0x9D, 0xB2, 0xC3, 0xEC,
+    0xD8, 0xF7, 0x86, 0xA9, 0x64, 0x4B, 0x3A, 0x15, 0x8F, 0xA0, 0xD1, 0xFE,
+    0x33, 0x1C, 0x6D, 0x42
+]
+
+# Same table as a NumPy array, to look up the CRC of many payloads at once
+CRC8_H2F_ARRAY = np.array(CRC8_H2F_TABLE, dtype=np.uint8)
+
 
+def compute_crc8_h2f(data):
+    crc_8h2f_table = CRC8_H2F_TABLE
     crc = 0xFF
     for byte in data:
         crc = crc_8h2f_table[crc ^ byte]
@@ -31,29 +38,91 @@ def compute_crc8_h2f(data):
     return crc
 
 
+# Computes the CRC of the first length - 1 bytes of each row of a matrix of
+# payloads, one table lookup per column for all the rows.
+def compute_crc8_h2f_rows(payloads):
+    crc = np.full(len(payloads), 0xFF, dtype=np.uint8)
+    for column in range(payloads.shape[1] - 1):
+        crc = CRC8_H2F_ARRAY[crc ^ payloads[:, column]]
+    return crc ^ 0xFF
+
+
 class CrcVerifier:
 
-    def __init__(self):
+    def __init__(self, dbc=None, batch_size=None):
+        """
+        Keyword arguments:
+        dbc -- Database whose messages with a 'NCrc' signal are listed
+        upfront, otherwise messages are checked for it when first seen.
+        batch_size -- When given, the frames to check are buffered and their
+        CRC computed by batches of batch_size frames with NumPy. The results
+        are the same as when checking frames one by one, once flushed.
+        """
         self.invalid_frames = {}
+        self.recorded_errors = set()
         self.count = 0
+        self.batch_size = batch_size
+        self.pending_frames = []
+        self.crc_messages = {}
+        if dbc is not None:
+            for msg in dbc.messages:
+                self.has_crc(msg)
+
+    def has_crc(self, msg):
+        has_crc = self.crc_messages.get(msg.name)
+        if has_crc is None:
+            has_crc = self.crc_messages[msg.name] = any(s.name == 'NCrc' for s in msg.signals)
+        return has_crc
 
     def check_frame(self, frame, msg):
         # Only check frames with a signal named 'NCrc'
-        if not any(s.name == 'NCrc' for s in msg.signals):
+        if not self.has_crc(msg):
             return
 
-        # Nothing to do if the CRC is correct
         data = frame.data
+        if self.batch_size is not None and data:
+            self.pending_frames.append((data, msg))
+            if len(self.pending_frames) >= self.batch_size:
+                self.flush()
+            return
+
+        # Nothing to do if the CRC is correct
         expected_crc = compute_crc8_h2f(data[:-1])
         actual_crc = data[-1]
-        if actual_crc == expected_crc:
+        if actual_crc != expected_crc:
+            self.record_error(msg, data, expected_crc, actual_crc)
+
+    def flush(self):
+        # Checks the buffered frames, grouped by payload length, then records
+        # their errors in the order in which the frames were received
+        pending = self.pending_frames
+        if not pending:
             return
+        self.pending_frames = []
+
+        indices_by_length = {}
+        for index, (data, _) in enumerate(pending):
+            indices_by_length.setdefault(len(data), []).append(index)
+
+        errors = []
+        for length, indices in indices_by_length.items():
+            buffer = b''.join([pending[i][0] for i in indices])
+            payloads = np.frombuffer(buffer, dtype=np.uint8).reshape(len(indices), length)
+            expected = compute_crc8_h2f_rows(payloads)
+            invalid = np.flatnonzero(expected != payloads[:, -1])
+            errors.extend((indices[row], int(expected[row])) for row in invalid)
+
+        for index, expected_crc in sorted(errors):
+            data, msg = pending[index]
+            self.record_error(msg, data, expected_crc, data[-1])
 
+    def record_error(self, msg, data, expected_crc, actual_crc):
         # Recurring CRC errors are only recorded once
         existing = self.invalid_frames.setdefault(msg.name, [])
-        if any(e['expected_crc'] == expected_crc and
-               e['actual_crc'] == actual_crc for e in existing):
+        key = (msg.name, expected_crc, actual_crc)
+        if key in self.recorded_errors:
             return
+        self.recorded_errors.add(key)
 
         # Record information regarding each frame with an invalid CRC
         self.count = self.count + 1
@@ -66,6 +135,7 @@ class CrcVerifier:
 
     def write_json_report(self, filepath):
         import json
+        self.flush()
         report = []
 
         for name, errors in self.invalid_frames.items():
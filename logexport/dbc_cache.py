@@ -0,0 +1,99 @@
+import gc
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+import cantools
+
+DBC_CACHE_VERSION = 1
+
+
+def dbc_cache_key(dbc_file):
+    # The cached database is only valid for the same DBC content parsed by the
+    # same version of cantools, whose Message objects are pickled as they are
+    sha256 = hashlib.sha256()
+    with open(dbc_file, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    return {'version': DBC_CACHE_VERSION, 'cantools': cantools.__version__,
+            'sha256': sha256.hexdigest()}
+
+
+def dbc_cache_file(dbc_file, cache_dir, key):
+    # Named after the DBC file and the hash of its resolved path, so that the
+    # DBC files of the same name in different directories have their own entry
+    path_sha256 = hashlib.sha256(str(Path(dbc_file).resolve()).encode()).hexdigest()
+    return Path(cache_dir,
+                f'{Path(dbc_file).stem}.{path_sha256[:8]}.{key["sha256"][:16]}.pickle')
+
+
+def read_cached_dbc(cache_file, key):
+    # Returns the cached database when its key matches, and the reason for
+    # parsing the DBC again otherwise
+    if not cache_file.exists():
+        return None, 'no cached database'
+    try:
+        with open(cache_file, 'rb') as f:
+            if pickle.load(f) != key:
+                return None, 'cached database is outdated'
+            # The garbage collector would otherwise run many times while the
+            # objects of the database are created, for nothing to collect
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                return pickle.load(f), None
+            finally:
+                if gc_enabled:
+                    gc.enable()
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError,
+            TypeError, ValueError) as e:
+        return None, f'cached database unreadable ({e!r})'
+
+
+def write_cached_dbc(cache_file, key, dbc):
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    # The entries of previous versions of the same DBC file (same name and
+    # path) are removed, and the new one only replaces an existing one once
+    # complete (several processes may write it at the same time)
+    stem = cache_file.name.rsplit('.', 2)[0]
+    for previous_file in cache_file.parent.glob('*.pickle'):
+        if previous_file.name.rsplit('.', 2)[0] == stem and previous_file != cache_file:
+            previous_file.unlink(missing_ok=True)
+    temporary_file = cache_file.with_name(f'{cache_file.name}.{os.getpid()}.tmp')
+    with open(temporary_file, 'wb') as f:
+        pickle.dump(key, f, pickle.HIGHEST_PROTOCOL)
+        pickle.dump(dbc, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_file, cache_file)
+
+
+def load_dbc(dbc_file, cache_dir=None):
+    """
+    Loads a DBC file with cantools, keeping the parsed database in cache_dir
+    so that the following loads of the same file skip the parsing, which takes
+    seconds for large DBCs. Along with the messages, the cache holds the
+    tables cantools derives from them when parsing (the encoding and decoding
+    tables of the signals, the signal trees and multiplexer values).
+
+    The cached database is keyed by the SHA256 of the DBC file and the version
+    of cantools, and parsed again whenever one of them changed or the cache
+    cannot be read. With cache_dir set to None, the DBC is always parsed.
+    """
+    if cache_dir is None:
+        return cantools.database.load_file(dbc_file)
+
+    key = dbc_cache_key(dbc_file)
+    cache_file = dbc_cache_file(dbc_file, cache_dir, key)
+    dbc, reason = read_cached_dbc(cache_file, key)
+    if dbc is not None:
+        print(f'> DBC loaded from cache: {cache_file}')
+        return dbc
+
+    dbc = cantools.database.load_file(dbc_file)
+    try:
+        write_cached_dbc(cache_file, key, dbc)
+    except OSError as e:
+        print(f'> DBC cache not written ({e!r})')
+    else:
+        print(f'> DBC parsed and cached ({reason}): {cache_file}')
+    return dbc
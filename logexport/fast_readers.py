@@ -0,0 +1,266 @@
+import locale
+import re
+from collections import namedtuple
+
+import can
+from can.io.asc import ASC_MESSAGE_REGEX, ASC_TRIGGER_REGEX
+from can.util import dlc2len
+
+# Attributes of a frame used while exporting it, lighter than can.Message
+FrameRecord = namedtuple('FrameRecord', ['timestamp', 'arbitration_id', 'channel', 'dlc', 'data'])
+
+TIMESTAMP_PATTERN = re.compile(r'\d+\.\d+', re.ASCII)
+MEASUREMENT_START_PATTERN = re.compile(r'^\d+\.\d+\s+Start of measurement')
+
+
+def frame_record(msg):
+    return FrameRecord(msg.timestamp, msg.arbitration_id, msg.channel, msg.dlc, bytes(msg.data))
+
+
+def parse_hex_bytes(tokens):
+    # Payload bytes written with two hex digits are converted all at once
+    text = ''.join(tokens)
+    if len(text) == 2 * len(tokens):
+        return bytes.fromhex(text)
+    return bytes(int(token, 16) for token in tokens)
+
+
+# Base of the fast text readers. The file is read by blocks of block_size
+# characters that are split into lines, and the lines in the usual form are
+# parsed directly into FrameRecord tuples, while the others are parsed by the
+# python-can reader, so that the frames are the same as with python-can.
+#
+# When a frame_filter is given, it is called with the arbitration ID of the
+# frames parsed directly, and the frames it rejects are only counted in
+# skipped_count, without their payload being parsed.
+#
+# A reader given the reader_state of a previous reader of the same log skips
+# the header, so that the reading can resume in the middle of the file.
+class FastTextReader:
+    reader_class = None
+
+    def __init__(self, file, frame_filter=None, block_size=1024 * 1024, state=None):
+        if isinstance(file, str) or hasattr(file, '__fspath__'):
+            file = open(file, 'r', encoding=locale.getpreferredencoding(False))
+        self.file = file
+        self.reader = self.reader_class(file)
+        self.frame_filter = frame_filter
+        self.block_size = block_size
+        self.skipped_count = 0
+        self.listed_ids = {}
+        self.resumed = state is not None
+        if self.resumed:
+            vars(self.reader).update(state['attributes'])
+            for name, method in state['methods'].items():
+                setattr(self.reader, name, getattr(self.reader, method))
+
+    def reader_state(self):
+        # Attributes of the python-can reader set from the header (and for ASC
+        # files, from the trigger blocks), the parsing methods it selected
+        # being recorded by name
+        attributes = {}
+        methods = {}
+        for name, value in vars(self.reader).items():
+            if name == 'file':
+                continue
+            if getattr(value, '__self__', None) is self.reader:
+                methods[name] = value.__name__
+            else:
+                attributes[name] = value
+        return {'attributes': attributes, 'methods': methods}
+
+    def is_listed(self, arbitration_id):
+        listed = self.listed_ids.get(arbitration_id)
+        if listed is None:
+            listed = self.listed_ids[arbitration_id] = self.frame_filter(arbitration_id)
+        return listed
+
+    def lines(self):
+        # Lines are split on '\n' only, as the file iterator does once the
+        # newlines have been translated by the text file
+        leftover = ''
+        while True:
+            block = self.file.read(self.block_size)
+            if not block:
+                break
+            lines = (leftover + block).split('\n')
+            leftover = lines.pop()
+            yield from lines
+        if leftover:
+            yield leftover
+
+    def stop(self):
+        self.reader.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class FastASCReader(FastTextReader):
+    reader_class = can.ASCReader
+
+    def parse_line(self, line):
+        # Same as the loop body of can.ASCReader.__iter__ for a stripped line
+        reader = self.reader
+        trigger_match = ASC_TRIGGER_REGEX.match(line)
+        if trigger_match:
+            datetime_str = trigger_match.group('datetime_string')
+            reader.start_time = (0.0 if reader.relative_timestamp
+                                 else reader._datetime_to_timestamp(datetime_str))
+            return None
+
+        if MEASUREMENT_START_PATTERN.match(line) or not ASC_MESSAGE_REGEX.match(line):
+            return None
+
+        msg_kwargs = {}
+        try:
+            _timestamp, channel, rest_of_message = line.split(None, 2)
+            msg_kwargs['timestamp'] = float(_timestamp) + reader.start_time
+            if channel == 'CANFD':
+                msg_kwargs['is_fd'] = True
+            elif channel.isdigit():
+                msg_kwargs['channel'] = int(channel) - 1
+            else:
+                return None
+        except ValueError:
+            return None
+
+        if 'is_fd' not in msg_kwargs:
+            msg = reader._process_classic_can_frame(rest_of_message, msg_kwargs)
+        else:
+            msg = reader._process_fd_can_frame(rest_of_message, msg_kwargs)
+        return frame_record(msg)
+
+    def __iter__(self):
+        reader = self.reader
+        if not self.resumed:
+            reader._extract_header()
+        base = reader._converted_base
+        frame_filter = self.frame_filter
+        start_time = reader.start_time
+
+        for line in self.lines():
+            line = line.strip()
+            tokens = line.split()
+
+            # Classic data frame: '<time> <channel> <id>[x] Rx|Tx d <dlc> <data>'
+            if (len(tokens) >= 6 and tokens[4] == 'd' and tokens[3] in ('Rx', 'Tx')
+                    and tokens[1].isdigit() and tokens[1].isascii()
+                    and tokens[2].isalnum() and tokens[2].isascii()
+                    and tokens[5].isalnum() and TIMESTAMP_PATTERN.fullmatch(tokens[0])):
+                can_id = tokens[2]
+                if can_id[-1] in 'xX':
+                    can_id = can_id[:-1]
+                arbitration_id = int(can_id, base)
+                if frame_filter is not None and not self.is_listed(arbitration_id):
+                    self.skipped_count += 1
+                    continue
+
+                dlc = dlc2len(int(tokens[5], base))
+                data_tokens = tokens[6:6 + min(8, dlc)]
+                if base == 16:
+                    data = parse_hex_bytes(data_tokens)
+                else:
+                    data = bytes(int(token, base) for token in data_tokens)
+                yield FrameRecord(float(tokens[0]) + start_time, arbitration_id,
+                                  int(tokens[1]) - 1, dlc, data)
+                continue
+
+            # CAN FD data frame without symbolic name:
+            # '<time> CANFD <channel> Rx|Tx <id>[x] <brs> <esi> <dlc> <length> <data>'
+            if (len(tokens) >= 10 and tokens[1] == 'CANFD' and tokens[2].isdigit()
+                    and tokens[2].isascii() and tokens[4].isalnum() and tokens[4].isascii()
+                    and tokens[5].isdigit() and tokens[8].isdigit() and tokens[8].isascii()
+                    and tokens[4][:10].lower() != 'errorframe'
+                    and TIMESTAMP_PATTERN.fullmatch(tokens[0])):
+                can_id = tokens[4]
+                if can_id[-1] in 'xX':
+                    can_id = can_id[:-1]
+                arbitration_id = int(can_id, base)
+                data_length = int(tokens[8])
+                # Remote frames and DLC mismatches (which python-can warns
+                # about) are left to the python-can parsing
+                if data_length and dlc2len(int(tokens[7], base)) == data_length:
+                    if frame_filter is not None and not self.is_listed(arbitration_id):
+                        self.skipped_count += 1
+                        continue
+
+                    data_tokens = tokens[9:9 + data_length]
+                    if base == 16:
+                        data = parse_hex_bytes(data_tokens)
+                    else:
+                        data = bytes(int(token, base) for token in data_tokens)
+                    yield FrameRecord(float(tokens[0]) + start_time, arbitration_id,
+                                      int(tokens[2]) - 1, data_length, data)
+                    continue
+
+            if not line:
+                continue
+            frame = self.parse_line(line)
+            start_time = reader.start_time
+            if frame is not None:
+                yield frame
+
+        self.stop()
+
+
+class FastTRCReader(FastTextReader):
+    reader_class = can.TRCReader
+
+    def parse_line(self, line):
+        msg = self.reader._parse_line(line)
+        return None if msg is None else frame_record(msg)
+
+    def __iter__(self):
+        reader = self.reader
+        first_line = None if self.resumed else reader._extract_header()
+
+        if first_line is not None:
+            frame = self.parse_line(first_line)
+            if frame is not None:
+                yield frame
+
+        # Only the classic data frames of version 2.x files are parsed directly
+        columns = reader.columns
+        fast = reader._parse_cols == reader._parse_cols_v2_x and 'L' in columns \
+            and 'l' not in columns
+        if fast:
+            max_split = reader._num_columns
+            type_index = columns['T']
+            time_index = columns['O']
+            id_index = columns['I']
+            dlc_index = columns['L']
+            data_index = columns['D']
+            bus_index = columns.get('B')
+            min_count = max(columns.values()) + 1
+        start_time = reader._start_time
+        frame_filter = self.frame_filter
+
+        for line in self.lines():
+            line = line.strip()
+            if not line or line.startswith(';'):
+                continue
+
+            if fast:
+                cols = line.split(maxsplit=max_split)
+                if len(cols) >= min_count and cols[type_index] == 'DT':
+                    can_id = cols[id_index]
+                    arbitration_id = int(can_id, 16)
+                    if frame_filter is not None and not self.is_listed(arbitration_id):
+                        self.skipped_count += 1
+                        continue
+
+                    dlc = int(cols[dlc_index])
+                    yield FrameRecord(float(cols[time_index]) / 1000 + start_time, arbitration_id,
+                                      int(cols[bus_index]) if bus_index is not None else 1,
+                                      dlc, bytes.fromhex(cols[data_index]) if dlc else b'')
+                    continue
+
+            frame = self.parse_line(line)
+            if frame is not None:
+                yield frame
+
+        self.stop()
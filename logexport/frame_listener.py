@@ -0,0 +1,33 @@
+# Events of the accepted frames a frame listener can subscribe to: the frames
+# decoded without error, and those whose decoding raised a DecodeError
+DECODED = 'decoded'
+DECODE_ERROR = 'decode_error'
+ALL_EVENTS = frozenset({DECODED, DECODE_ERROR})
+
+
+class FrameListener:
+    """
+    Listener of the accepted frames of a LogExport (see add_listener).
+
+    subscribe is called once for each message of the DBC, when its first frame
+    is seen, and returns the events the listener needs for the frames of that
+    message (a set, empty when not interested in the message at all).
+    process_frame is then only called for these frames, so that the other
+    frames cost nothing to the listener. Listeners without a subscribe method
+    are given every accepted frame.
+
+    With selective decoding, required_signals returns the names of the signals
+    of a message the listener reads from the decoded values of its frames,
+    which are then decoded even if they are not accepted. When it returns None
+    (or is not defined), every signal of the messages the listener subscribes
+    to is decoded.
+    """
+
+    def subscribe(self, msg):
+        return ALL_EVENTS
+
+    def required_signals(self, msg):
+        return None
+
+    def process_frame(self, frame, msg, decoded_values, error):
+        pass
@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+import can
+import numpy as np
+
+import main
+from dbc_cache import load_dbc
+from frame_listener import FrameListener
+from helpers_hvhv import hvhv_shortname
+from logexport import *
+from autofile import *
+
+
+# Records the delay between the reception of each accepted frame (its
+# timestamp, as given by the interface) and the moment it is decoded and
+# stored. Only meaningful with interfaces timestamping the frames with the
+# system clock, such as the virtual and socketcan interfaces.
+class LatencyRecorder(FrameListener):
+    def __init__(self):
+        self.latencies = array('d')
+
+    def required_signals(self, msg):
+        return set()
+
+    def process_frame(self, frame, msg, decoded_values, error):
+        self.latencies.append(time.time() - frame.timestamp)
+
+    def statistics(self):
+        if not self.latencies:
+            return None
+        latencies = np.frombuffer(self.latencies, dtype=np.float64)
+        return {'frame_count': len(latencies),
+                'mean': float(latencies.mean()),
+                'p50': float(np.percentile(latencies, 50)),
+                'p99': float(np.percentile(latencies, 99)),
+                'max': float(latencies.max())}
+
+
+class LiveExport:
+    """
+    Exports the frames received from a python-can bus while they arrive, as a
+    sequence of segments each written to its own output files, so that the
+    signals of a test can be looked at while it is running.
+
+    Each segment is processed by a new LogExport given by new_export (e.g. a
+    partial of LogExport sharing an already loaded DBC), on the thread calling
+    run. A segment is closed once it holds roll_frames accepted frames, or when
+    a frame is received roll_period seconds (of frame timestamps) after the
+    start of the capture's current period, and it is then written by write_csv
+    on a writer thread while the next segment is filled. The segments are
+    named '<name>_<index>'; write_queue_size bounds the number of closed
+    segments waiting to be written.
+
+    With batch decoding, the frames are decoded as soon as the bus is idle,
+    and at the latest max_latency seconds after the oldest buffered frame was
+    received, so that the delay of each frame stays bounded even on a
+    saturated bus. With measure_latency, the delay of each accepted frame is
+    recorded (see LatencyRecorder) and reported with each segment.
+
+    Relative timestamps and time windows are counted from the first frame of
+    the capture in every segment.
+    """
+
+    def __init__(self, bus, new_export, output_dir, name='live',
+                 roll_frames=None, roll_period=None, max_latency=0.05, poll_interval=0.05,
+                 measure_latency=False, allow_truncated=True, write_queue_size=2):
+        self.bus = bus
+        self.new_export = new_export
+        self.output_dir = Path(output_dir)
+        self.name = name
+        self.roll_frames = roll_frames
+        self.roll_period = roll_period
+        self.max_latency = max_latency
+        self.poll_interval = poll_interval
+        self.measure_latency = measure_latency
+        self.allow_truncated = allow_truncated
+        self.write_queue_size = write_queue_size
+        self.stopped = threading.Event()
+        self.export = None
+        self.latency_recorder = None
+        self.capture_start = None
+        self.segment_start = None
+        self.segment_count = 0
+        self.pending_since = None
+        self.received_count = 0
+        self.writer = None
+        self.writes = []
+        self.segments = []
+
+    def stop(self):
+        # May be called from another thread, the current segment is then
+        # written before run returns
+        self.stopped.set()
+
+    def run(self, duration=None, frame_count=None):
+        """
+        Receives and exports the frames of the bus until stop is called, for
+        duration seconds, or until frame_count frames are received, whichever
+        comes first, or until interrupted by KeyboardInterrupt (Ctrl+C).
+        Returns the summary of the capture, also written into
+        '<name>_summary.json'.
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.stopped.clear()
+        deadline = None if duration is None else perf_counter() + duration
+        time_start = perf_counter()
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='live-writer')
+        try:
+            while not self.stopped.is_set():
+                if deadline is not None and perf_counter() >= deadline:
+                    break
+                frame = self.bus.recv(0)
+                if frame is None:
+                    # The bus is idle: the buffered frames are decoded now
+                    self.flush()
+                    frame = self.bus.recv(self.poll_interval)
+                    if frame is None:
+                        continue
+                self.process_frame(frame)
+                if frame_count is not None and self.received_count >= frame_count:
+                    break
+        except KeyboardInterrupt:
+            print('> Capture stopped')
+        finally:
+            self.roll()
+            self.writer.shutdown(wait=True)
+        time_stop = perf_counter()
+
+        # Raises the first error of the writer thread
+        for future in self.writes:
+            self.segments.append(future.result())
+        self.writes = []
+
+        elapsed_time = time_stop - time_start
+        summary = {
+            'elapsed_time': elapsed_time,
+            'received_frame_count': self.received_count,
+            'frames_per_second': self.received_count / elapsed_time if elapsed_time else None,
+            'segment_count': len(self.segments),
+            'segments': self.segments,
+        }
+        summary_path = Path(self.output_dir, f'{self.name}_summary.json')
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f, indent=4)
+        print(f'> Received {self.received_count} frames in {round(elapsed_time)}s, '
+              f'written as {len(self.segments)} segment(s)')
+        print(f'> Capture summary written to: {os.path.abspath(summary_path)}')
+        return summary
+
+    def process_frame(self, frame):
+        self.received_count += 1
+        if self.capture_start is None:
+            self.capture_start = frame.timestamp
+        if self.export is None:
+            self.start_segment(frame.timestamp)
+        elif self.roll_period is not None and frame.timestamp - self.segment_start >= self.roll_period:
+            self.roll()
+            self.start_segment(frame.timestamp)
+
+        export = self.export
+        export.process_frame(frame, allow_truncated=self.allow_truncated)
+        if export.pending_frames:
+            if self.pending_since is None:
+                self.pending_since = perf_counter()
+            elif perf_counter() - self.pending_since >= self.max_latency:
+                self.flush()
+        else:
+            self.pending_since = None
+
+        if self.roll_frames is not None and export.accepted_frame_count >= self.roll_frames:
+            self.roll()
+
+    def flush(self):
+        if self.export is not None:
+            self.export.flush()
+        self.pending_since = None
+
+    def start_segment(self, timestamp):
+        if self.roll_period is None:
+            self.segment_start = timestamp
+        else:
+            # The periods are counted from the start of the capture, so that a
+            # quiet bus does not shift the following segments
+            periods = (timestamp - self.capture_start) // self.roll_period
+            self.segment_start = self.capture_start + periods * self.roll_period
+
+        export = self.new_export()
+        export.set_log_start(self.capture_start)
+        export.timestamp_recorder.origin = self.capture_start
+        self.latency_recorder = None
+        if self.measure_latency:
+            self.latency_recorder = LatencyRecorder()
+            export.add_listener(self.latency_recorder)
+        self.export = export
+
+    def roll(self):
+        # Hands the current segment over to the writer thread, waiting for the
+        # oldest writes when too many segments are queued
+        export = self.export
+        if export is None:
+            return
+        self.flush()
+        self.export = None
+        self.segment_count += 1
+        name = f'{self.name}_{self.segment_count:04d}'
+
+        while len(self.writes) >= self.write_queue_size:
+            self.segments.append(self.writes.pop(0).result())
+        self.writes.append(self.writer.submit(self.write_segment, export, name,
+                                              self.latency_recorder))
+
+    def write_segment(self, export, name, latency_recorder):
+        output_file = export.write_csv(self.output_dir, str(Path(self.output_dir, name)),
+                                       use_direct_zip=True)
+        summary = {'segment': name, 'output_file': output_file}
+        summary.update(export.summary())
+        if latency_recorder is not None:
+            summary['latency'] = latency_recorder.statistics()
+        return summary
+
+
+def new_live_export(dbc):
+    # Same settings as main.export_file
+    return LogExport(dbc, DbcFilter(accept_all=True),
+                     signal_renamer=hvhv_shortname,
+                     use_time_grouping=True,
+                     target_channel=AutoChannel,
+                     use_columnar_storage=True,
+                     use_batch_decoding=True,
+                     timestamp_precision=main.TIMESTAMP_PRECISION,
+                     show_progress=False)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Export the frames of a CAN bus while they are received, rolling the output files.')
+    parser.add_argument('--interface', default='virtual', help='python-can interface, e.g. socketcan')
+    parser.add_argument('--channel', default='vcan0', help='channel of the interface')
+    parser.add_argument('--bitrate', type=int, default=None, help='bitrate of the bus')
+    parser.add_argument('--dbc', help='DBC file, by default the most recent one in DBC_DIR')
+    parser.add_argument('--output', default=str(Path(main.OUTPUT_DIR, 'live')),
+                        help='directory receiving the segments')
+    parser.add_argument('--name', default='live', help='prefix of the segment files')
+    parser.add_argument('--roll-frames', type=int, default=None,
+                        help='number of accepted frames of each segment')
+    parser.add_argument('--roll-period', type=float, default=60,
+                        help='duration of each segment in seconds')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='duration of the capture in seconds, until interrupted by default')
+    parser.add_argument('--latency', action='store_true',
+                        help='report the delay between the reception and the decoding of the frames')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    dbc_file = args.dbc or guess_dbc_file(main.DBC_DIR)
+    if dbc_file:
+        dbc = load_dbc(dbc_file, main.DBC_CACHE_DIR)
+        bus_options = {} if args.bitrate is None else {'bitrate': args.bitrate}
+        with can.Bus(interface=args.interface, channel=args.channel, **bus_options) as bus:
+            live = LiveExport(bus, lambda: new_live_export(dbc), args.output, args.name,
+                              roll_frames=args.roll_frames, roll_period=args.roll_period,
+                              measure_latency=args.latency)
+            print(f'> Capturing {args.interface} channel {args.channel}, press Ctrl+C to stop')
+            live.run(args.duration)
@@ -1,6 +1,19 @@
 import csv
+import os
+import pickle
+import tempfile
+from array import array
+from itertools import chain, islice
 from pathlib import Path
 
+import numpy as np
+
+from resample import forward_fill, forward_fill_index
+from timestamps import TimestampRecorder
+
+# Number of rows whose timestamps are converted at once when writing a group
+TIMESTAMP_CHUNK_SIZE = 65536
+
 
 # Constructs a new time base name from the message name and the value of the
 # multiplexer signal.
@@ -15,14 +28,44 @@ def get_signal_unit(msg, signal_name):
                 return signal.unit
 
 
+# Selects the array type code able to hold the decoded values of a signal
+# without changing their Python type: 'q' when cantools decodes the signal to
+# an int, 'd' when it decodes it to a float. Whether the values of an integer
+# signal with an integral scale and offset are ints depends on the types of
+# these and on the version of cantools, so the conversion itself is asked.
+def field_typecode(signal):
+    conversion = signal.conversion
+    if conversion.is_float:
+        return 'd'
+    return 'q' if isinstance(conversion.raw_to_scaled(1, False), int) else 'd'
+
+
+# Converts a list of values of a field into a NumPy array of the type selected
+# by field_typecode. Integers that do not fit 64-bit signed integers are kept
+# as unsigned integers.
+def value_array(values, typecode):
+    if typecode == 'd':
+        return np.array(values, dtype=np.float64)
+    try:
+        return np.array(values, dtype=np.int64)
+    except OverflowError:
+        return np.array(values, dtype=np.uint64)
+
+
+# The timestamps of the rows are the POSIX timestamps of the frames, converted
+# into absolute or relative time by timestamp_recorder when the group is
+# written (absolute time when no recorder is given).
 class LogDataGroup:
-    def __init__(self, signal_renamer, name=None):
+    def __init__(self, signal_renamer, name=None, timestamp_recorder=None):
         self.name = 'Default Group' if name is None else name
         self.signal_renamer = signal_renamer
+        self.timestamp_recorder = timestamp_recorder or TimestampRecorder(False)
         self.fieldnames = ['timestamp']
         self.units = {}
         self.rows = []
         self.counts = {'timestamp': 0}
+        self.typecodes = {}
+        self.sources = {}
 
     def add_field(self, msg, signal_name):
         fieldname = self.signal_renamer(msg.name, signal_name)
@@ -31,6 +74,8 @@ class LogDataGroup:
         unit = get_signal_unit(msg, signal_name)
         if unit:
             self.units[fieldname] = unit
+        self.typecodes[fieldname] = field_typecode(msg.get_signal_by_name(signal_name))
+        self.sources[fieldname] = {'message': msg.name, 'signal': signal_name}
 
     def add_field_values(self, decoded_values):
         self.rows.append(decoded_values)
@@ -43,27 +88,51 @@ class LogDataGroup:
         # also be initially created for a given multiplexer value but remain
         # empty if the message is never transmitted with that value.
         for fieldname in self.counts:
-            if self.counts[fieldname] == 0:
+            if self.counts[fieldname] == 0 and fieldname in self.fieldnames:
                 self.fieldnames.remove(fieldname)
                 if fieldname in self.units:
                     del self.units[fieldname]
 
-    def write_csv(self, output_path, delimiter=','):
+    def csv_path(self, output_path):
         if output_path.is_dir():
-            output = Path(output_path, self.name + '.csv')
+            return Path(output_path, self.name + '.csv')
         else:
-            output = Path(output_path.parent, output_path.name + '.csv')
+            return Path(output_path.parent, output_path.name + '.csv')
 
+    def write_csv(self, output_path, delimiter=','):
+        output = self.csv_path(output_path)
         with open(output, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, delimiter=delimiter,
-                                    fieldnames=self.fieldnames)
-            writer.writeheader()
-            # The unit line must be written to the CSV even if it is empty
-            writer.writerows([self.units])
-            writer.writerows(self.rows)
-
+            self.write_csv_stream(csvfile, delimiter)
         return output
 
+    def write_csv_stream(self, csvfile, delimiter=','):
+        writer = csv.writer(csvfile, delimiter=delimiter)
+        writer.writerow(self.fieldnames)
+        # The unit line must be written to the CSV even if it is empty
+        writer.writerow([self.units.get(fieldname, '') for fieldname in self.fieldnames])
+        fieldnames = self.fieldnames[1:]
+        for start in range(0, len(self.rows), TIMESTAMP_CHUNK_SIZE):
+            rows = self.rows[start:start + TIMESTAMP_CHUNK_SIZE]
+            texts = self.timestamp_recorder.to_text([row['timestamp'] for row in rows])
+            writer.writerows([text] + [row.get(fieldname, '') for fieldname in fieldnames]
+                             for text, row in zip(texts, rows))
+
+    def value_fieldnames(self):
+        return [fieldname for fieldname in self.fieldnames if fieldname != 'timestamp']
+
+    def column_data(self):
+        # Returns the timestamps and, for each field to be exported, the array
+        # of its values along with the mask of the rows where it is present.
+        # Missing values are stored as zeros.
+        timestamps = self.timestamp_recorder.to_array([row['timestamp'] for row in self.rows])
+        columns = {}
+        for fieldname in self.value_fieldnames():
+            valid = np.array([fieldname in row for row in self.rows], dtype=bool)
+            values = value_array([row.get(fieldname, 0) for row in self.rows],
+                                 self.typecodes[fieldname])
+            columns[fieldname] = (values, valid)
+        return timestamps, columns
+
     def sample_and_hold(self):
         if len(self.rows) > 1:
             for key in self.rows[-2]:
@@ -71,11 +140,356 @@ class LogDataGroup:
                     self.rows[-1][key] = self.rows[-2][key]
 
 
+# Stores the values of a group column by column instead of one dict per row:
+# one typed array per field, completed by a validity mask telling whether the
+# field was present in the row, plus the array of row timestamps. Missing values
+# are stored as zeros and are only distinguished through the validity mask.
+#
+# With sample and hold, the missing values are not copied row by row but
+# filled from the previous values when the columns are read, all at once.
+#
+# The rows held in memory can be spilled to a file as a chunk of columns (see
+# LogExport.limit_memory). The columns are then read chunk by chunk, in the
+# order of the rows, when the group is written.
+class ColumnarLogDataGroup(LogDataGroup):
+    held = False
+    spill_path = None
+
+    def __init__(self, signal_renamer, name=None, timestamp_recorder=None):
+        super().__init__(signal_renamer, name, timestamp_recorder)
+        self.timestamps = array('d')
+        self.columns = {}
+        self.validity = {}
+
+    def add_field(self, msg, signal_name):
+        super().add_field(msg, signal_name)
+        fieldname = self.fieldnames[-1]
+        if fieldname in self.columns:
+            return
+
+        # Fields created after some rows were stored (which happens in a
+        # LogDataTable) are padded with missing values.
+        row_count = len(self.timestamps)
+        self.columns[fieldname] = array(self.typecodes[fieldname], bytes(row_count * 8))
+        self.validity[fieldname] = bytearray(row_count)
+
+    def add_field_values(self, decoded_values):
+        self.timestamps.append(decoded_values['timestamp'])
+        self.counts['timestamp'] += 1
+
+        for fieldname, column in self.columns.items():
+            if fieldname in decoded_values:
+                value = decoded_values[fieldname]
+                try:
+                    column.append(value)
+                except (TypeError, OverflowError):
+                    # Values that do not fit the typed array (e.g. 64-bit
+                    # unsigned integers) fall back to a plain list.
+                    column = self.columns[fieldname] = list(column)
+                    column.append(value)
+                self.validity[fieldname].append(1)
+                self.counts[fieldname] += 1
+            else:
+                column.append(0)
+                self.validity[fieldname].append(0)
+
+    def remove_empty_columns(self):
+        super().remove_empty_columns()
+        for fieldname in list(self.columns):
+            if fieldname not in self.fieldnames:
+                del self.columns[fieldname]
+                del self.validity[fieldname]
+
+    def memory_size(self):
+        # Estimated size in bytes of the rows held in memory: 8 bytes for the
+        # timestamp and each value, and 1 for each validity flag
+        return len(self.timestamps) * (8 + 9 * len(self.columns))
+
+    def spill(self, directory):
+        """
+        Appends the rows held in memory to the spill file of the group in
+        directory, as one chunk of columns, and releases them. Returns the
+        number of rows spilled.
+        """
+        row_count = len(self.timestamps)
+        if not row_count:
+            return 0
+        if self.spill_path is None:
+            handle, path = tempfile.mkstemp(suffix='.spill', dir=directory)
+            os.close(handle)
+            self.spill_path = Path(path)
+        with open(self.spill_path, 'ab') as spill:
+            pickle.dump((self.timestamps, self.columns, self.validity), spill,
+                        pickle.HIGHEST_PROTOCOL)
+
+        self.timestamps = array('d')
+        self.columns = {fieldname: array(self.typecodes[fieldname]) for fieldname in self.columns}
+        self.validity = {fieldname: bytearray() for fieldname in self.columns}
+        return row_count
+
+    def chunks(self, fieldnames):
+        # Yields the timestamps, columns and validity masks of the rows by
+        # chunks in the order of the rows: the spilled chunks, then the rows
+        # held in memory. The fields created after a chunk was spilled are
+        # missing from all its rows.
+        if self.spill_path is not None:
+            with open(self.spill_path, 'rb') as spill:
+                while True:
+                    try:
+                        timestamps, columns, validity = pickle.load(spill)
+                    except EOFError:
+                        break
+                    row_count = len(timestamps)
+                    for fieldname in fieldnames:
+                        if fieldname not in columns:
+                            columns[fieldname] = array(self.typecodes[fieldname],
+                                                       bytes(row_count * 8))
+                            validity[fieldname] = bytearray(row_count)
+                    yield timestamps, columns, validity
+        yield self.timestamps, self.columns, self.validity
+
+    def column_data(self):
+        fieldnames = self.value_fieldnames()
+        chunks = list(self.chunks(fieldnames))
+        timestamps = self.timestamp_recorder.to_array(
+            np.concatenate([np.frombuffer(chunk[0], dtype=np.float64) for chunk in chunks]))
+
+        columns = {}
+        for fieldname in fieldnames:
+            valid = np.frombuffer(b''.join(chunk[2][fieldname] for chunk in chunks),
+                                  dtype=np.uint8).astype(bool)
+            parts = [chunk[1][fieldname] for chunk in chunks]
+            if len(parts) == 1:
+                values = value_array(parts[0], self.typecodes[fieldname])
+            else:
+                values = value_array(list(chain.from_iterable(parts)), self.typecodes[fieldname])
+            if self.held:
+                values, valid = forward_fill(values, valid)
+            columns[fieldname] = (values, valid)
+        return timestamps, columns
+
+    @staticmethod
+    def held_column(column, mask, previous):
+        # Fills the missing values of a chunk of a column from the previous
+        # values, previous being the last value of the preceding chunks (None
+        # if none). Returns the filled column and mask, and the last value.
+        index = forward_fill_index(np.frombuffer(mask, dtype=np.uint8).astype(bool)).tolist()
+        values = [column[i] if i >= 0 else previous for i in index]
+        valid = [i >= 0 or previous is not None for i in index]
+        if index and valid[-1]:
+            previous = values[-1]
+        return values, valid, previous
+
+    def iter_rows(self):
+        fieldnames = self.fieldnames[1:]
+        held_values = [None] * len(fieldnames)
+        for timestamps, columns, validity in self.chunks(fieldnames):
+            cells = []
+            for i, fieldname in enumerate(fieldnames):
+                column, mask = columns[fieldname], validity[fieldname]
+                if self.held:
+                    column, mask, held_values[i] = self.held_column(column, mask,
+                                                                    held_values[i])
+                cells.append((column, mask))
+
+            index = 0
+            for start in range(0, len(timestamps), TIMESTAMP_CHUNK_SIZE):
+                texts = self.timestamp_recorder.to_text(
+                    timestamps[start:start + TIMESTAMP_CHUNK_SIZE])
+                for text in texts:
+                    row = [text]
+                    for column, mask in cells:
+                        row.append(column[index] if mask[index] else '')
+                    yield row
+                    index += 1
+
+    def write_csv_stream(self, csvfile, delimiter=','):
+        writer = csv.writer(csvfile, delimiter=delimiter)
+        writer.writerow(self.fieldnames)
+        # The unit line must be written to the CSV even if it is empty
+        writer.writerow([self.units.get(fieldname, '') for fieldname in self.fieldnames])
+        writer.writerows(self.iter_rows())
+
+    def sample_and_hold(self):
+        self.held = True
+
+
+def write_staged_rows(path, fieldnames, rows):
+    with open(path, 'a', newline='') as staging:
+        writer = csv.writer(staging)
+        writer.writerows([row.get(fieldname, '') for fieldname in fieldnames] for row in rows)
+
+
+# Writes the rows flushed by the streaming groups of an export into their
+# staging files. The writing may be redirected, e.g. to the writer thread of a
+# Pipeline, which writes the rows in the order they were flushed.
+class StagingWriter:
+    def __init__(self):
+        self.redirect = None
+
+    def write(self, path, fieldnames, rows):
+        if self.redirect is None:
+            write_staged_rows(path, fieldnames, rows)
+        else:
+            self.redirect(path, fieldnames, rows)
+
+    def __getstate__(self):
+        return {'redirect': None}
+
+
+# Writes the rows of a group to a staging file in chunks of chunk_size rows as
+# frames are processed, so that the memory used does not depend on the length
+# of the log. Since fields are only ever appended to a group, each row is staged
+# positionally against the fields known when it was written. The final CSV, with
+# its header, unit line and without the empty columns, is then produced by one
+# streaming pass over the staging file.
+class StreamingLogDataGroup(LogDataGroup):
+    writer = None
+
+    def __init__(self, signal_renamer, name=None, directory=None, chunk_size=10000,
+                 writer=None, timestamp_recorder=None):
+        super().__init__(signal_renamer, name, timestamp_recorder)
+        self.staged_fieldnames = list(self.fieldnames)
+        self.chunk_size = chunk_size
+        self.writer = writer
+        self.last_row = None
+        self.staging_path = Path(directory, self.name + '.csv')
+        open(self.staging_path, 'w').close()
+
+    def add_field(self, msg, signal_name):
+        super().add_field(msg, signal_name)
+        self.staged_fieldnames.append(self.fieldnames[-1])
+
+    def add_field_values(self, decoded_values):
+        # Flushing before appending keeps the previous row available for
+        # sample_and_hold, which is applied after the row has been added.
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+        super().add_field_values(decoded_values)
+
+    def flush(self):
+        if not self.rows:
+            return
+
+        # The fields staged so far, as later fields are appended to the list
+        fieldnames = list(self.staged_fieldnames)
+        if self.writer is None:
+            write_staged_rows(self.staging_path, fieldnames, self.rows)
+        else:
+            self.writer.write(self.staging_path, fieldnames, self.rows)
+        self.last_row = self.rows[-1]
+        self.rows = []
+
+    def write_csv_stream(self, csvfile, delimiter=','):
+        self.flush()
+        positions = [self.staged_fieldnames.index(fieldname) for fieldname in self.fieldnames]
+
+        writer = csv.writer(csvfile, delimiter=delimiter)
+        writer.writerow(self.fieldnames)
+        # The unit line must be written to the CSV even if it is empty
+        writer.writerow([self.units.get(fieldname, '') for fieldname in self.fieldnames])
+        # The staged timestamps are the repr of the POSIX timestamps, which
+        # float() reads back exactly
+        with open(self.staging_path, newline='') as staging:
+            reader = csv.reader(staging)
+            while True:
+                rows = list(islice(reader, TIMESTAMP_CHUNK_SIZE))
+                if not rows:
+                    break
+                texts = self.timestamp_recorder.to_text([float(row[0]) for row in rows])
+                writer.writerows([text] + [row[p] if p < len(row) else '' for p in positions[1:]]
+                                 for text, row in zip(texts, rows))
+
+    def column_data(self):
+        self.flush()
+        fieldnames = self.value_fieldnames()
+        positions = [self.staged_fieldnames.index(fieldname) for fieldname in fieldnames]
+        converters = [int if self.typecodes[fieldname] == 'q' else float
+                      for fieldname in fieldnames]
+
+        timestamps = []
+        values = [[] for _ in fieldnames]
+        valid = [[] for _ in fieldnames]
+        with open(self.staging_path, newline='') as staging:
+            for row in csv.reader(staging):
+                timestamps.append(float(row[0]))
+                for i, p in enumerate(positions):
+                    text = row[p] if p < len(row) else ''
+                    values[i].append(converters[i](text) if text else 0)
+                    valid[i].append(bool(text))
+
+        columns = {}
+        for i, fieldname in enumerate(fieldnames):
+            columns[fieldname] = (value_array(values[i], self.typecodes[fieldname]),
+                                  np.array(valid[i], dtype=bool))
+        return self.timestamp_recorder.to_array(timestamps), columns
+
+    def __getstate__(self):
+        # The size of the staging file is recorded along with the state, so
+        # that the rows staged after it are dropped when it is restored
+        state = self.__dict__.copy()
+        state['staged_size'] = os.path.getsize(self.staging_path)
+        return state
+
+    def __setstate__(self, state):
+        staged_size = state.pop('staged_size')
+        self.__dict__.update(state)
+        with open(self.staging_path, 'r+b') as staging:
+            staging.truncate(staged_size)
+
+    def sample_and_hold(self):
+        previous = self.rows[-2] if len(self.rows) > 1 else self.last_row
+        if previous is not None:
+            for key in previous:
+                if key not in self.rows[-1]:
+                    self.rows[-1][key] = previous[key]
+
+
+# Destination of the decoded values of one message in a data container,
+# resolved once per message: the group receiving the non-multiplexed signals
+# and, for multiplexed messages, the groups receiving the signals associated
+# with each multiplexer value.
+class GroupTarget:
+    def __init__(self, common_group, common_signals, multiplexor=None,
+                 muxed_groups=None, use_sample_and_hold=False):
+        self.common_group = common_group
+        self.common_signals = common_signals
+        self.multiplexor = multiplexor
+        self.muxed_groups = muxed_groups
+        self.use_sample_and_hold = use_sample_and_hold
+
+    def add_field_values(self, fieldnames, decoded_values, timestamp):
+        # Signals missing from fieldnames are not accepted for export
+        common_signals_row = {}
+        muxed_signals_row = {}
+
+        common_signals = self.common_signals
+        for signal_name, value in decoded_values.items():
+            fieldname = fieldnames.get(signal_name)
+            if fieldname is None:
+                continue
+            if signal_name in common_signals:
+                common_signals_row[fieldname] = value
+            else:
+                muxed_signals_row[fieldname] = value
+
+        if common_signals_row:
+            common_signals_row['timestamp'] = timestamp
+            self.common_group.add_field_values(common_signals_row)
+            if self.use_sample_and_hold:
+                self.common_group.sample_and_hold()
+        if muxed_signals_row:
+            muxed_signals_row['timestamp'] = timestamp
+            muxvalue = decoded_values[self.multiplexor]
+            self.muxed_groups[muxvalue].add_field_values(muxed_signals_row)
+
+
 class LogDataTable:
-    def __init__(self, signal_renamer, use_sample_and_hold=False):
+    def __init__(self, signal_renamer, use_sample_and_hold=False,
+                 group_factory=LogDataGroup):
         self.signal_renamer = signal_renamer
         self.msg_names = []
-        self.group = LogDataGroup(signal_renamer)
+        self.group = group_factory(signal_renamer)
         self.use_sample_and_hold = use_sample_and_hold
 
     def create_fields(self, msg):
@@ -100,17 +514,15 @@ class LogDataTable:
                         group.add_field(msg, signal_name)
 
     def add_field_values(self, msg, decoded_values, timestamp):
-        signals_row = {}
-        for signal_name, value in decoded_values.items():
-            fieldname = self.signal_renamer(msg.name, signal_name)
-            signals_row[fieldname] = value
+        self.create_fields(msg)
+        fieldnames = {name: self.signal_renamer(msg.name, name) for name in decoded_values}
+        self.target(msg).add_field_values(fieldnames, decoded_values, timestamp)
 
-        if signals_row:
-            signals_row['timestamp'] = timestamp
-            group = self.find_group(msg)
-            group.add_field_values(signals_row)
-            if self.use_sample_and_hold:
-                group.sample_and_hold()
+    def target(self, msg):
+        # All the signals of all the messages share the same row
+        self.create_fields(msg)
+        return GroupTarget(self.group, frozenset(signal.name for signal in msg.signals),
+                           use_sample_and_hold=self.use_sample_and_hold)
 
     def find_group(self, msg, muxvalue=None):
         return self.group
@@ -120,8 +532,9 @@ class LogDataTable:
 
 
 class LogDataTree:
-    def __init__(self, signal_renamer):
+    def __init__(self, signal_renamer, group_factory=LogDataGroup):
         self.signal_renamer = signal_renamer
+        self.group_factory = group_factory
         self.common_groups = {}
         self.muxed_groups = {}
         self.cached_multiplexors = {}
@@ -133,8 +546,8 @@ class LogDataTree:
 
         # Creating the default group for non-multiplexed signals.
         self.cached_common_signals[msg.name] = []
-        self.common_groups[msg.name] = LogDataGroup(self.signal_renamer,
-                                                    group_name(msg.name))
+        self.common_groups[msg.name] = self.group_factory(self.signal_renamer,
+                                                          group_name(msg.name))
 
         for element in msg.signal_tree:
             # In the signal_tree property, multiplexed signals are grouped into 
@@ -157,8 +570,8 @@ class LogDataTree:
 
                 self.muxed_groups[msg.name] = {}
                 for muxvalue in muxgroups:
-                    self.muxed_groups[msg.name][muxvalue] = LogDataGroup(self.signal_renamer,
-                                                                         group_name(msg.name, muxvalue))
+                    self.muxed_groups[msg.name][muxvalue] = self.group_factory(self.signal_renamer,
+                                                                               group_name(msg.name, muxvalue))
 
                     group = self.find_group(msg, muxvalue)
                     for signal_name in muxgroups[muxvalue]:
@@ -169,26 +582,15 @@ class LogDataTree:
             print(f'> Group not found for message {msg.name}')
             return
 
-        common_signals_row = {}
-        muxed_signals_row = {}
-
-        common_signal_names = self.cached_common_signals[msg.name]
-        for signal_name, value in decoded_values.items():
-            fieldname = self.signal_renamer(msg.name, signal_name)
-            if signal_name in common_signal_names:
-                row = common_signals_row
-            else:
-                row = muxed_signals_row
-
-            row[fieldname] = value
+        fieldnames = {name: self.signal_renamer(msg.name, name) for name in decoded_values}
+        self.target(msg).add_field_values(fieldnames, decoded_values, timestamp)
 
-        if common_signals_row:
-            common_signals_row['timestamp'] = timestamp
-            self.find_group(msg).add_field_values(common_signals_row)
-        if muxed_signals_row:
-            muxed_signals_row['timestamp'] = timestamp
-            muxvalue = decoded_values[self.cached_multiplexors[msg.name]]
-            self.find_group(msg, muxvalue).add_field_values(muxed_signals_row)
+    def target(self, msg):
+        self.create_fields(msg)
+        return GroupTarget(self.find_group(msg),
+                           frozenset(self.cached_common_signals[msg.name]),
+                           multiplexor=self.cached_multiplexors.get(msg.name),
+                           muxed_groups=self.muxed_groups.get(msg.name))
 
     def find_group(self, msg, muxvalue=None):
         if muxvalue is None:
@@ -1,5 +1,8 @@
 import hashlib
+import io
 import json
+import locale
+import os
 from datetime import datetime
 
 import can
@@ -10,9 +13,20 @@ from tqdm import tqdm
 from logdata import *
 from pathlib import Path
 import shutil
+import tempfile
+from functools import partial
 from crc_verifier import *
+from frame_listener import *
 from mux_verifier import *
 from rolling_counter_verifier import *
+from batch_decoder import *
+from selective_decoder import *
+from zip_export import *
+from binary_export import *
+from fast_readers import *
+from dbc_cache import *
+from resample import *
+from timestamps import *
 
 
 def print_warning(warning):
@@ -35,13 +49,100 @@ def count_lines(file):
     return num_lines
 
 
+# Identifies the format of a log from its first bytes: the 'LOGG' signature of
+# BLF files, the ';' comment lines starting TRC files, or the 'date', 'base'
+# and 'Begin Triggerblock' header lines of ASC files. Returns the reader class
+# of the format, or None when the header is not recognized.
+def detect_log_format(file):
+    with open(file, 'rb') as f:
+        head = f.read(4096)
+
+    if head.startswith(b'LOGG'):
+        print('> Detected BLF file signature')
+        return can.BLFReader
+
+    lines = [line.strip().lower() for line in head.decode('latin-1').lstrip('\ufeff').splitlines()]
+    lines = [line for line in lines if line]
+    if lines and lines[0].startswith(';'):
+        print('> Detected TRC file header')
+        return FastTRCReader
+    if any(line.startswith(('date ', 'base ', 'begin triggerblock')) for line in lines[:8]):
+        print('> Detected ASC file header')
+        return FastASCReader
+    return None
+
+
+# Binary file computing the SHA256 of the bytes read through it, and showing
+# the progress of the reading, so that a log is hashed and processed in a
+# single pass. The bytes left unread are hashed when the file is closed.
+#
+# The reading may also cover only the bytes from start to end, in which case
+# the given sha256 must hold the hash of the bytes before start, and only the
+# bytes up to end are hashed (the hash is then that of the bytes before end).
+class IngestFile(io.RawIOBase):
+    def __init__(self, file, show_progress=True, start=0, end=None, sha256=None):
+        self.file = open(file, 'rb')
+        self.file.seek(start)
+        self.position = start
+        self.end = end
+        self.sha256 = hashlib.sha256() if sha256 is None else sha256
+        total = (os.path.getsize(file) if end is None else end) - start
+        self.progressbar = tqdm(total=total, desc='> Processing file',
+                                unit='B', unit_scale=True, file=sys.stdout, ncols=100,
+                                disable=not show_progress)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.end is not None:
+            buffer = memoryview(buffer)[:max(0, self.end - self.position)]
+        count = self.file.readinto(buffer)
+        if count:
+            self.position += count
+            self.sha256.update(memoryview(buffer)[:count])
+            self.progressbar.update(count)
+        return count
+
+    def close(self):
+        if not self.closed:
+            while self.end is None or self.position < self.end:
+                size = 1024 * 1024
+                if self.end is not None:
+                    size = min(size, self.end - self.position)
+                block = self.file.read(size)
+                if not block:
+                    break
+                self.position += len(block)
+                self.sha256.update(block)
+            self.file.close()
+            self.progressbar.close()
+        super().close()
+
+    def hexdigest(self):
+        self.close()
+        return self.sha256.hexdigest()
+
+
+# Opens a reader of the given class on an IngestFile, with the same encoding
+# as the one used by the text readers when given a path. The frame_filter is
+# passed on to the text readers (see FastTextReader).
+def open_log_reader(file, reader_class, show_progress=True, frame_filter=None):
+    ingest = IngestFile(file, show_progress)
+    stream = io.BufferedReader(ingest)
+    if reader_class is can.BLFReader:
+        return reader_class(stream), ingest
+    stream = io.TextIOWrapper(stream, encoding=locale.getpreferredencoding(False))
+    return reader_class(stream, frame_filter=frame_filter), ingest
+
+
 # Attempts to decode the file using the ASC format
 def try_decode_asc(file):
     try:
-        reader = can.ASCReader(file)
+        reader = FastASCReader(file)
         frame = next(iter(reader))
         print('> Successfully decoded file as ASC')
-        return [can.ASCReader, count_lines(file)]
+        return [FastASCReader, count_lines(file)]
     except (UnicodeDecodeError, StopIteration) as e:
         print('> Failed to decode file as ASC')
         return [None, 0]
@@ -50,10 +151,10 @@ def try_decode_asc(file):
 # Attempts to decode the file using the TRC format
 def try_decode_trc(file):
     try:
-        reader = can.TRCReader(file)
+        reader = FastTRCReader(file)
         frame = next(iter(reader))
         print('> Successfully decoded file as TRC')
-        return [can.TRCReader, count_lines(file)]
+        return [FastTRCReader, count_lines(file)]
     except (UnicodeDecodeError, ValueError, StopIteration) as e:
         print('> Failed to decode file as TRC')
         return [None, 0]
@@ -71,22 +172,22 @@ def try_decode_blf(file):
         return [None, 0]
 
 
-class TimestampRecorder:
-    def __init__(self, relative):
-        self.min = None
-        self.max = None
-        self.relative = relative
+# Returns the reader class of a log, from its header or by trial decoding when
+# the header is not recognized
+def open_log(data_file):
+    reader_init = detect_log_format(data_file)
 
-    def record(self, frame):
-        timestamp = datetime.fromtimestamp(frame.timestamp)
-        if self.min is None or timestamp < self.min:
-            self.min = timestamp
-        if self.max is None or timestamp > self.max:
-            self.max = timestamp
-        return timestamp
+    # Trial decoding is only needed for files with unusual headers
+    if reader_init is None:
+        [reader_init, _] = try_decode_asc(data_file)
+    if reader_init is None:
+        [reader_init, _] = try_decode_blf(data_file)
+    if reader_init is None:
+        [reader_init, _] = try_decode_trc(data_file)
+    if reader_init is None:
+        raise ValueError('Could not decode provided log file')
 
-    def format(self, timestamp):
-        return timestamp - self.min if self.relative else timestamp
+    return reader_init
 
 
 class ChannelAnalyzer:
@@ -154,6 +255,37 @@ class DbcFilter:
                                   if name in accepted_signal_names}
         return accepted_signal_values
 
+    def accepted_signal_names(self, message):
+        if self.accept_all or message.name in self.fully_accepted:
+            return [signal.name for signal in message.signals]
+        return list(self.partly_accepted.get(message.name, []))
+
+
+# Number of frames stored between two checks of the memory used by the groups
+# when a memory limit is set
+MEMORY_CHECK_INTERVAL = 4096
+
+
+# Everything the processing of a frame depends on that can be derived from its
+# arbitration ID alone, resolved the first time the ID is encountered: the DBC
+# message (None for IDs unknown to the DBC), the filtering decision, the export
+# name of each accepted signal and the destination groups of each channel.
+class DecodePlan:
+    def __init__(self, msg=None, accepted=False, fieldnames=None):
+        self.msg = msg
+        self.accepted = accepted
+        self.fieldnames = {} if fieldnames is None else fieldnames
+        self.targets = {}
+        self.batch_decoder = None
+        # Names of the signals to decode with selective decoding, None when
+        # all of them are decoded
+        self.decoded_signals = None
+        self.selective_decoder = None
+        # Frame listeners subscribed to the decoded frames of the message, and
+        # to those whose decoding failed
+        self.listeners = []
+        self.error_listeners = []
+
 
 class LogExport:
     class AutoChannelRepr:
@@ -165,16 +297,72 @@ class LogExport:
                  use_sample_and_hold=False,
                  use_relative_time=False,
                  target_channel=0,
-                 expected_frame_count=None):
+                 expected_frame_count=None,
+                 use_columnar_storage=False,
+                 use_batch_decoding=False,
+                 batch_size=4096,
+                 use_selective_decoding=False,
+                 stream_dir=None,
+                 stream_chunk_size=10000,
+                 dbc_cache_dir=None,
+                 start_time=None,
+                 end_time=None,
+                 timestamp_precision=None,
+                 memory_limit=None,
+                 spill_dir=None,
+                 show_progress=True):
         """
         Keyword arguments:
+        dbc_file -- Path of the DBC file, or an already loaded cantools
+        database, which allows several exports to share the same database.
         target_channel -- Most logging formats include a "channel" field
         indicating the CAN interface that recorded each frame. ASC logs use
         1-based channel numbering, but this tool shifts channels to 0-based
         numbering during export.
+        use_columnar_storage -- Store the decoded values of each group in typed
+        arrays (one per field, plus a validity mask) instead of one dict per
+        frame, which considerably reduces the memory used by long logs.
+        use_batch_decoding -- Buffer the accepted frames and decode them by
+        batches of batch_size frames, extracting each signal of a message for
+        the whole batch at once with NumPy. The results are identical to the
+        frame by frame decoding, but listeners and groups are only updated when
+        a batch is flushed. The CRC of the frames is also verified by
+        batches.
+        use_selective_decoding -- For the messages of which only some signals
+        are accepted (partly_accepted of DbcFilter), only decode these signals
+        and the multiplexers directly from the payloads instead of decoding
+        every signal of the message (see SelectiveDecoder). The results are
+        identical. The listeners are given the accepted signals and those
+        they require (see FrameListener.required_signals).
+        stream_dir -- Directory in which each group stages its rows as soon as
+        it is created, flushing them by chunks of stream_chunk_size rows, so
+        that the memory used does not grow with the length of the log. The
+        CSV files are produced from the staging files by write_csv.
+        dbc_cache_dir -- Directory in which the parsed DBC is cached, so that
+        the following exports using the same DBC file do not parse it again
+        (see load_dbc). The DBC is parsed on each export when None.
+        start_time, end_time -- Bounds of the time window of the frames to
+        export, each optional: a datetime, or a number of seconds from the
+        start of the log (see set_log_start). With use_relative_time, the
+        timestamps of a window are then also relative to the start of the log,
+        so that they are the same in every window.
+        timestamp_precision -- Number of digits of the second of the timestamps
+        written to the CSV files (see TimestampRecorder). By default, they are
+        written to the microsecond, without the fraction when it is zero.
+        memory_limit -- Size in bytes of the decoded values kept in memory.
+        Once the groups exceed it, the largest ones are spilled to temporary
+        files as chunks of columns (see limit_memory), which write_csv and the
+        other outputs then read back in order, with the same result. The
+        groups are stored in columns (as with use_columnar_storage). Not used
+        with stream_dir, whose groups are already staged on disk.
+        spill_dir -- Directory of the temporary files of the spilled groups,
+        the default temporary directory when None.
         """
         self.decode_error = None
-        self.dbc = cantools.database.load_file(dbc_file)
+        if isinstance(dbc_file, cantools.database.can.Database):
+            self.dbc = dbc_file
+        else:
+            self.dbc = load_dbc(dbc_file, dbc_cache_dir)
         self.dbc_filter = dbc_filter
         self.use_time_grouping = use_time_grouping
         self.signal_renamer = signal_renamer
@@ -182,83 +370,379 @@ class LogExport:
         self.use_relative_time = use_relative_time
         self.target_channel = target_channel
         self.expected_frame_count = expected_frame_count
+        self.use_columnar_storage = use_columnar_storage or memory_limit is not None
+        self.use_batch_decoding = use_batch_decoding
+        self.batch_size = batch_size
+        self.use_selective_decoding = use_selective_decoding
+        self.pending_frames = []
+        self.stream_dir = stream_dir
+        self.stream_chunk_size = stream_chunk_size
+        self.staging_writer = StagingWriter()
+        self.memory_limit = memory_limit if stream_dir is None else None
+        self.spill_dir = spill_dir
+        self.spill_directory = None
+        self.stored_count = 0
+        self.spill_count = 0
+        self.spilled_row_count = 0
+        self.spilled_size = 0
         self.total_frame_count = 0
         self.listed_frame_count = 0
         self.accepted_frame_count = 0
         self.progressbar = tqdm(total=expected_frame_count, desc='> Processing frames',
-                                unit=' frames', file=sys.stdout, ncols=100)
+                                unit=' frames', file=sys.stdout, ncols=100,
+                                disable=not show_progress)
         self.channel_analyzer = ChannelAnalyzer()
-        self.timestamp_recorder = TimestampRecorder(use_relative_time)
+        self.prescan_result = None
+        self.timestamp_recorder = TimestampRecorder(use_relative_time,
+                                                    precision=timestamp_precision)
+        self.start_time = start_time
+        self.end_time = end_time
+        self.use_time_window = start_time is not None or end_time is not None
+        self.log_start = None
+        self.time_window = None
         self.data = {}
-        self.crc_verifier = CrcVerifier()
+        self.decode_plans = {}
+        self.crc_verifier = CrcVerifier(self.dbc, batch_size if use_batch_decoding else None)
         self.frame_listeners = [MuxVerifier(), RollingCounterVerifier()]
 
     def initialize_log_data(self, channel):
         if channel in self.data:
             return
 
+        if self.stream_dir is not None:
+            # Groups of different channels share the same names
+            directory = Path(self.stream_dir, f'channel_{channel}')
+            directory.mkdir(parents=True, exist_ok=True)
+            group_factory = partial(StreamingLogDataGroup, directory=directory,
+                                    chunk_size=self.stream_chunk_size,
+                                    writer=self.staging_writer,
+                                    timestamp_recorder=self.timestamp_recorder)
+        elif self.use_columnar_storage:
+            group_factory = partial(ColumnarLogDataGroup,
+                                    timestamp_recorder=self.timestamp_recorder)
+        else:
+            group_factory = partial(LogDataGroup, timestamp_recorder=self.timestamp_recorder)
+
         if self.use_time_grouping:
-            self.data[channel] = LogDataTree(self.signal_renamer)
+            self.data[channel] = LogDataTree(self.signal_renamer,
+                                             group_factory=group_factory)
         else:
             self.data[channel] = LogDataTable(self.signal_renamer,
-                                              use_sample_and_hold=self.use_sample_and_hold)
+                                              use_sample_and_hold=self.use_sample_and_hold,
+                                              group_factory=group_factory)
+
+    def create_decode_plan(self, arbitration_id):
+        try:
+            msg = self.dbc.get_message_by_frame_id(arbitration_id)
+        except KeyError:
+            plan = DecodePlan()
+        else:
+            if self.dbc_filter.is_message_accepted(msg):
+                fieldnames = {name: self.signal_renamer(msg.name, name)
+                              for name in self.dbc_filter.accepted_signal_names(msg)}
+                plan = DecodePlan(msg, True, fieldnames)
+                self.subscribe_listeners(plan)
+            else:
+                plan = DecodePlan(msg)
+
+        self.decode_plans[arbitration_id] = plan
+        return plan
+
+    def prescan_channel(self, reader, sample_size=None):
+        """
+        Selects the target channel before processing the frames, so that only
+        the frames of that channel are decoded and stored, instead of those
+        of every channel with AutoChannel. The channel is the one AutoChannel
+        would select from the frames of reader, of which only the ID, channel
+        and DLC are used, stopping after sample_size frames when given.
+
+        The frames of the other channels are then left out of the reports
+        (CRC, multiplexer, rolling counter) and of the time range, as when
+        target_channel is set explicitly.
+        """
+        analyzer = ChannelAnalyzer()
+        scanned_count = 0
+        with reader:
+            for frame in reader:
+                skipped_count = getattr(reader, 'skipped_count', 0)
+                if sample_size is not None and scanned_count + skipped_count >= sample_size:
+                    break
+                scanned_count += 1
+                plan = self.decode_plans.get(frame.arbitration_id)
+                if plan is None:
+                    plan = self.create_decode_plan(frame.arbitration_id)
+                if plan.msg is not None:
+                    analyzer.analyze(frame, plan.msg)
+
+        channel = analyzer.guess_channel()
+        self.prescan_result = {
+            'channel': channel,
+            'scanned_frame_count': scanned_count + getattr(reader, 'skipped_count', 0),
+            'frame_counts': analyzer.frame_counts,
+            'mismatch_counts': analyzer.mismatch_counts,
+        }
+        if channel is not None:
+            self.target_channel = channel
+        return channel
+
+    def set_log_start(self, timestamp):
+        """
+        Sets the timestamp of the first frame of the log, from which the bounds
+        of the time window given in seconds are counted. Otherwise, the first
+        frame given to process_frame is taken as the start of the log.
+        """
+        self.log_start = timestamp
+        if self.use_time_window:
+            bounds = []
+            for bound in (self.start_time, self.end_time):
+                if isinstance(bound, datetime):
+                    bound = bound.timestamp()
+                elif bound is not None:
+                    bound = timestamp + bound
+                bounds.append(bound)
+            self.time_window = tuple(bounds)
+            self.timestamp_recorder.origin = timestamp
+
+    def is_in_time_window(self, timestamp):
+        if self.time_window is None:
+            self.set_log_start(timestamp)
+        start, end = self.time_window
+        return (start is None or timestamp >= start) and (end is None or timestamp <= end)
+
+    def is_frame_listed(self, arbitration_id):
+        plan = self.decode_plans.get(arbitration_id)
+        if plan is None:
+            plan = self.create_decode_plan(arbitration_id)
+        return plan.msg is not None
 
     def process_frame(self, frame, allow_truncated=False):
+        if self.use_time_window and not self.is_in_time_window(frame.timestamp):
+            return
         self.progressbar.update(1)
         self.total_frame_count += 1
-        try:
-            msg = self.dbc.get_message_by_frame_id(frame.arbitration_id)
-        except KeyError:
+        plan = self.decode_plans.get(frame.arbitration_id)
+        if plan is None:
+            plan = self.create_decode_plan(frame.arbitration_id)
+        msg = plan.msg
+        if msg is None:
+            return
+
+        self.listed_frame_count += 1
+        self.channel_analyzer.analyze(frame, msg)
+
+        if frame.channel is self.target_channel or self.target_channel is AutoChannel:
+            self.decode_error = self.process_message(frame, plan, allow_truncated)
+            self.crc_verifier.check_frame(frame, msg)
+
+    def process_decoded_frame(self, frame, decoded_values, error):
+        # Counterpart of process_frame for frames decoded beforehand (see
+        # decode_frames), which must be given in the order of the log
+        if self.use_time_window and not self.is_in_time_window(frame.timestamp):
+            return
+        self.progressbar.update(1)
+        self.total_frame_count += 1
+        plan = self.decode_plans.get(frame.arbitration_id)
+        if plan is None:
+            plan = self.create_decode_plan(frame.arbitration_id)
+        msg = plan.msg
+        if msg is None:
             return
 
         self.listed_frame_count += 1
         self.channel_analyzer.analyze(frame, msg)
 
         if frame.channel is self.target_channel or self.target_channel is AutoChannel:
-            self.decode_error = self.process_message(frame, msg, allow_truncated)
+            self.decode_error = None
+            if plan.accepted:
+                # Frames buffered by process_frame are stored first
+                if self.pending_frames:
+                    self.flush()
+                self.accepted_frame_count += 1
+                timestamp = self.timestamp_recorder.record(frame)
+                self.store_message(frame, plan, decoded_values, error, timestamp)
+                self.decode_error = error
             self.crc_verifier.check_frame(frame, msg)
 
-    def process_message(self, frame, msg, allow_truncated):
-        if not self.dbc_filter.is_message_accepted(msg):
+    def skip_frames(self, count):
+        # Accounts for frames whose ID is unknown to the DBC
+        self.progressbar.update(count)
+        self.total_frame_count += count
+
+    def process_message(self, frame, plan, allow_truncated):
+        if not plan.accepted:
             return
 
         self.accepted_frame_count += 1
         timestamp = self.timestamp_recorder.record(frame)
 
-        error = None
+        if self.use_batch_decoding:
+            self.pending_frames.append((plan, frame, timestamp, allow_truncated))
+            if len(self.pending_frames) >= self.batch_size:
+                self.flush()
+            return self.decode_error
+
+        decoded_values, error = self.decode_message(plan, frame, allow_truncated)
+        self.store_message(frame, plan, decoded_values, error, timestamp)
+        return error
+
+    def decode_message(self, plan, frame, allow_truncated):
+        if plan.selective_decoder is not None:
+            decoded_values = plan.selective_decoder.decode(frame.data)
+            if decoded_values is not None:
+                return decoded_values, None
         try:
-            decoded_values = msg.decode(frame.data,
-                                        allow_truncated=allow_truncated,
-                                        decode_choices=False)
+            return plan.msg.decode(frame.data, allow_truncated=allow_truncated,
+                                   decode_choices=False), None
         except cantools.database.errors.DecodeError as e:
-            error = e
-            decoded_values = {}
-
-        self._notify_listeners(frame, msg, decoded_values, error)
+            return {}, e
+
+    def decode_batch(self, plan, payloads):
+        # Returns the decoded values of each payload, or None for the payloads
+        # that must be decoded by decode_message
+        if plan.batch_decoder is None:
+            plan.batch_decoder = BatchDecoder(plan.msg, plan.decoded_signals)
+        return plan.batch_decoder.decode(payloads)
+
+    def store_message(self, frame, plan, decoded_values, error, timestamp):
+        listeners = plan.listeners if error is None else plan.error_listeners
+        if listeners:
+            self._notify_listeners(listeners, frame, plan.msg, decoded_values, error)
+
+        target = plan.targets.get(frame.channel)
+        if target is None:
+            self.initialize_log_data(frame.channel)
+            target = plan.targets[frame.channel] = self.data[frame.channel].target(plan.msg)
+        target.add_field_values(plan.fieldnames, decoded_values, timestamp)
+
+        if self.memory_limit is not None:
+            self.stored_count += 1
+            if self.stored_count % MEMORY_CHECK_INTERVAL == 0:
+                self.limit_memory()
+
+    def limit_memory(self):
+        """
+        Once the values held in memory by the groups exceed memory_limit,
+        spills the largest groups to disk until they are back under half of
+        it, so that the following frames can be stored before spilling again.
+        """
+        groups = [group for data in self.data.values() for group in data.groups().values()]
+        sizes = [group.memory_size() for group in groups]
+        total = sum(sizes)
+        if total <= self.memory_limit:
+            return
 
-        to_keep = self.dbc_filter.keep_accepted_signals(msg, decoded_values)
+        if self.spill_directory is None:
+            # Removed along with its files when the export is released
+            self.spill_directory = tempfile.TemporaryDirectory(prefix='logexport_spill_',
+                                                               dir=self.spill_dir)
+        for size, group in sorted(zip(sizes, groups), key=lambda entry: entry[0], reverse=True):
+            if total <= self.memory_limit // 2:
+                break
+            self.spilled_row_count += group.spill(self.spill_directory.name)
+            self.spill_count += 1
+            self.spilled_size += size
+            total -= size
+
+    def decode_frames(self, entries):
+        # Decodes (plan, frame, allow_truncated) entries of accepted frames by
+        # batches, one batch per message, and returns the (decoded values,
+        # error) pair of each frame.
+        indices_by_plan = {}
+        for index, entry in enumerate(entries):
+            indices_by_plan.setdefault(entry[0], []).append(index)
+
+        decoded = [None] * len(entries)
+        for plan, indices in indices_by_plan.items():
+            results = self.decode_batch(plan, [entries[i][1].data for i in indices])
+            for index, decoded_values in zip(indices, results):
+                decoded[index] = decoded_values
+
+        results = []
+        for (plan, frame, allow_truncated), decoded_values in zip(entries, decoded):
+            # Truncated frames and unknown multiplexer values are left to
+            # cantools, so that errors are reported exactly the same way.
+            if decoded_values is None:
+                results.append(self.decode_message(plan, frame, allow_truncated))
+            else:
+                results.append((decoded_values, None))
+        return results
+
+    def flush(self):
+        # Decodes the frames buffered in batch mode, then stores them in the
+        # order in which they were received.
+        self.crc_verifier.flush()
+        pending = self.pending_frames
+        if not pending:
+            return
+        self.pending_frames = []
 
-        self.initialize_log_data(frame.channel)
-        data = self.data[frame.channel]
-        data.create_fields(msg)
-        data.add_field_values(msg, to_keep, self.timestamp_recorder.format(timestamp))
-        return error
+        entries = [(plan, frame, allow_truncated) for plan, frame, _, allow_truncated in pending]
+        error = None
+        for (plan, frame, timestamp, _), (decoded_values, error) in zip(pending,
+                                                                         self.decode_frames(entries)):
+            self.store_message(frame, plan, decoded_values, error, timestamp)
+        self.decode_error = error
 
     def print_info(self):
-        self.progressbar.update(self.progressbar.total)
+        self.flush()
+        if self.progressbar.total is not None:
+            self.progressbar.update(self.progressbar.total)
         self.progressbar.close()
+        if self.time_window is not None:
+            print('> Time window of the export is from {} to {}'.format(
+                *(None if bound is None else datetime.fromtimestamp(bound)
+                  for bound in self.time_window)))
         print('> Time range of the frames is from {} to {}'
-              .format(self.timestamp_recorder.min, self.timestamp_recorder.max))
+              .format(*self.timestamp_recorder.time_range()))
         print('> Extracted {}/{} frames based on the DBC'
               .format(self.listed_frame_count, self.total_frame_count))
+        if self.prescan_result is not None:
+            result = self.prescan_result
+            print('> Channel pre-scan of {} frames: frame counts {}, DLC mismatch counts {}'
+                  .format(result['scanned_frame_count'], result['frame_counts'],
+                          result['mismatch_counts']))
+            print(f'> Channel pre-scan selection result: Channel {result["channel"]}')
         print(f'> Channel specified: {self.target_channel}')
         if self.target_channel is AutoChannel:
             print(f'> AutoChannel selection result: Channel {self.channel_analyzer.guess_channel()}')
         print('> Accepted frame count:', self.accepted_frame_count)
+        if self.spill_count:
+            print(f'> Memory limit of {self.memory_limit} bytes exceeded: spilled '
+                  f'{self.spill_count} chunk(s) of {self.spilled_row_count} rows '
+                  f'({self.spilled_size} bytes) to {self.spill_directory.name}')
         if self.decode_error is not None:
             print('> Encountered decoding error:', self.decode_error)
 
+    def summary(self):
+        self.flush()
+        if self.target_channel is AutoChannel:
+            channel = self.channel_analyzer.guess_channel()
+        else:
+            channel = self.target_channel
+
+        summary = {
+            'total_frame_count': self.total_frame_count,
+            'listed_frame_count': self.listed_frame_count,
+            'accepted_frame_count': self.accepted_frame_count,
+            'channel': channel,
+            'time_range': [str(bound) for bound in self.timestamp_recorder.time_range()],
+            'crc_error_count': self.crc_verifier.count,
+            'mux_error_count': sum(listener.count for listener in self.frame_listeners
+                                   if isinstance(listener, MuxVerifier)),
+            'rolling_counter_error_count': sum(listener.count for listener in self.frame_listeners
+                                               if isinstance(listener, RollingCounterVerifier)),
+        }
+        if self.spill_count:
+            summary['spill'] = {'chunk_count': self.spill_count,
+                                'row_count': self.spilled_row_count,
+                                'size': self.spilled_size}
+        if self.time_window is not None:
+            summary['time_window'] = [None if bound is None else str(datetime.fromtimestamp(bound))
+                                      for bound in self.time_window]
+        return summary
+
     def get_active_groups(self):
+        self.flush()
         if not self.data:
             return {}
 
@@ -270,13 +754,24 @@ class LogExport:
         return self.data[channel].groups()
 
     def write_crc_report(self, output_dir, filename):
+        self.flush()
         if self.crc_verifier.count > 0:
             print_warning(f'Detected {self.crc_verifier.count} frame(s) with incorrect NCrc values')
             filepath = Path(output_dir, filename)
             self.crc_verifier.write_json_report(filepath)
             print(f'> CRC verification report written to: {filepath}')
 
-    def write_csv(self, output_dir, data_file):
+    def write_csv(self, output_dir, data_file, use_direct_zip=False,
+                  compresslevel=None, zip_workers=1):
+        """
+        Keyword arguments:
+        use_direct_zip -- For multi-group exports, write the CSV file of each
+        group directly into its ZIP entry instead of writing them into a
+        '<data_file>_groups' directory that is then archived.
+        compresslevel -- Deflate compression level of the direct ZIP entries.
+        zip_workers -- Number of groups rendered in parallel when writing the
+        ZIP archive directly.
+        """
         output_path = Path(output_dir, Path(data_file).name)
 
         groups = self.get_active_groups()
@@ -285,6 +780,16 @@ class LogExport:
         if group_count == 0:
             return
 
+        elif group_count > 1 and use_direct_zip:
+            for group in groups.values():
+                group.remove_empty_columns()
+
+            zip_archive_name = os.path.abspath(str(output_path) + '.zip')
+            write_groups_to_zip(list(groups.values()), zip_archive_name,
+                                compresslevel, zip_workers)
+            print(f'> Created ZIP archive: {zip_archive_name}')
+            return zip_archive_name
+
         elif group_count > 1:
             directory = Path(data_file + '_groups')
             if directory.exists():
@@ -306,6 +811,91 @@ class LogExport:
             print(f'> Created CSV file: {csv_name}')
             return str(csv_name)
 
+    def write_binary(self, output_dir, data_file, file_format=None):
+        """
+        Writes each group as typed columns into a '<data_file>_<file_format>'
+        directory, with the units and signal definitions as file metadata.
+
+        Keyword arguments:
+        file_format -- 'npz', 'parquet' or 'arrow'. Parquet and Arrow require
+        pyarrow, and Parquet is the default when pyarrow is installed.
+        """
+        groups = self.get_active_groups()
+        if not groups:
+            return
+
+        if file_format is None:
+            file_format = default_binary_format()
+        if file_format not in BINARY_WRITERS:
+            raise ValueError(f'Unsupported binary format: {file_format}')
+
+        directory = Path(output_dir, f'{Path(data_file).name}_{file_format}')
+        directory.mkdir(parents=True, exist_ok=True)
+        for group in groups.values():
+            print(f'> Writing {file_format} file for group {group.name}')
+            group.remove_empty_columns()
+            BINARY_WRITERS[file_format](group, directory)
+
+        print(f'> Created {file_format} files in: {directory.resolve()}')
+        return directory
+
+    def to_frames(self, as_dataframe=True):
+        """
+        Returns the groups that write_csv would export, without writing them,
+        as a dict mapping the name of each group to a pandas DataFrame, whose
+        attrs hold the units and signal definitions. The columns are built
+        from the stored values, and missing values are NaN, or <NA> in
+        integer columns.
+
+        Keyword arguments:
+        as_dataframe -- When False, each group is returned as a GroupArrays
+        tuple of NumPy arrays instead (masked where the values are missing),
+        which does not require pandas.
+        """
+        frames = {}
+        for group in self.get_active_groups().values():
+            group.remove_empty_columns()
+            frames[group.name] = group_dataframe(group) if as_dataframe else group_arrays(group)
+        return frames
+
+    def wide_table(self, period=None, max_age=None):
+        """
+        Merges the groups that write_csv would export into a single table with
+        one column per field (see merge_groups), each row holding the last
+        value of every field at its timestamp. The rows are those of all the
+        groups, or a grid of period seconds.
+
+        Keyword arguments:
+        period -- Interval of the rows in seconds (e.g. 0.01 for 10 ms).
+        max_age -- Values older than max_age seconds are left missing instead
+        of being held.
+        """
+        groups = list(self.get_active_groups().values())
+        for group in groups:
+            group.remove_empty_columns()
+        return merge_groups(groups, period, max_age,
+                            precision=self.timestamp_recorder.precision)
+
+    def to_wide_table(self, period=None, max_age=None, as_dataframe=True):
+        """
+        Returns the table of wide_table as a pandas DataFrame, or as a
+        GroupArrays tuple of NumPy arrays when as_dataframe is False, as
+        to_frames does for each group.
+        """
+        table = self.wide_table(period, max_age)
+        return group_dataframe(table) if as_dataframe else group_arrays(table)
+
+    def write_wide_csv(self, output_dir, data_file, period=None, max_age=None):
+        # Written next to the archive of the groups, as '<data_file>_wide.csv'
+        output = Path(output_dir, Path(data_file).name + '_wide.csv')
+        table = self.wide_table(period, max_age)
+        if not table.columns:
+            return None
+        table.write_csv(output)
+        print(f'> Created wide table of {len(table.columns)} fields and '
+              f'{len(table.timestamps)} rows: {output.resolve()}')
+        return output
+
     def write_signals_json(self, output_dir, filename):
         groups = self.get_active_groups()
         signal_set = set()
@@ -321,10 +911,78 @@ class LogExport:
 
     def add_listener(self, listener) -> None:
         self.frame_listeners.append(listener)
-
-    def _notify_listeners(self, frame, message, decoded_values, error) -> None:
+        for plan in self.decode_plans.values():
+            if plan.accepted:
+                self.subscribe_listeners(plan)
+
+    def subscribe_listeners(self, plan) -> None:
+        # Resolves once per message the listeners to notify of its frames
+        plan.listeners = []
+        plan.error_listeners = []
         for listener in self.frame_listeners:
+            subscribe = getattr(listener, 'subscribe', None)
+            events = ALL_EVENTS if subscribe is None else subscribe(plan.msg)
+            if DECODED in events:
+                plan.listeners.append(listener)
+            if DECODE_ERROR in events:
+                plan.error_listeners.append(listener)
+
+        # The decoders depend on the signals required by the listeners
+        plan.decoded_signals = self.decoded_signals(plan)
+        plan.selective_decoder = None
+        plan.batch_decoder = None
+        if plan.decoded_signals is not None:
+            plan.selective_decoder = SelectiveDecoder(plan.msg, plan.decoded_signals)
+
+    def decoded_signals(self, plan):
+        # Returns the names of the signals of an accepted message to decode:
+        # the accepted ones and those required by the listeners of its decoded
+        # frames, or None when all of them must be decoded. The multiplexers
+        # are decoded in any case.
+        msg = plan.msg
+        if not self.use_selective_decoding or msg.is_container:
+            return None
+        names = set(plan.fieldnames)
+        for listener in plan.listeners:
+            required_signals = getattr(listener, 'required_signals', None)
+            required = None if required_signals is None else required_signals(msg)
+            if required is None:
+                return None
+            names.update(required)
+        names.update(signal.name for signal in msg.signals if signal.is_multiplexer)
+        if len(names) >= len(msg.signals):
+            return None
+        return names
+
+    def _notify_listeners(self, listeners, frame, message, decoded_values, error) -> None:
+        for listener in listeners:
             listener.process_frame(frame, message, decoded_values, error)
 
 
 AutoChannel = LogExport.AutoChannelRepr()
+
+
+def export_to_frames(data_file, dbc_file, dbc_filter=None, as_dataframe=True,
+                     show_progress=False, **kwargs):
+    """
+    Processes a log and returns its groups as LogExport.to_frames does, for
+    analysis scripts that would otherwise write the CSV files and read them
+    back. The DBC may be given as a path or as a loaded cantools database,
+    and the remaining keyword arguments are passed to LogExport.
+    """
+    kwargs.setdefault('use_columnar_storage', True)
+    kwargs.setdefault('use_batch_decoding', True)
+    kwargs.setdefault('use_selective_decoding', True)
+    export = LogExport(dbc_file, dbc_filter or DbcFilter(accept_all=True),
+                       show_progress=show_progress, **kwargs)
+
+    reader_init = open_log(data_file)
+    [reader, ingest] = open_log_reader(data_file, reader_init, show_progress,
+                                       frame_filter=export.is_frame_listed)
+    for frame in reader:
+        export.process_frame(frame, allow_truncated=True)
+    if reader_init is not can.BLFReader:
+        export.skip_frames(reader.skipped_count)
+    ingest.close()
+
+    return export.to_frames(as_dataframe)
@@ -1,6 +1,12 @@
 from helpers_hvhv import *
 from logexport import *
+from blf_parallel import process_blf_parallel
+from profiler import Profiler
+from checkpoint import IncrementalExport
+from time_index import TimeIndex
+from pipeline import Pipeline
 from time import perf_counter
+from contextlib import nullcontext
 from autofile import *
 from pathlib import Path
 
@@ -14,6 +20,72 @@ DBC_FILE = ''
 
 OUTPUT_DIR = '../output/'
 
+# Set to a directory (e.g. '../output/stream/') to stage the decoded rows on
+# disk while processing instead of keeping the whole log in memory
+STREAM_DIR = None
+
+# Set to 'npz', 'parquet' or 'arrow' to also export the groups as typed columns
+BINARY_FORMAT = None
+
+# Set above 1 to decode BLF files with several worker processes
+BLF_WORKERS = 1
+
+# Set to True to read (and decompress) the log on a separate thread while the
+# frames are decoded, the rows staged with STREAM_DIR being written by a third
+# thread
+PIPELINE = False
+
+# Set to True to select the channel by a first pass reading only the IDs,
+# channels and DLCs of the frames, so that only the frames of that channel are
+# decoded. The reports then leave out the other channels, and a sample may not
+# select the same channel as the whole log. Only the first
+# CHANNEL_PRESCAN_FRAMES frames of the file are scanned, set it to None to scan
+# the whole file (which is then read twice)
+CHANNEL_PRESCAN = False
+CHANNEL_PRESCAN_FRAMES = 100000
+
+# Set to True to keep a checkpoint next to the outputs, so that the next export
+# of the same log (e.g. a log still being appended to) only decodes the frames
+# added since, unless the part already processed has changed. The checkpoint
+# holds all the decoded values, so it is usually larger than the log itself
+# (e.g. 928 KB for a 318 KB BLF file), and it is written again in full on each
+# export
+INCREMENTAL_EXPORT = False
+
+# Set to a directory (e.g. '../output/dbc_cache/') to keep the parsed DBC
+# files there, which large DBCs take seconds to parse. An entry is parsed again
+# when its DBC file or cantools has changed. With None, the DBC is parsed on
+# each export
+DBC_CACHE_DIR = None
+
+# Set to True to also write all the groups as a single CSV table, with one row
+# per WIDE_TABLE_PERIOD seconds (or per timestamp of any group when None) and
+# the last value of every signal at that time
+WIDE_TABLE = False
+WIDE_TABLE_PERIOD = 0.01
+
+# Set either bound to only export the frames of a time window, given as a
+# datetime or as seconds from the start of the log (e.g. 3600 and 3630). The
+# window is found using a time index of the log, built on its first export and
+# kept next to it (.timeindex file)
+START_TIME = None
+END_TIME = None
+
+# Set to a number of digits (0 to 6) to write the timestamps of the CSV files
+# with that many digits of the second, instead of to the microsecond without
+# the fraction when it is zero
+TIMESTAMP_PRECISION = None
+
+# Set to a size in bytes to spill the largest groups to temporary files (in
+# SPILL_DIR, or the default temporary directory when None) once the decoded
+# values held in memory exceed it. Not used with STREAM_DIR
+MEMORY_LIMIT = None
+SPILL_DIR = None
+
+# Set to True to time each stage of the export (reading, DBC lookup, decoding
+# by message, listeners, storage, writing) into profile_report.json
+PROFILE = False
+
 
 def run():
     if AUTO_DATA_FILE:
@@ -28,8 +100,6 @@ def run():
     if not data_file:
         return
 
-    print('> SHA256 of data file: {}'.format(get_sha(data_file)))
-
     if AUTO_DBC_FILE:
         dbc_file = guess_dbc_file(DBC_DIR)
     elif DBC_FILE:
@@ -42,46 +112,134 @@ def run():
     if not dbc_file:
         return
 
-    dbc_filter = DbcFilter(accept_all=True)
+    export_file(data_file, dbc_file, OUTPUT_DIR, stream_dir=STREAM_DIR)
 
-    reader_init = None
-    count = 0
 
-    if reader_init is None:
-        [reader_init, count] = try_decode_asc(data_file)
-    if reader_init is None:
-        [reader_init, count] = try_decode_blf(data_file)
-    if reader_init is None:
-        [reader_init, count] = try_decode_trc(data_file)
-    if reader_init is None:
-        raise ValueError('Could not decode provided log file')
+# Exports a single data file into output_dir along with its reports. The DBC
+# may be given either as a path or as an already loaded cantools database.
+def export_file(data_file, dbc_file, output_dir, stream_dir=None, show_progress=True,
+                blf_workers=BLF_WORKERS, start_time=START_TIME, end_time=END_TIME):
+    dbc_filter = DbcFilter(accept_all=True)
+    reader_init = open_log(data_file)
+    windowed = start_time is not None or end_time is not None
+    parallel = reader_init is can.BLFReader and blf_workers > 1 and not windowed
 
+    # The progress is that of the file being read, except for parallel
+    # decoding where it is the count of processed frames
     export = LogExport(dbc_file, dbc_filter,
                        signal_renamer=hvhv_shortname,
                        use_time_grouping=True,
                        target_channel=AutoChannel,
-                       expected_frame_count=count,
-                       use_sample_and_hold=False)
+                       use_sample_and_hold=False,
+                       use_columnar_storage=True,
+                       use_batch_decoding=True,
+                       use_selective_decoding=True,
+                       stream_dir=stream_dir,
+                       dbc_cache_dir=DBC_CACHE_DIR,
+                       start_time=start_time,
+                       end_time=end_time,
+                       timestamp_precision=TIMESTAMP_PRECISION,
+                       memory_limit=MEMORY_LIMIT,
+                       spill_dir=SPILL_DIR,
+                       show_progress=show_progress and parallel)
+
+    profiler = Profiler().attach(export) if PROFILE else None
+    stage = profiler.stage if profiler else lambda name: nullcontext()
+
+    # Only the segments of the log overlapping the window are read
+    time_index = None
+    if windowed:
+        time_index = TimeIndex(data_file, reader_init)
+        with stage('time_index'):
+            time_index.load_or_build(show_progress)
+        if time_index.start_timestamp is not None:
+            export.set_log_start(time_index.start_timestamp)
+        window = export.time_window or (None, None)
+
+    # The channel and the rest of the state are restored from the checkpoint
+    incremental = None
+    if INCREMENTAL_EXPORT and not parallel and not windowed and MEMORY_LIMIT is None:
+        checkpoint_file = Path(output_dir, Path(data_file).name + '.checkpoint')
+        incremental = IncrementalExport(export, data_file, checkpoint_file, reader_init)
+        incremental.resume()
 
     time_start = perf_counter()
-    reader = reader_init(data_file)
-    for frame in reader:
-        export.process_frame(frame, allow_truncated=True)
+    if CHANNEL_PRESCAN and not (incremental and incremental.resumed):
+        if time_index:
+            prescan_reader = time_index.window_reader(*window)
+        elif reader_init is can.BLFReader:
+            prescan_reader = reader_init(data_file)
+        else:
+            prescan_reader = reader_init(data_file, frame_filter=export.is_frame_listed)
+        with stage('channel_prescan'):
+            channel = export.prescan_channel(prescan_reader, CHANNEL_PRESCAN_FRAMES)
+        print(f'> Channel selected by pre-scan: {channel}')
+
+    if parallel:
+        process_blf_parallel(export, data_file, blf_workers, allow_truncated=True)
+        sha = get_sha(data_file)
+    elif incremental:
+        incremental.process(show_progress, allow_truncated=True)
+        sha = incremental.sha
+    elif time_index:
+        reader = time_index.window_reader(*window)
+        for frame in profiler.iterate(reader) if profiler else reader:
+            export.process_frame(frame, allow_truncated=True)
+        sha = time_index.sha256
+    else:
+        # The file is hashed while being read by the reader
+        [reader, ingest] = open_log_reader(data_file, reader_init, show_progress,
+                                           frame_filter=export.is_frame_listed)
+        frames = profiler.iterate(reader) if profiler else reader
+        if PIPELINE:
+            Pipeline(export).run(frames, allow_truncated=True)
+        else:
+            for frame in frames:
+                export.process_frame(frame, allow_truncated=True)
+        # Frames of IDs unknown to the DBC are skipped by the text readers
+        if reader_init is not can.BLFReader:
+            export.skip_frames(reader.skipped_count)
+        sha = ingest.hexdigest()
     time_stop = perf_counter()
 
-    export.print_info()
+    print('> SHA256 of data file: {}'.format(sha))
+    # The frames still buffered for batch decoding are processed here
+    with stage('flush'):
+        export.print_info()
     print(f'> Elapsed time: {round(time_stop - time_start)}s')
-    output_file = export.write_csv(OUTPUT_DIR, str(data_file))
+
+    # Written before the outputs, which remove the empty columns of the groups
+    if incremental:
+        incremental.save()
+    with stage('write_csv'):
+        output_file = export.write_csv(output_dir, str(data_file), use_direct_zip=True)
 
     if output_file:
-        report_path = Path(OUTPUT_DIR, 'report.txt')
+        report_path = Path(output_dir, 'report.txt')
         with open(report_path, 'w') as report:
             report.write(output_file)
 
-    export.write_signals_json(OUTPUT_DIR,'exported_signals.json')
-    export.write_crc_report(OUTPUT_DIR, 'crc_report.json')
-    export.frame_listeners[0].write_report(OUTPUT_DIR, 'mux_report.json')
-    export.frame_listeners[1].write_report(OUTPUT_DIR, 'rolling_counter_report.json')
+    if BINARY_FORMAT:
+        with stage('write_binary'):
+            export.write_binary(output_dir, str(data_file), BINARY_FORMAT)
+
+    if WIDE_TABLE:
+        with stage('write_wide_csv'):
+            export.write_wide_csv(output_dir, str(data_file), WIDE_TABLE_PERIOD)
+
+    with stage('write_reports'):
+        export.write_signals_json(output_dir,'exported_signals.json')
+        export.write_crc_report(output_dir, 'crc_report.json')
+        export.frame_listeners[0].write_report(output_dir, 'mux_report.json')
+        export.frame_listeners[1].write_report(output_dir, 'rolling_counter_report.json')
+
+    if profiler:
+        profiler.write_report(output_dir, 'profile_report.json')
+
+    summary = {'data_file': str(data_file), 'sha256': sha, 'output_file': output_file,
+               'elapsed_time': time_stop - time_start}
+    summary.update(export.summary())
+    return summary
 
 
 if __name__ == '__main__':
@@ -1,8 +1,10 @@
-import re
 from collections import defaultdict
 import json
 from pathlib import Path
 
+from batch_decoder import network_msb
+from frame_listener import *
+
 
 def print_warning(warning):
     warncolor = '\033[95m'
@@ -10,31 +12,100 @@ def print_warning(warning):
     print(f'> {warncolor}{warning}{endcolor}')
 
 
-class MuxVerifier:
+# Multiplexer of a message with the values selecting its signals in the DBC,
+# whose raw value is read from the payload of a frame. parent and parent_ids
+# give the multiplexer (and its values) selecting it, for nested multiplexers.
+class MultiplexerCheck:
+    def __init__(self, msg, signal):
+        self.name = signal.name
+        self.signal = signal
+        self.allowed_ids = set()
+        for child in msg.signals:
+            if child.multiplexer_signal == signal.name:
+                self.allowed_ids.update(child.multiplexer_ids)
+        self.parent = signal.multiplexer_signal
+        self.parent_ids = set(signal.multiplexer_ids or ())
+
+        self.mask = (1 << signal.length) - 1
+        self.little_endian = signal.byte_order == 'little_endian'
+        if self.little_endian:
+            self.end_bit = signal.start + signal.length
+        else:
+            self.end_bit = network_msb(signal) + signal.length
+
+    def read(self, data):
+        # Returns the multiplexer value as cantools decodes it, or None if the
+        # payload is too short to hold it
+        size = 8 * len(data)
+        if self.end_bit > size:
+            return None
+        if self.little_endian:
+            raw = (int.from_bytes(data, 'little') >> self.signal.start) & self.mask
+        else:
+            raw = (int.from_bytes(data, 'big') >> (size - self.end_bit)) & self.mask
+        if self.signal.is_signed and raw >> (self.signal.length - 1):
+            raw -= 1 << self.signal.length
+        return int(self.signal.conversion.raw_to_scaled(raw, decode_choices=False))
+
+
+class MuxVerifier(FrameListener):
 
     def __init__(self):
         self.mux_errors = {}
         self.count = 0
-        pass
+        self.checks = {}
+
+    def subscribe(self, msg):
+        # A frame decoded without error has valid multiplexer values, so only
+        # the decode errors of multiplexed messages need to be checked
+        checks = [MultiplexerCheck(msg, signal) for signal in msg.signals if signal.is_multiplexer]
+        if not checks:
+            return set()
+        # Multiplexers come after the multiplexer selecting them
+        depth = {}
+        for check in checks:
+            depth[check.name] = 0
+            parent = check.parent
+            while parent is not None:
+                depth[check.name] += 1
+                parent = msg.get_signal_by_name(parent).multiplexer_signal
+        self.checks[msg.name] = sorted(checks, key=lambda check: depth[check.name])
+        return {DECODE_ERROR}
+
+    def find_unexpected(self, msg, data):
+        # Returns the first multiplexer of the frame whose value selects no
+        # signal, with that value, or None when the decode error has another
+        # cause (such as a truncated frame)
+        checks = self.checks.get(msg.name)
+        if checks is None:
+            self.subscribe(msg)
+            checks = self.checks.get(msg.name, [])
+        values = {}
+        for check in checks:
+            if check.parent is not None and values.get(check.parent) not in check.parent_ids:
+                continue
+            value = check.read(data)
+            if value is None:
+                continue
+            if value not in check.allowed_ids:
+                return check, value
+            values[check.name] = value
+        return None
 
     def process_frame(self, frame, msg, decoded_values, error):
-        if error is not None:
-            text = str(error)
-            match = re.search(r'expected multiplexer id (\d+), but got (\d+)', text)
-            if match:
-                self.count += 1
-                expected, got = map(int, match.groups())
-                # Pas besoin d'aller rechercher la définition dans le DBC !?
-                for element in msg.signal_tree:
-                    # Multiplexed signals are provided inside dictionaries
-                    if type(element) is dict:
-                        [multiplexor, muxgroups] = next(iter(element.items()))
-                        mux_values = set(muxgroups.keys())
-                        if msg.name not in self.mux_errors:
-                            self.mux_errors[msg.name] = {'multiplexor': multiplexor,
-                                                         'expected_values_from_dbc': mux_values,
-                                                         'actual_values_in_frames': defaultdict(int)}
-                        self.mux_errors[msg.name]['actual_values_in_frames'][got] += 1
+        if error is None:
+            return
+        unexpected = self.find_unexpected(msg, frame.data)
+        if unexpected is None:
+            return
+        check, got = unexpected
+        self.count += 1
+        key = (msg.name, check.name)
+        if key not in self.mux_errors:
+            self.mux_errors[key] = {'multiplexor': check.name,
+                                    'expected_values_from_dbc': check.allowed_ids,
+                                    'actual_values_in_frames': defaultdict(int)}
+        self.mux_errors[key]['actual_values_in_frames'][got] += 1
 
     def write_report(self, output_dir, filename):
         if self.count > 0:
@@ -44,11 +115,11 @@ class MuxVerifier:
 
             report = []
 
-            for name, errors in self.mux_errors.items():
+            for (name, _), errors in self.mux_errors.items():
                 formatted_errors = {
                     'multiplexor': errors['multiplexor'],
-                    'expected_values_from_dbc': list(errors['expected_values_from_dbc']),
-                    'actual_values_in_frames': list(errors['actual_values_in_frames'])
+                    'expected_values_from_dbc': sorted(errors['expected_values_from_dbc']),
+                    'actual_values_in_frames': sorted(errors['actual_values_in_frames'])
                 }
                 entry = {'message': name}
                 entry.update(formatted_errors)
@@ -0,0 +1,117 @@
+import queue
+import threading
+
+from logdata import write_staged_rows
+
+# Marks the end of the items of a queue
+END = object()
+
+
+class Pipeline:
+    """
+    Processes the frames of a reader with an export in three stages connected
+    by bounded queues, so that reading the log overlaps with decoding:
+    - the reader stage, on its own thread, iterates the reader (reading and
+      decompressing the file) and sends the frames by batches of batch_size,
+    - the decode stage, on the calling thread, gives the frames to
+      export.process_frame in the order of the log,
+    - the writer stage, on its own thread, writes the rows flushed by the
+      streaming groups (with stream_dir) into their staging files, in the
+      order they were flushed.
+
+    Each queue holds at most queue_size items, so that a stage running ahead
+    waits for the next one instead of filling the memory. The first exception
+    raised by any stage stops the others and is raised again by run. The
+    result is the same as calling export.process_frame for each frame.
+    """
+
+    def __init__(self, export, batch_size=1024, queue_size=8):
+        self.export = export
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.stopped = threading.Event()
+        self.error = None
+
+    def fail(self, error):
+        if self.error is None:
+            self.error = error
+        self.stopped.set()
+
+    def put(self, items, item):
+        # Waits for room in the queue, unless another stage failed
+        while not self.stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, items):
+        while not self.stopped.is_set():
+            try:
+                return items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return END
+
+    def read_stage(self, reader, frames):
+        try:
+            batch = []
+            for frame in reader:
+                batch.append(frame)
+                if len(batch) >= self.batch_size:
+                    if not self.put(frames, batch):
+                        return
+                    batch = []
+            if batch:
+                self.put(frames, batch)
+            self.put(frames, END)
+        except BaseException as e:
+            self.fail(e)
+
+    def write_stage(self, writes):
+        try:
+            while True:
+                item = self.get(writes)
+                if item is END:
+                    return
+                write_staged_rows(*item)
+        except BaseException as e:
+            self.fail(e)
+
+    def run(self, reader, allow_truncated=False):
+        export = self.export
+        frames = queue.Queue(self.queue_size)
+        writes = queue.Queue(self.queue_size)
+
+        def redirect(path, fieldnames, rows):
+            if not self.put(writes, (path, fieldnames, rows)):
+                raise self.error
+
+        threads = [threading.Thread(target=self.read_stage, args=(reader, frames),
+                                    name='pipeline-reader', daemon=True),
+                   threading.Thread(target=self.write_stage, args=(writes,),
+                                    name='pipeline-writer', daemon=True)]
+        export.staging_writer.redirect = redirect
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                batch = self.get(frames)
+                if batch is END:
+                    break
+                for frame in batch:
+                    export.process_frame(frame, allow_truncated=allow_truncated)
+            # The frames buffered for batch decoding may also flush rows
+            export.flush()
+            self.put(writes, END)
+        except BaseException as e:
+            self.fail(e)
+        finally:
+            for thread in threads:
+                thread.join()
+            export.staging_writer.redirect = None
+
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,143 @@
+import json
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+
+
+# Opt-in instrumentation of a LogExport. When attached, the methods of the hot
+# path are replaced on the instance by timed wrappers, so that an export without
+# a profiler runs the exact same code as before. Each entry counts its calls (or
+# frames) and accumulates their duration; the durations are inclusive, so that
+# for instance 'process_frame' contains the lookup, decoding and storage times.
+class Profiler:
+    def __init__(self):
+        self.stages = {}
+        self.decoding = {}
+        self.listeners = {}
+
+    @staticmethod
+    def add(entries, name, count, elapsed):
+        entry = entries.get(name)
+        if entry is None:
+            entry = entries[name] = [0, 0.0]
+        entry[0] += count
+        entry[1] += elapsed
+
+    def timed(self, entries, name, function, count=1):
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(entries, name, count, perf_counter() - start)
+        return wrapper
+
+    @contextmanager
+    def stage(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(self.stages, name, 1, perf_counter() - start)
+
+    def iterate(self, iterable, name='read'):
+        # Times the reader alone, excluding the processing of each frame
+        iterator = iter(iterable)
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(self.stages, name, 0, perf_counter() - start)
+                return
+            self.add(self.stages, name, 1, perf_counter() - start)
+            yield item
+
+    def attach(self, export):
+        stages = self.stages
+        export.process_frame = self.timed(stages, 'process_frame', export.process_frame)
+        export.process_decoded_frame = self.timed(stages, 'process_frame',
+                                                  export.process_decoded_frame)
+        export.create_decode_plan = self.timed(stages, 'dbc_lookup', export.create_decode_plan)
+        export.store_message = self.timed(stages, 'store_message', export.store_message)
+
+        decode_message = export.decode_message
+        decode_batch = export.decode_batch
+
+        def timed_decode_message(plan, frame, allow_truncated):
+            start = perf_counter()
+            try:
+                return decode_message(plan, frame, allow_truncated)
+            finally:
+                self.add(self.decoding, plan.msg.name, 1, perf_counter() - start)
+
+        def timed_decode_batch(plan, payloads):
+            # The frames left to decode_message are counted there
+            start = perf_counter()
+            results = decode_batch(plan, payloads)
+            count = sum(1 for result in results if result is not None)
+            self.add(self.decoding, plan.msg.name, count, perf_counter() - start)
+            return results
+
+        def timed_notify_listeners(listeners, frame, message, decoded_values, error):
+            for listener in listeners:
+                start = perf_counter()
+                listener.process_frame(frame, message, decoded_values, error)
+                self.add(self.listeners, type(listener).__name__, 1, perf_counter() - start)
+
+        export.decode_message = timed_decode_message
+        export.decode_batch = timed_decode_batch
+        export._notify_listeners = timed_notify_listeners
+
+        # The CRC is verified outside of the listeners, and by batches when
+        # the frames are decoded by batches. The batches flushed by check_frame
+        # are already timed with it.
+        crc_verifier = export.crc_verifier
+        name = type(crc_verifier).__name__
+        running = []
+
+        def timed_crc(function, count):
+            def wrapper(*args):
+                if running:
+                    return function(*args)
+                running.append(function)
+                start = perf_counter()
+                try:
+                    return function(*args)
+                finally:
+                    running.pop()
+                    self.add(self.listeners, name, count, perf_counter() - start)
+            return wrapper
+
+        crc_verifier.check_frame = timed_crc(crc_verifier.check_frame, 1)
+        crc_verifier.flush = timed_crc(crc_verifier.flush, 0)
+        return self
+
+    @staticmethod
+    def format_entries(entries, count_name='calls'):
+        report = {}
+        for name, (count, elapsed) in sorted(entries.items(), key=lambda e: -e[1][1]):
+            report[name] = {count_name: count, 'time': round(elapsed, 6),
+                            f'time_per_{count_name[:-1]}_us':
+                                round(1e6 * elapsed / count, 3) if count else None}
+        return report
+
+    def report(self):
+        # Storage excludes the frame listeners, which are notified when storing
+        # a frame, unlike the CRC verifier
+        listeners_time = sum(elapsed for name, (_, elapsed) in self.listeners.items()
+                             if name != 'CrcVerifier')
+        storage = self.stages.get('store_message', [0, 0.0])
+        stages = self.format_entries(self.stages)
+        stages['storage'] = {'calls': storage[0], 'time': round(storage[1] - listeners_time, 6)}
+        return {
+            'stages': stages,
+            'decoding_by_message': self.format_entries(self.decoding, 'frames'),
+            'listeners': self.format_entries(self.listeners),
+        }
+
+    def write_report(self, output_dir, filename):
+        filepath = Path(output_dir, filename)
+        with open(filepath, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        print(f'> Profile report written to: {filepath}')
@@ -0,0 +1,149 @@
+import csv
+from pathlib import Path
+
+import numpy as np
+
+from timestamps import timestamp_text
+
+
+# Index of the last valid row at or before each row, -1 before the first one
+def forward_fill_index(valid):
+    index = np.where(valid, np.arange(len(valid)), -1)
+    np.maximum.accumulate(index, out=index)
+    return index
+
+
+def forward_fill(values, valid):
+    """
+    Returns the values with each missing value replaced by the last value
+    present before it, and the mask of the values present after filling
+    (only those preceding the first value present remain missing).
+    """
+    index = forward_fill_index(valid)
+    if not len(index):
+        return values, valid
+    return values[np.maximum(index, 0)], index >= 0
+
+
+# Timestamps in microseconds since the epoch (absolute time) or since the start
+# of the log (relative time), as integers
+def time_values(timestamps):
+    return timestamps.astype(np.int64)
+
+
+def time_grid(first, last, period):
+    # Multiples of period (in microseconds) covering first to last
+    start = first // period * period
+    return np.arange(start, last + 1, period, dtype=np.int64)
+
+
+# Group of values resulting from merge_groups. It provides the same columns,
+# units and signal sources as the groups of a LogExport, so that it can be
+# converted or written as one (see binary_export and write_csv).
+class WideTable:
+    def __init__(self, name, timestamps, columns, units, sources, precision=None):
+        self.name = name
+        self.timestamps = timestamps
+        self.columns = columns
+        self.units = units
+        self.sources = sources
+        self.precision = precision
+        self.fieldnames = ['timestamp'] + list(columns)
+
+    def value_fieldnames(self):
+        return self.fieldnames[1:]
+
+    def column_data(self):
+        return self.timestamps, self.columns
+
+    def iter_columns(self):
+        # Columns as lists of Python values, '' where missing, as in the CSV
+        # files of the groups
+        yield timestamp_text(self.timestamps, self.precision)
+        for values, valid in self.columns.values():
+            column = values.astype(object)
+            column[~valid] = ''
+            yield column.tolist()
+
+    def write_csv_stream(self, csvfile, delimiter=','):
+        writer = csv.writer(csvfile, delimiter=delimiter)
+        writer.writerow(self.fieldnames)
+        # The unit line must be written to the CSV even if it is empty
+        writer.writerow([self.units.get(fieldname, '') for fieldname in self.fieldnames])
+        writer.writerows(zip(*self.iter_columns()))
+
+    def write_csv(self, output_path, delimiter=','):
+        with open(output_path, 'w', newline='') as csvfile:
+            self.write_csv_stream(csvfile, delimiter)
+        return Path(output_path)
+
+
+def merge_groups(groups, period=None, max_age=None, name='wide', precision=None):
+    """
+    Merges the values of groups onto a common timeline, as one table with a
+    column per field: each row holds, for each field, its last value at or
+    before the timestamp of the row (an as-of merge), so that the values are
+    sampled and held across all the groups.
+
+    Keyword arguments:
+    period -- Interval of the timeline in seconds (e.g. 0.01), aligned on
+    its multiples. By default, the timeline holds every timestamp of the
+    groups.
+    max_age -- Values older than max_age seconds at the time of a row are
+    left missing instead of being held.
+    precision -- Number of digits of the second of the timestamps written
+    to the CSV file (see TimestampRecorder).
+    """
+    merged = []
+    for group in groups:
+        timestamps, columns = group.column_data()
+        if not len(timestamps) or not columns:
+            continue
+        times = time_values(timestamps)
+        # Frames are stored in the order of the log, which is usually but not
+        # always in order of time
+        if np.any(times[1:] < times[:-1]):
+            order = np.argsort(times, kind='stable')
+            times = times[order]
+            columns = {f: (values[order], valid[order]) for f, (values, valid) in columns.items()}
+        merged.append((group, timestamps.dtype, times, columns))
+
+    if not merged:
+        return WideTable(name, np.array([], dtype='datetime64[us]'), {}, {}, {}, precision)
+
+    dtype = merged[0][1]
+    if period is None:
+        grid = np.unique(np.concatenate([times for _, _, times, _ in merged]))
+    else:
+        grid = time_grid(min(times[0] for _, _, times, _ in merged),
+                         max(times[-1] for _, _, times, _ in merged),
+                         max(1, round(period * 1000000)))
+
+    # Fields of the same name in several groups are prefixed by their group
+    seen = {}
+    for group, _, _, columns in merged:
+        for fieldname in columns:
+            seen[fieldname] = seen.get(fieldname, 0) + 1
+
+    columns = {}
+    units = {}
+    sources = {}
+    for group, _, times, group_columns in merged:
+        # Row of the group at or before each time of the grid
+        rows = np.searchsorted(times, grid, side='right') - 1
+        before = rows < 0
+        rows[before] = 0
+        for fieldname, (values, valid) in group_columns.items():
+            source = forward_fill_index(valid)[rows]
+            source[before] = -1
+            present = source >= 0
+            if max_age is not None:
+                present &= grid - times[np.maximum(source, 0)] <= round(max_age * 1000000)
+
+            column_name = fieldname if seen[fieldname] == 1 else f'{group.name}.{fieldname}'
+            columns[column_name] = (values[np.maximum(source, 0)], present)
+            if fieldname in group.units:
+                units[column_name] = group.units[fieldname]
+            sources[column_name] = dict(group.sources[fieldname], group=group.name)
+
+    return WideTable(name, grid.astype(dtype), columns, units, sources, precision)
@@ -1,8 +1,9 @@
-import re
 from collections import defaultdict
 import json
 from pathlib import Path
 
+from frame_listener import *
+
 
 def print_warning(warning):
     warncolor = '\033[95m'
@@ -10,16 +11,25 @@ def print_warning(warning):
     print(f'> {warncolor}{warning}{endcolor}')
 
 
-class RollingCounterVerifier:
+class RollingCounterVerifier(FrameListener):
 
     def __init__(self):
         self.count = 0
         self.previous_counters = {}
         self.counter_errors = {}
-        pass
+
+    def subscribe(self, msg):
+        # Only the decoded frames of messages with a rolling counter are checked
+        if any(signal.name == 'NCounter' for signal in msg.signals):
+            return {DECODED}
+        return set()
+
+    def required_signals(self, msg):
+        return {'NCounter'}
 
     def process_frame(self, frame, msg, decoded_values, error):
-        # Nothing to do for messages without a rolling counter
+        # Nothing to do for frames without a rolling counter (such as those of
+        # a multiplexer value without it)
         if 'NCounter' not in decoded_values:
             return
 
@@ -0,0 +1,94 @@
+import struct
+
+from batch_decoder import network_msb
+
+# Formats of the floating point signals, by length
+FLOAT_FORMATS = {16: '>e', 32: '>f', 64: '>d'}
+
+
+# Reads the value of one signal from the payload of a frame, as an integer
+# holding the payload in little endian (for little endian signals) or big
+# endian byte order, converted as cantools does.
+class SignalReader:
+    def __init__(self, msg, signal):
+        self.signal = signal
+        self.name = signal.name
+        self.little_endian = signal.byte_order == 'little_endian'
+        if self.little_endian:
+            self.shift = signal.start
+        else:
+            self.shift = 8 * msg.length - network_msb(signal) - signal.length
+        self.mask = (1 << signal.length) - 1
+        self.sign = 1 << (signal.length - 1) if signal.is_signed else 0
+        self.float_format = FLOAT_FORMATS[signal.length] if signal.conversion.is_float else None
+        self.raw_to_scaled = signal.conversion.raw_to_scaled
+        self.parent = signal.multiplexer_signal
+        self.parent_ids = frozenset(signal.multiplexer_ids or ())
+        # Values of a multiplexer that select signals, None for the signals
+        # that select none
+        self.allowed_ids = frozenset(mux_id for child in msg.signals
+                                     if child.multiplexer_signal == signal.name
+                                     for mux_id in child.multiplexer_ids) or None
+
+    def read(self, little, big):
+        raw = ((little if self.little_endian else big) >> self.shift) & self.mask
+        if self.float_format is not None:
+            raw = struct.unpack(self.float_format,
+                                raw.to_bytes(self.signal.length // 8, 'big'))[0]
+        elif raw & self.sign:
+            raw -= self.sign << 1
+        return self.raw_to_scaled(raw, False)
+
+
+class SelectiveDecoder:
+    """
+    Decodes only some signals of a message, directly from the payload of each
+    frame, so that the other signals of wide messages cost nothing. The
+    multiplexers are always decoded, both to select the multiplexed signals
+    and to detect the frames that cantools rejects.
+
+    decode returns the same values as Message.decode for these signals (the
+    multiplexed ones being present for the same multiplexer values), or None
+    for the payloads that must be decoded by Message.decode instead: payloads
+    shorter than the message, and those with a multiplexer value selecting no
+    signal, so that the error raised is unchanged.
+    """
+
+    def __init__(self, msg, signal_names):
+        self.length = msg.length
+
+        # Multiplexers must be read before the signals they select
+        def depth(signal):
+            level = 0
+            while signal.multiplexer_signal is not None:
+                signal = msg.get_signal_by_name(signal.multiplexer_signal)
+                level += 1
+            return level
+
+        signals = [signal for signal in msg.signals
+                   if signal.name in signal_names or signal.is_multiplexer]
+        self.readers = [SignalReader(msg, signal) for signal in sorted(signals, key=depth)]
+        self.little = any(reader.little_endian for reader in self.readers)
+        self.big = not all(reader.little_endian for reader in self.readers)
+
+    def decode(self, data):
+        length = self.length
+        if len(data) < length:
+            return None
+        data = bytes(data[:length])
+        little = int.from_bytes(data, 'little') if self.little else 0
+        big = int.from_bytes(data, 'big') if self.big else 0
+
+        decoded = {}
+        mux_ids = {}
+        for reader in self.readers:
+            if reader.parent is not None and mux_ids.get(reader.parent) not in reader.parent_ids:
+                continue
+            value = reader.read(little, big)
+            if reader.allowed_ids is not None:
+                mux_id = int(value)
+                if mux_id not in reader.allowed_ids:
+                    return None
+                mux_ids[reader.name] = mux_id
+            decoded[reader.name] = value
+        return decoded
@@ -0,0 +1,157 @@
+import random
+from pathlib import Path
+
+import can
+import cantools
+from cantools.database import Database, Message
+from cantools.database.can.signal import Signal
+from cantools.database.conversion import BaseConversion
+
+from crc_verifier import compute_crc8_h2f
+
+# Synthetic DBC and logs used by the benchmarks. Everything is generated from a
+# seed, so that the same arguments always give the same files.
+#
+# The messages cycle through four layouts, all 8 bytes long:
+# - status: Intel signals, a 4-bit 'NCounter' in byte 6 and a 'NCrc' in byte 7
+# - motor: Motorola signals, signed and scaled
+# - muxed: an 8-bit multiplexer in byte 0 selecting one of three signal sets,
+#   plus a signal common to all of them
+# - mixed: Intel and Motorola signals of various lengths side by side
+MESSAGE_KINDS = ['Status', 'Motor', 'Muxed', 'Mixed']
+MUX_VALUES = [0, 1, 2]
+FIRST_FRAME_ID = 0x100
+
+
+def signal(name, start, length, byte_order='little_endian', is_signed=False, scale=1, offset=0,
+           unit=None, is_multiplexer=False, multiplexer_ids=None, multiplexer_signal=None):
+    return Signal(name, start, length, byte_order=byte_order, is_signed=is_signed,
+                  conversion=BaseConversion.factory(scale, offset, None, False),
+                  unit=unit, is_multiplexer=is_multiplexer, multiplexer_ids=multiplexer_ids,
+                  multiplexer_signal=multiplexer_signal)
+
+
+def motorola_start(byte, bit):
+    # Start bit of a Motorola signal, given the byte and bit (7 being the most
+    # significant) of its most significant bit
+    return byte * 8 + bit
+
+
+def message_signals(kind):
+    if kind == 'Status':
+        return [signal('Voltage', 0, 16, scale=0.1, unit='V'),
+                signal('Current', 16, 16, is_signed=True, scale=0.01, offset=-5, unit='A'),
+                signal('Flags', 32, 16),
+                signal('NCounter', 48, 4),
+                signal('Mode', 52, 4),
+                signal('NCrc', 56, 8)]
+    if kind == 'Motor':
+        return [signal('Speed', motorola_start(0, 7), 16, 'big_endian', is_signed=True,
+                       scale=0.25, unit='rpm'),
+                signal('Torque', motorola_start(2, 7), 12, 'big_endian', is_signed=True,
+                       scale=0.5, unit='Nm'),
+                signal('Temp', motorola_start(3, 3), 10, 'big_endian', offset=-40, unit='degC'),
+                signal('Position', motorola_start(5, 7), 24, 'big_endian')]
+    if kind == 'Muxed':
+        signals = [signal('Mux', 0, 8, is_multiplexer=True)]
+        for value in MUX_VALUES:
+            signals.append(signal(f'A{value}', 8, 16, multiplexer_ids=[value],
+                                  multiplexer_signal='Mux', scale=value + 1))
+            signals.append(signal(f'B{value}', 24, 24, is_signed=True, multiplexer_ids=[value],
+                                  multiplexer_signal='Mux'))
+        signals.append(signal('Common', 56, 8))
+        return signals
+    return [signal('Low', 0, 7),
+            signal('High', motorola_start(1, 7), 13, 'big_endian', is_signed=True, scale=2),
+            signal('Wide', 24, 24, scale=0.001, offset=1),
+            signal('Tail', motorola_start(6, 5), 14, 'big_endian')]
+
+
+def make_dbc(message_count=8):
+    # Extended IDs are used when the messages do not fit in standard ones
+    is_extended_frame = FIRST_FRAME_ID + message_count + 0x100 > 0x7FF
+    messages = []
+    for index in range(message_count):
+        kind = MESSAGE_KINDS[index % len(MESSAGE_KINDS)]
+        messages.append(Message(FIRST_FRAME_ID + index, f'HVHV_{kind}{index}', 8,
+                                message_signals(kind), is_extended_frame=is_extended_frame))
+    return Database(messages)
+
+
+def write_dbc(path, message_count=8):
+    cantools.database.dump_file(make_dbc(message_count), path)
+    return path
+
+
+# Generates frames of the messages of dbc, spread over channel_count channels
+# with most of them on channel 0. About error_rate of the frames carry an error
+# found by the verifiers (repeated counter, wrong CRC, unknown multiplexer
+# value), as well as the frames of the other channels, which are truncated
+# (DLC mismatch) so that AutoChannel selects channel 0. A tenth of the frames
+# have IDs that are unknown to the DBC.
+def generate_frames(dbc, frame_count, channel_count=2, error_rate=0.01, period=0.0005, seed=1):
+    rng = random.Random(seed)
+    messages = dbc.messages
+    unknown_id = FIRST_FRAME_ID + len(messages) + 0x100
+    channel_weights = [4] + [1] * (channel_count - 1)
+    counters = {}
+    timestamp = 1700000000.0
+
+    for _ in range(frame_count):
+        timestamp += period * rng.uniform(0.5, 1.5)
+        channel = rng.choices(range(channel_count), channel_weights)[0]
+        data = bytearray(rng.getrandbits(8) for _ in range(8))
+
+        if rng.random() < 0.1:
+            yield can.Message(timestamp=timestamp, arbitration_id=unknown_id,
+                              is_extended_id=messages[0].is_extended_frame,
+                              channel=channel, data=data)
+            continue
+
+        msg = rng.choice(messages)
+        names = {s.name for s in msg.signals}
+        if 'NCounter' in names:
+            key = (msg.frame_id, channel)
+            counter = counters.get(key, 0)
+            if rng.random() >= error_rate:
+                counter = (counter + 1) % 16
+            counters[key] = counter
+            data[6] = (data[6] & 0xF0) | counter
+        if 'Mux' in names:
+            data[0] = 7 if rng.random() < error_rate else rng.choice(MUX_VALUES)
+        if 'NCrc' in names:
+            data[7] = compute_crc8_h2f(data[:7])
+            if rng.random() < error_rate:
+                data[7] ^= 0x5A
+
+        if channel != 0 and rng.random() < error_rate:
+            data = data[:rng.randrange(1, 8)]
+
+        yield can.Message(timestamp=timestamp, arbitration_id=msg.frame_id,
+                          is_extended_id=msg.is_extended_frame, channel=channel, data=data)
+
+
+# Writes the frames into a log whose format (ASC, BLF or TRC) is given by the
+# suffix of path
+def write_log(frames, path):
+    with can.Logger(str(path)) as writer:
+        for frame in frames:
+            writer.on_message_received(frame)
+    return path
+
+
+def write_dataset(directory, frame_count, channel_count=2, message_count=8,
+                  formats=('asc', 'blf', 'trc'), error_rate=0.01, seed=1):
+    """
+    Writes a synthetic DBC and the same frames as one log per format into
+    directory, and returns the path of the DBC and a dict mapping each format
+    to the path of its log.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    dbc_file = write_dbc(directory / 'synthetic.dbc', message_count)
+    dbc = make_dbc(message_count)
+    frames = list(generate_frames(dbc, frame_count, channel_count, error_rate, seed=seed))
+    logs = {file_format: write_log(frames, directory / f'synthetic.{file_format}')
+            for file_format in formats}
+    return dbc_file, logs
@@ -0,0 +1,208 @@
+import hashlib
+import io
+import locale
+import os
+import pickle
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+import can
+from tqdm import tqdm
+
+from blf_parallel import ChunkParser, scan_containers, split_chunks, read_containers
+from logexport import IngestFile, get_sha
+
+TIME_INDEX_VERSION = 1
+
+# Part of a log that can be read on its own. For text logs, position holds the
+# (start, end) byte offsets of whole lines and state the reader_state of the
+# reader at start. For BLF files, position holds the (data offset, data size)
+# pairs of its containers and state the bytes of the object continuing from the
+# previous segment. The timestamps are None for segments without any frame.
+IndexSegment = namedtuple('IndexSegment', ['position', 'state', 'frame_count',
+                                           'min_timestamp', 'max_timestamp'])
+
+
+def line_starts(file, step):
+    # Offsets of the first line starting at or after each multiple of step
+    offsets = [0]
+    size = os.path.getsize(file)
+    with open(file, 'rb') as f:
+        for position in range(step, size, step):
+            if position < offsets[-1]:
+                continue
+            f.seek(position - 1)
+            f.readline()
+            if f.tell() >= size:
+                break
+            offsets.append(f.tell())
+    return offsets + [size]
+
+
+def open_text_range(file, start, end, sha256=None):
+    ingest = IngestFile(file, False, start, end, sha256)
+    stream = io.TextIOWrapper(io.BufferedReader(ingest),
+                              encoding=locale.getpreferredencoding(False))
+    return stream, ingest
+
+
+class TimeIndex:
+    """
+    Sidecar index of the timestamps of a log, so that the frames of a time
+    window can be read without reading the whole log.
+
+    The log is divided into segments of about step bytes (whole lines for ASC
+    and TRC logs, whole containers for BLF files), and the index records for
+    each of them its location, the state needed to start reading there, and
+    the range of the timestamps of its frames. The frames of a window are
+    then read from the segments whose range overlaps it only.
+
+    The index is kept next to the log (with a .timeindex suffix), and built
+    again when the size or modification time of the log has changed.
+    """
+
+    def __init__(self, data_file, reader_class, index_file=None, step=1024 * 1024):
+        self.data_file = data_file
+        self.reader_class = reader_class
+        self.index_file = Path(index_file or str(data_file) + '.timeindex')
+        self.step = step
+        self.segments = []
+        self.start_timestamp = None
+        self.sha256 = None
+        self.parser = None
+
+    def file_key(self):
+        stat = os.stat(self.data_file)
+        return {'version': TIME_INDEX_VERSION, 'reader': self.reader_class.__name__,
+                'step': self.step, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def load(self):
+        # Returns whether the index file exists and matches the log
+        try:
+            with open(self.index_file, 'rb') as f:
+                if pickle.load(f) != self.file_key():
+                    return False
+                index = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, TypeError,
+                ValueError):
+            return False
+        self.segments = [IndexSegment(*segment) for segment in index['segments']]
+        self.start_timestamp = index['start_timestamp']
+        self.sha256 = index['sha256']
+        return True
+
+    def save(self):
+        index = {'segments': [tuple(segment) for segment in self.segments],
+                 'start_timestamp': self.start_timestamp, 'sha256': self.sha256}
+        temporary_file = self.index_file.with_name(self.index_file.name + '.tmp')
+        with open(temporary_file, 'wb') as f:
+            pickle.dump(self.file_key(), f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(index, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_file, self.index_file)
+
+    def load_or_build(self, show_progress=True):
+        if self.load():
+            print(f'> Time index loaded from: {self.index_file}')
+            return
+        self.build(show_progress)
+        try:
+            self.save()
+        except OSError as e:
+            print(f'> Time index not written ({e!r})')
+        else:
+            print(f'> Time index written to: {self.index_file}')
+
+    def build(self, show_progress=True):
+        """
+        Reads the whole log once to record the timestamps of each segment.
+        """
+        progressbar = tqdm(total=os.path.getsize(self.data_file), desc='> Indexing file',
+                           unit='B', unit_scale=True, file=sys.stdout, ncols=100,
+                           disable=not show_progress)
+        if self.reader_class is can.BLFReader:
+            self.segments = list(self.build_blf(progressbar))
+            self.sha256 = get_sha(self.data_file)
+        else:
+            self.segments = list(self.build_text(progressbar))
+        progressbar.close()
+
+        timestamps = [segment.min_timestamp for segment in self.segments
+                      if segment.min_timestamp is not None]
+        self.start_timestamp = min(timestamps) if timestamps else None
+
+    def build_text(self, progressbar):
+        offsets = line_starts(self.data_file, self.step)
+        state = None
+        sha256 = hashlib.sha256()
+        for start, end in zip(offsets, offsets[1:]):
+            stream, ingest = open_text_range(self.data_file, start, end, sha256)
+            reader = self.reader_class(stream, state=state)
+            timestamps = [frame.timestamp for frame in reader]
+            yield IndexSegment((start, end), state, len(timestamps),
+                               min(timestamps, default=None), max(timestamps, default=None))
+            state = reader.reader_state()
+            stream.close()
+            progressbar.update(end - start)
+        self.sha256 = sha256.hexdigest()
+
+    def build_blf(self, progressbar):
+        start_timestamp, containers, _ = scan_containers(self.data_file)
+        parser = ChunkParser(start_timestamp)
+        carry = b''
+        for chunk in split_chunks(containers, self.step):
+            data = carry + read_containers(self.data_file, chunk)
+            frames, parsed = parser.parse(data)
+            timestamps = [frame.timestamp for frame in frames]
+            yield IndexSegment(chunk, carry, len(timestamps),
+                               min(timestamps, default=None), max(timestamps, default=None))
+            carry = data[parsed:]
+            progressbar.update(sum(size for _, size in chunk))
+
+    def window_segments(self, start=None, end=None):
+        # Segments holding frames from start to end (POSIX timestamps)
+        return [segment for segment in self.segments if segment.frame_count
+                and (start is None or segment.max_timestamp >= start)
+                and (end is None or segment.min_timestamp <= end)]
+
+    def read_segment(self, segment):
+        if self.reader_class is can.BLFReader:
+            if self.parser is None:
+                with can.BLFReader(self.data_file) as reader:
+                    self.parser = ChunkParser(reader.start_timestamp)
+            frames, _ = self.parser.parse(segment.state + read_containers(self.data_file,
+                                                                           segment.position))
+            yield from frames
+        else:
+            stream, _ = open_text_range(self.data_file, *segment.position)
+            with stream:
+                yield from self.reader_class(stream, state=segment.state)
+
+    def window_reader(self, start=None, end=None):
+        return TimeWindowReader(self, start, end)
+
+
+# Reader of the frames of a log from start to end (POSIX timestamps, each
+# optional), in the order of the log, which only reads the segments of the
+# index overlapping the window
+class TimeWindowReader:
+    skipped_count = 0
+
+    def __init__(self, index, start=None, end=None):
+        self.index = index
+        self.start = start
+        self.end = end
+
+    def __iter__(self):
+        start, end = self.start, self.end
+        for segment in self.index.window_segments(start, end):
+            for frame in self.index.read_segment(segment):
+                if (start is None or frame.timestamp >= start) and \
+                        (end is None or frame.timestamp <= end):
+                    yield frame
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
@@ -0,0 +1,218 @@
+import time
+from datetime import datetime
+
+import numpy as np
+
+MICROSECONDS = 1000000
+DAY = 86400 * MICROSECONDS
+
+
+def local_offsets(seconds):
+    """
+    Returns the UTC offset of the local time, in seconds, at each of the given
+    whole POSIX times, as applied by datetime.fromtimestamp. The offset is
+    looked up once per hour spanned by the times, and only looked up time by
+    time within the hours where it changes.
+    """
+    if not len(seconds):
+        return np.zeros(0, dtype=np.int64)
+    hours = seconds // 3600
+    first = int(hours.min())
+    last = int(hours.max())
+    if last - first < len(seconds):
+        starts = np.arange(first, last + 1, dtype=np.int64)
+        bucket = hours - first
+    else:
+        # Times far apart, e.g. with invalid timestamps in the log
+        starts, bucket = np.unique(hours, return_inverse=True)
+
+    start_offsets = np.array([time.localtime(3600 * h).tm_gmtoff for h in starts.tolist()],
+                             dtype=np.int64)
+    end_offsets = np.array([time.localtime(3600 * h + 3599).tm_gmtoff for h in starts.tolist()],
+                           dtype=np.int64)
+    offsets = start_offsets[bucket]
+    changing = (start_offsets != end_offsets)[bucket]
+    if changing.any():
+        offsets[changing] = [time.localtime(t).tm_gmtoff for t in seconds[changing].tolist()]
+    return offsets
+
+
+def local_microseconds(timestamps):
+    """
+    Converts POSIX timestamps (float seconds) into microseconds since the
+    epoch of the local time, the values of the naive datetime objects that
+    datetime.fromtimestamp would return: the fraction of each timestamp is
+    rounded to the microsecond, half to even, before applying the offset of
+    the local time.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    seconds = np.trunc(timestamps)
+    microseconds = np.rint((timestamps - seconds) * MICROSECONDS)
+    seconds = seconds.astype(np.int64)
+    microseconds = microseconds.astype(np.int64)
+    # The rounded fraction is brought back into [0, 1) second
+    carry = microseconds >= MICROSECONDS
+    seconds[carry] += 1
+    microseconds[carry] -= MICROSECONDS
+    borrow = microseconds < 0
+    seconds[borrow] -= 1
+    microseconds[borrow] += MICROSECONDS
+    return (seconds + local_offsets(seconds)) * MICROSECONDS + microseconds
+
+
+def round_microseconds(values, precision):
+    # Rounds microseconds to precision digits of the second, half to even
+    if precision is None or precision >= 6:
+        return values
+    unit = 10 ** (6 - precision)
+    quotient, remainder = np.divmod(values, unit)
+    quotient += (2 * remainder > unit) | ((2 * remainder == unit) & (quotient % 2 == 1))
+    return quotient * unit
+
+
+# The texts are built as a matrix of UCS-4 code points with one row per
+# character position and one column per text, so that each character is
+# written for all the texts at once into contiguous memory.
+def put_digits(chars, position, values, count):
+    # Writes values as count decimal digits from position
+    values = values.astype(np.int32)
+    for i in range(position + count - 1, position - 1, -1):
+        np.add(values % 10, ord('0'), out=chars[i], casting='unsafe')
+        values //= 10
+
+
+def put_time(chars, position, microseconds):
+    # Writes microseconds within a day as 'HH:MM:SS.ffffff' from position
+    seconds, fractions = np.divmod(microseconds, MICROSECONDS)
+    seconds = seconds.astype(np.int32)
+    put_digits(chars, position, seconds // 3600, 2)
+    put_digits(chars, position + 3, seconds // 60 % 60, 2)
+    put_digits(chars, position + 6, seconds % 60, 2)
+    put_digits(chars, position + 9, fractions, 6)
+    chars[position + 2] = chars[position + 5] = ord(':')
+    chars[position + 8] = ord('.')
+
+
+def clip_text(chars, lengths):
+    # Ends each text at its length (NumPy strings drop their trailing NUL
+    # characters) and returns them as a list of str
+    width = len(chars)
+    chars[np.arange(width)[:, None] >= lengths] = 0
+    return np.ascontiguousarray(chars.T).view(f'<U{width}').ravel().tolist()
+
+
+def text_lengths(fractions, base, precision):
+    # With precision None, the fraction is only written when not zero, as by
+    # str() of datetime and timedelta objects
+    if precision is None:
+        return np.where(fractions != 0, base + 7, base)
+    return np.full(len(fractions), base + precision + 1 if precision else base)
+
+
+def datetime_text(values, precision=None):
+    """
+    Formats datetime64[us] values as str() of datetime objects does
+    ('2024-01-31 12:00:00.250000', and without the fraction when it is zero),
+    or with precision digits of the second when given.
+    """
+    if not len(values):
+        return []
+    days, remainders = np.divmod(values.astype('datetime64[us]').astype(np.int64), DAY)
+    dates = days.astype('datetime64[D]')
+    months = dates.astype('datetime64[M]')
+    years = months.astype('datetime64[Y]').astype(np.int64)
+
+    chars = np.empty((26, len(values)), dtype=np.uint32)
+    put_digits(chars, 0, years + 1970, 4)
+    put_digits(chars, 5, months.astype(np.int64) - 12 * years + 1, 2)
+    put_digits(chars, 8, (dates - months).astype(np.int64) + 1, 2)
+    chars[4] = chars[7] = ord('-')
+    chars[10] = ord(' ')
+    put_time(chars, 11, remainders)
+    return clip_text(chars, text_lengths(remainders % MICROSECONDS, 19, precision))
+
+
+def timedelta_text(values, precision=None):
+    """
+    Formats timedelta64[us] values as str() of timedelta objects does
+    ('0:00:01.250000', '-1 day, 23:59:59', '2 days, 1:00:00'), or with
+    precision digits of the second when given.
+    """
+    if not len(values):
+        return []
+    days, remainders = np.divmod(values.astype('timedelta64[us]').astype(np.int64), DAY)
+    chars = np.empty((15, len(values)), dtype=np.uint32)
+    put_time(chars, 0, remainders)
+
+    # The hours are not padded with zeros
+    short = remainders < 10 * 3600 * MICROSECONDS
+    chars[:-1, short] = chars[1:, short]
+    texts = clip_text(chars, text_lengths(remainders % MICROSECONDS,
+                                          np.where(short, 7, 8), precision))
+
+    for i in np.flatnonzero(days).tolist():
+        count = int(days[i])
+        texts[i] = f'{count} day{"s" if abs(count) != 1 else ""}, {texts[i]}'
+    return texts
+
+
+class TimestampRecorder:
+    """
+    Records the timestamps of the accepted frames as they are given by the
+    reader (float POSIX timestamps), along with their range, and converts them
+    into absolute or relative time only when the groups are written, a column
+    at a time.
+
+    Keyword arguments:
+    relative -- Relative timestamps start from the oldest recorded frame,
+    unless an origin (POSIX timestamp) is given.
+    precision -- Number of digits of the second written to the CSV files, and
+    to which the timestamps of the binary exports are rounded. By default,
+    the timestamps are written to the microsecond, without the fraction when
+    it is zero.
+    """
+
+    def __init__(self, relative, origin=None, precision=None):
+        self.min = None
+        self.max = None
+        self.relative = relative
+        self.origin = origin
+        self.precision = precision
+
+    def record(self, frame):
+        timestamp = frame.timestamp
+        if self.min is None or timestamp < self.min:
+            self.min = timestamp
+        if self.max is None or timestamp > self.max:
+            self.max = timestamp
+        return timestamp
+
+    def time_range(self):
+        # The range of the recorded timestamps as local datetime objects
+        return tuple(None if timestamp is None else datetime.fromtimestamp(timestamp)
+                     for timestamp in (self.min, self.max))
+
+    def to_array(self, timestamps):
+        """
+        Converts recorded timestamps into a datetime64[us] array of the local
+        time, or a timedelta64[us] array with relative time.
+        """
+        if not len(timestamps):
+            return np.array([], dtype='datetime64[us]')
+        values = local_microseconds(timestamps)
+        if self.relative:
+            origin = self.min if self.origin is None else self.origin
+            values = values - local_microseconds([origin])[0]
+            return round_microseconds(values, self.precision).astype('timedelta64[us]')
+        return round_microseconds(values, self.precision).astype('datetime64[us]')
+
+    def to_text(self, timestamps):
+        # Text of recorded timestamps in the CSV files
+        return timestamp_text(self.to_array(timestamps), self.precision)
+
+
+def timestamp_text(values, precision=None):
+    # Text of a datetime64 or timedelta64 array in the CSV files
+    if values.dtype.kind == 'm':
+        return timedelta_text(values, precision)
+    return datetime_text(values, precision)
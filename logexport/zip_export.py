@@ -0,0 +1,59 @@
+import io
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def render_csv(group):
+    # The text encoding is the one used when writing CSV files to disk
+    buffer = io.BytesIO()
+    csvfile = io.TextIOWrapper(buffer, newline='')
+    group.write_csv_stream(csvfile)
+    csvfile.flush()
+    csvfile.detach()
+    return buffer.getvalue()
+
+
+def entry_info(name):
+    # Same description as the entries written by ZipFile.open
+    info = zipfile.ZipInfo(name, date_time=time.localtime(time.time())[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o600 << 16
+    return info
+
+
+# Yields the results of function for each item in order, with at most limit
+# items submitted to the executor ahead of the result being consumed
+def bounded_map(executor, function, items, limit):
+    pending = deque()
+    for item in items:
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+        pending.append(executor.submit(function, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+# Writes the CSV file of each group directly into an entry of the archive,
+# without any intermediate file. With several workers, the CSV files of
+# different groups are rendered in parallel, at most 2 * workers groups ahead
+# of the one being compressed into the archive, in the order of groups.
+def write_groups_to_zip(groups, zip_path, compresslevel=None, workers=1):
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED,
+                         compresslevel=compresslevel) as archive:
+        if workers <= 1:
+            for group in groups:
+                print(f'> Writing CSV file for group {group.name}')
+                # The size of the entry is unknown until it is fully written
+                entry = archive.open(group.name + '.csv', 'w', force_zip64=True)
+                with io.TextIOWrapper(entry, newline='') as csvfile:
+                    group.write_csv_stream(csvfile)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = bounded_map(executor, render_csv, groups, 2 * workers)
+                for group, data in zip(groups, results):
+                    print(f'> Writing CSV file for group {group.name}')
+                    archive.writestr(entry_info(group.name + '.csv'), data,
+                                     compresslevel=compresslevel)
+    return zip_path
@@ -0,0 +1,47 @@
+import contextlib
+import io
+import zipfile
+from pathlib import Path
+
+from helpers_hvhv import hvhv_shortname
+from logexport import AutoChannel, DbcFilter, LogExport
+
+
+def new_export(dbc, **kwargs):
+    # Same settings as main.export_file, all the messages being accepted
+    options = dict(signal_renamer=hvhv_shortname, use_time_grouping=True,
+                   target_channel=AutoChannel, show_progress=False)
+    options.update(kwargs)
+    return LogExport(dbc, DbcFilter(accept_all=True), **options)
+
+
+def process_log(export, data_file, reader_class):
+    with contextlib.redirect_stdout(io.StringIO()):
+        for frame in reader_class(str(data_file)):
+            export.process_frame(frame, allow_truncated=True)
+    return export
+
+
+def export_outputs(export, output_dir, name='log'):
+    # Contents of the CSV files and of the reports of an export, by file name,
+    # along with its summary
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        export.print_info()
+        output_file = export.write_csv(output_dir, str(output_dir / name), use_direct_zip=True)
+        export.write_crc_report(output_dir, 'crc.json')
+        export.frame_listeners[0].write_report(output_dir, 'mux.json')
+        export.frame_listeners[1].write_report(output_dir, 'rolling_counter.json')
+
+    outputs = {'summary': export.summary()}
+    if output_file.endswith('.zip'):
+        with zipfile.ZipFile(output_file) as archive:
+            for entry in archive.namelist():
+                outputs[entry] = archive.read(entry)
+    else:
+        outputs[Path(output_file).name] = Path(output_file).read_bytes()
+    for report in ('crc.json', 'mux.json', 'rolling_counter.json'):
+        path = output_dir / report
+        outputs[report] = path.read_bytes() if path.exists() else None
+    return outputs
@@ -0,0 +1,110 @@
+import random
+
+import cantools
+import pytest
+from cantools.database import Message
+from cantools.database.can.signal import Signal
+from cantools.database.conversion import BaseConversion
+
+import synthetic
+from batch_decoder import BatchDecoder
+from synthetic import motorola_start, signal
+
+UNKNOWN_MUX_VALUE = 7
+
+
+def fd_message():
+    # 64-byte CAN FD message with Intel, Motorola, float and multiplexed
+    # signals spread over the whole payload
+    signals = [signal('Mux', 0, 8, is_multiplexer=True),
+               signal('Counter', 8, 4),
+               signal('Big', motorola_start(2, 7), 32, 'big_endian', is_signed=True, scale=0.5),
+               signal('Long', 48, 64),
+               Signal('Float', 112, 32, conversion=BaseConversion.factory(1, 0, None, True)),
+               signal('MuxedA', 144, 16, multiplexer_ids=[1], multiplexer_signal='Mux',
+                      scale=0.1),
+               signal('MuxedB', motorola_start(18, 7), 24, 'big_endian', is_signed=True,
+                      multiplexer_ids=[2], multiplexer_signal='Mux', offset=-100),
+               signal('Wide', 200, 40, is_signed=True, scale=0.001, offset=1),
+               signal('Tail', motorola_start(60, 7), 32, 'big_endian')]
+    return Message(0x400, 'HVHV_Fd', 64, signals, is_fd=True)
+
+
+def messages():
+    return synthetic.make_dbc(4).messages + [fd_message()]
+
+
+def random_payloads(msg, count, seed):
+    rng = random.Random(seed)
+    is_muxed = any(s.is_multiplexer for s in msg.signals)
+    payloads = []
+    for _ in range(count):
+        data = bytearray(rng.getrandbits(8) for _ in range(msg.length))
+        if is_muxed:
+            data[0] = rng.choice([0, 1, 2, UNKNOWN_MUX_VALUE])
+        if rng.random() < 0.05:
+            data = data[:rng.randrange(msg.length)]
+        payloads.append(bytes(data))
+    return payloads
+
+
+def reference(msg, payload):
+    # Values given by Message.decode, or None when it raises DecodeError
+    try:
+        return msg.decode(payload, decode_choices=False)
+    except cantools.database.errors.DecodeError:
+        return None
+
+
+def same_values(decoded, expected):
+    # Compares the types as well, and NaN values as equal
+    return {name: repr(value) for name, value in decoded.items()} == \
+        {name: repr(value) for name, value in expected.items()}
+
+
+@pytest.mark.parametrize('msg', messages(), ids=lambda msg: msg.name)
+def test_decode_matches_message_decode(msg):
+    payloads = random_payloads(msg, 2000, seed=msg.frame_id)
+    results = BatchDecoder(msg).decode(payloads)
+    assert len(results) == len(payloads)
+    for payload, decoded in zip(payloads, results):
+        expected = reference(msg, payload)
+        if len(payload) < msg.length or expected is None:
+            # Left to Message.decode, so that the error raised is unchanged
+            assert decoded is None
+        else:
+            assert decoded is not None
+            assert same_values(decoded, expected)
+
+
+@pytest.mark.parametrize('msg', messages(), ids=lambda msg: msg.name)
+def test_decode_of_some_signals(msg):
+    names = {s.name for s in msg.signals if not s.is_multiplexer}
+    selected = set(sorted(names)[::2])
+    payloads = random_payloads(msg, 500, seed=msg.frame_id + 1)
+    for payload, decoded in zip(payloads, BatchDecoder(msg, selected).decode(payloads)):
+        expected = reference(msg, payload)
+        if len(payload) < msg.length or expected is None:
+            assert decoded is None
+        else:
+            assert same_values({name: value for name, value in decoded.items()
+                                if name in selected},
+                               {name: value for name, value in expected.items()
+                                if name in selected})
+
+
+def test_decode_of_synthetic_frames():
+    dbc = synthetic.make_dbc(8)
+    frames = list(synthetic.generate_frames(dbc, 4000, error_rate=0.1))
+    for msg in dbc.messages:
+        payloads = [frame.data for frame in frames if frame.arbitration_id == msg.frame_id]
+        for payload, decoded in zip(payloads, BatchDecoder(msg).decode(payloads)):
+            expected = reference(msg, payload)
+            if decoded is None:
+                assert len(payload) < msg.length or expected is None
+            else:
+                assert same_values(decoded, expected)
+
+
+def test_empty_batch():
+    assert BatchDecoder(fd_message()).decode([]) == []
@@ -0,0 +1,43 @@
+import contextlib
+import io
+
+import can
+import pytest
+
+import synthetic
+from blf_parallel import process_blf_parallel, scan_containers
+from outputs import export_outputs, new_export, process_log
+
+EXPORT_OPTIONS = [
+    dict(use_columnar_storage=True, use_batch_decoding=True),
+    dict(use_time_grouping=False, use_sample_and_hold=True, use_relative_time=True),
+]
+
+
+@pytest.fixture(scope='module')
+def log(tmp_path_factory):
+    # Small containers, so that many objects span two containers
+    path = tmp_path_factory.mktemp('logs') / 'log.blf'
+    dbc = synthetic.make_dbc(8)
+    with can.BLFWriter(str(path)) as writer:
+        writer.max_container_size = 997
+        for frame in synthetic.generate_frames(dbc, 4000, error_rate=0.05):
+            writer.on_message_received(frame)
+    return dbc, path
+
+
+def test_log_has_many_containers(log):
+    _, path = log
+    assert len(scan_containers(path)[1]) > 50
+
+
+@pytest.mark.parametrize('options', EXPORT_OPTIONS, ids=['tree', 'table'])
+@pytest.mark.parametrize('chunk_size', [1, 2500, 40000, 16 * 1024 * 1024])
+def test_same_outputs_as_sequential_processing(log, tmp_path, options, chunk_size):
+    dbc, path = log
+    expected = export_outputs(process_log(new_export(dbc, **options), path, can.BLFReader),
+                              tmp_path / 'sequential')
+    export = new_export(dbc, **options)
+    with contextlib.redirect_stdout(io.StringIO()):
+        process_blf_parallel(export, path, 2, chunk_size, allow_truncated=True)
+    assert export_outputs(export, tmp_path / 'parallel') == expected
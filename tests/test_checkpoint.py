@@ -0,0 +1,73 @@
+import contextlib
+import io
+
+import pytest
+
+import synthetic
+from checkpoint import IncrementalExport
+from fast_readers import FastASCReader
+from outputs import export_outputs, new_export, process_log
+from profiler import Profiler
+
+
+@pytest.fixture(scope='module')
+def log(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('logs')
+    dbc = synthetic.make_dbc(8)
+    synthetic.write_log(synthetic.generate_frames(dbc, 3000, error_rate=0.05),
+                        directory / 'log.asc')
+    return dbc, directory / 'log.asc'
+
+
+def incremental_run(dbc, data_file, checkpoint_file, profiler=None):
+    export = new_export(dbc, use_columnar_storage=True, use_batch_decoding=True)
+    if profiler is not None:
+        profiler.attach(export)
+    incremental = IncrementalExport(export, data_file, checkpoint_file, FastASCReader)
+    with contextlib.redirect_stdout(io.StringIO()):
+        resumed = incremental.resume()
+        incremental.process(show_progress=False, allow_truncated=True)
+        incremental.save()
+    return export, resumed
+
+
+@pytest.mark.parametrize('profiled', [False, True])
+def test_resumed_export_of_growing_log(log, tmp_path, profiled):
+    dbc, source = log
+    expected = export_outputs(process_log(new_export(dbc, use_columnar_storage=True,
+                                                     use_batch_decoding=True),
+                                          source, FastASCReader), tmp_path / 'expected')
+
+    data = source.read_bytes()
+    data_file = tmp_path / 'log.asc'
+    checkpoint_file = tmp_path / 'log.asc.checkpoint'
+    profilers = []
+    for fraction, should_resume in ((0.4, False), (0.7, True), (1, True)):
+        data_file.write_bytes(data[:int(len(data) * fraction)])
+        profiler = Profiler() if profiled else None
+        export, resumed = incremental_run(dbc, data_file, checkpoint_file, profiler)
+        assert resumed == should_resume
+        assert checkpoint_file.exists()
+        assert not checkpoint_file.with_name(checkpoint_file.name + '.tmp').exists()
+        profilers.append(profiler)
+
+    assert export_outputs(export, tmp_path / 'resumed') == expected
+    if profiled:
+        # The CRC verifier of the resumed export is still the profiled one
+        for profiler in profilers:
+            assert profiler.listeners['CrcVerifier'][0] > 0
+
+
+def test_failed_checkpoint_leaves_no_temporary_file(log, tmp_path):
+    dbc, data_file = log
+    checkpoint_file = tmp_path / 'log.asc.checkpoint'
+    export = new_export(dbc)
+    incremental = IncrementalExport(export, data_file, checkpoint_file, FastASCReader)
+    with contextlib.redirect_stdout(io.StringIO()):
+        incremental.process(show_progress=False, allow_truncated=True)
+    # Not picklable
+    export.channel_analyzer.frame_counts[0] = lambda: None
+    with pytest.raises(Exception):
+        incremental.save()
+    assert not checkpoint_file.exists()
+    assert not checkpoint_file.with_name(checkpoint_file.name + '.tmp').exists()
@@ -0,0 +1,50 @@
+import contextlib
+import io
+
+import synthetic
+from dbc_cache import load_dbc
+
+
+def load(dbc_file, cache_dir):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        dbc = load_dbc(dbc_file, cache_dir)
+    return dbc, output.getvalue()
+
+
+def test_cached_dbc_is_same(tmp_path):
+    dbc_file = synthetic.write_dbc(tmp_path / 'vehicle.dbc')
+    parsed, output = load(dbc_file, tmp_path / 'cache')
+    assert 'parsed and cached' in output
+    cached, output = load(dbc_file, tmp_path / 'cache')
+    assert 'loaded from cache' in output
+    assert cached.as_dbc_string() == parsed.as_dbc_string()
+
+
+def test_dbc_files_of_same_name_keep_their_entry(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    first = synthetic.write_dbc(tmp_path / 'a' / 'vehicle.dbc', 4)
+    second = synthetic.write_dbc(tmp_path / 'b' / 'vehicle.dbc', 8)
+    load(first, cache_dir)
+    load(second, cache_dir)
+    assert len(list(cache_dir.glob('*.pickle'))) == 2
+
+    dbc, output = load(first, cache_dir)
+    assert 'loaded from cache' in output
+    assert len(dbc.messages) == 4
+    dbc, output = load(second, cache_dir)
+    assert 'loaded from cache' in output
+    assert len(dbc.messages) == 8
+
+
+def test_changed_dbc_replaces_its_entry(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    dbc_file = synthetic.write_dbc(tmp_path / 'vehicle.dbc', 4)
+    load(dbc_file, cache_dir)
+    synthetic.write_dbc(dbc_file, 8)
+    dbc, output = load(dbc_file, cache_dir)
+    assert 'parsed and cached' in output
+    assert len(dbc.messages) == 8
+    assert len(list(cache_dir.glob('*.pickle'))) == 1
@@ -0,0 +1,218 @@
+import can
+import pytest
+
+import synthetic
+from fast_readers import FastASCReader, FastTRCReader, frame_record
+
+ASC_HEX = '''date Sat Sep 30 15:06:13.191 2017
+base hex  timestamps absolute
+internal events logged
+// version 9.0.0
+Begin Triggerblock Sat Sep 30 15:06:13.191 2017
+   0.000000 Start of measurement
+   0.015991 CAN 1 Status:chip status error passive - TxErr: 132 RxErr: 0
+   2.501000 1  Statistic: D 0 R 0 XD 0 XR 0 E 0 O 0 B 0.00%
+  17.876708 1  6F9                Rx   d 8 05 0C 00 00 00 00 00 00  Length = 240015 BitCount = 124 ID = 1785
+  17.876976 1  6F8                Rx   d 8 FF 00 0C FE 00 00 00 00  Length = 239910 BitCount = 124 ID = 1784
+  20.105214 2  18EBFF00x          Rx   d 8 01 A0 0F A6 60 3B D1 40  Length = 273925 BitCount = 141 ID = 418119424x
+  20.155119 2  18EBFF00x          Tx   d 3 02 1F DE
+  20.200000 1  100                Rx   d 0
+  30.005021 1  ErrorFrame
+  30.005071 2  1FFFFFFFx          Rx   r
+  30.100000 1  6F9                Rx   r 8
+  30.300981 1  ErrorFrame ECC: 10100010
+  30.506898 CANFD   1 Rx        300                                   1 0 8  8 11 C2 03 00 00 00 00 00        0    0     3000        0        0        0        0        0
+  30.506899 CANFD   2 Tx   1C4D80A7x  Generic_Name_12                  0 0 9 12 01 02 03 04 05 06 07 08 09 0A 0B 0C   1331984 11 0 0 0 0 0 0 0
+  30.600000 CANFD   1 Rx        6F8                                   1 0 f 64 00 01 02 03 04 05 06 07 08 09 0A 0B 0C 0D 0E 0F 10 11 12 13 14 15 16 17 18 19 1A 1B 1C 1D 1E 1F 20 21 22 23 24 25 26 27 28 29 2A 2B 2C 2D 2E 2F 30 31 32 33 34 35 36 37 38 39 3A 3B 3C 3D 3E 3F     0    0     3000        0        0        0        0        0
+  30.700000 CANFD   2 Rx        100                                   1 0 8  0     0    0     3000        0        0        0        0        0
+End TriggerBlock
+Begin Triggerblock Sat Sep 30 15:10:00.000 2017
+   0.000000 Start of measurement
+   1.000000 1  6F9                Rx   d 8 05 0C 00 00 00 00 00 01
+End TriggerBlock
+'''
+
+ASC_DEC = '''date Sat Sep 30 15:06:13.191 2017
+base dec  timestamps relative
+internal events logged
+Begin Triggerblock Sat Sep 30 15:06:13.191 2017
+   0.000000 Start of measurement
+   1.000000 1  1785               Rx   d 8 5 12 0 0 0 0 0 255
+   1.000100 2  418119424x         Rx   d 4 1 160 15 166
+   1.500000 CANFD   1 Rx        768                                   1 0 9 12 1 2 3 4 5 6 7 8 9 10 11 12        0    0     3000        0        0        0        0        0
+End TriggerBlock
+'''
+
+TRC_V1_0 = ''';##########################################################################
+;   C:\\Log.trc
+;
+;    CAN activities imported from C:\\Log.trc
+;    Start time: 18.12.2021 14:28:07.062
+;    PCAN-Net: N/A
+;
+;    Columns description:
+;    ~~~~~~~~~~~~~~~~~~~~~
+;    +-current number in actual sample
+;    |       +time offset of message (ms)
+;    |       |         +ID of message (hex)
+;    |       |         |     +data length code
+;    |       |         |     |  +data bytes (hex) ...
+;    |       |         |     |  |
+;----+- ---+--- ----+--- + -+ -- -- ...
+     1)      17535  0300  8  00 00 00 00 04 00 00 00
+     2)      17700  18EFC9D9  3  01 02 03
+     3)      17873  FFFFFFFF  4  00 00 00 08
+'''
+
+TRC_V1_1 = ''';$FILEVERSION=1.1
+;$STARTTIME=44548.6028595139
+;
+;   Message Number
+;   |         Time Offset (ms)
+;   |         |        Type
+;   |         |        |        ID (hex)
+;   |         |        |        |     Data Length
+;   |         |        |        |     |   Data Bytes (hex) ...
+;   |         |        |        |     |   |
+;---+--   ----+----  --+--  ----+---  +  -+ -- -- -- -- -- -- --
+     1)     17535.4  Tx         0300  8  00 00 00 00 04 00 00 00
+     2)     17540.3  Warng  FFFFFFFF  4  00 00 00 08  BUSHEAVY
+     3)     17700.3  Rx     18EFC9D9  2  01 02
+'''
+
+TRC_V1_3 = ''';$FILEVERSION=1.3
+;$STARTTIME=44548.6028595139
+;
+;---+--   ----+----  --+  --+--  ----+---  +  -+ -- -- -- -- -- -- --
+     1)     23081.6 1  Rx        0300 -  8    00 00 00 00 04 00 00 00
+     2)     23082.2 2  Tx    18EFC9D9 -  1    FF
+     3)     23090.0 1  Warng FFFFFFFF -  4    00 00 00 08 BUSHEAVY
+'''
+
+TRC_V2_0 = ''';$FILEVERSION=2.0
+;$STARTTIME=44548.6028595139
+;$COLUMNS=N,O,T,I,d,L,D
+;
+;---+-- ------+------ +- --+----- +- +- +- -- -- -- -- -- -- --
+      1      1059.900 DT     0300 Rx 8  00 00 00 00 04 00 00 00
+      2      1283.231 DT 18EFC9D9 Tx 3  01 02 03
+      3      1298.755 ST          Rx    00 00 00 08
+      4      1300.000 DT     0400 Rx 0
+'''
+
+TRC_V2_1 = ''';$FILEVERSION=2.1
+;$STARTTIME=44548.6028595139
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+;
+;---+-- ------+------ +- +- --+----- +- +- +--- +- -- -- -- -- -- -- --
+      1      1059.900 DT 1      0300 Rx -  8    00 00 00 00 04 00 00 00
+      2      1283.231 DT 2  18EFC9D9 Rx -  8    01 02 03 04 05 06 07 08
+      3      1298.755 FD 1      0400 Tx -  9    00 01 02 03 04 05 06 07 08 09 0A 0B
+      4      1299.000 FB 2      0500 Rx -  15   00 01 02 03 04 05 06 07 08 09 0A 0B 0C 0D 0E 0F 10 11 12 13 14 15 16 17 18 19 1A 1B 1C 1D 1E 1F 20 21 22 23 24 25 26 27 28 29 2A 2B 2C 2D 2E 2F 30 31 32 33 34 35 36 37 38 39 3A 3B 3C 3D 3E 3F
+      5      1300.500 RR 1      0300 Rx -  8
+      6      1301.000 EC 1           Rx -       00 00 00 00
+      7      1310.000 DT 1      0300 Tx -  0
+'''
+
+TRC_V2_1_LENGTH = ''';$FILEVERSION=2.1
+;$STARTTIME=44548.6028595139
+;$COLUMNS=N,O,T,B,I,d,R,l,D
+;
+      1      1059.900 DT 1      0300 Rx -  8    00 00 00 00 04 00 00 00
+      2      1298.755 FD 1      0400 Tx -  12   00 01 02 03 04 05 06 07 08 09 0A 0B
+'''
+
+SAMPLES = {
+    'asc_hex.asc': ASC_HEX,
+    'asc_dec.asc': ASC_DEC,
+    'trc_v1_0.trc': TRC_V1_0,
+    'trc_v1_1.trc': TRC_V1_1,
+    'trc_v1_3.trc': TRC_V1_3,
+    'trc_v2_0.trc': TRC_V2_0,
+    'trc_v2_1.trc': TRC_V2_1,
+    'trc_v2_1_length.trc': TRC_V2_1_LENGTH,
+}
+
+READERS = {'.asc': (FastASCReader, can.ASCReader), '.trc': (FastTRCReader, can.TRCReader)}
+
+
+def fd_frames(count):
+    # CAN FD frames of every data length, on two channels
+    lengths = [0, 1, 8, 12, 16, 20, 24, 32, 48, 64]
+    return [can.Message(timestamp=1700000000 + 0.001 * i, arbitration_id=0x100 + i % 7,
+                        is_extended_id=i % 5 == 0, channel=i % 2, is_fd=True,
+                        bitrate_switch=i % 2 == 0, data=bytes(range(lengths[i % len(lengths)])))
+            for i in range(count)]
+
+
+@pytest.fixture(scope='module')
+def logs(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('logs')
+    paths = []
+    for name, text in SAMPLES.items():
+        path = directory / name
+        path.write_text(text)
+        paths.append(path)
+
+    dbc = synthetic.make_dbc(8)
+    frames = list(synthetic.generate_frames(dbc, 2000, error_rate=0.1))
+    for file_format in ('asc', 'trc'):
+        paths.append(synthetic.write_log(frames, directory / f'synthetic.{file_format}'))
+    paths.append(synthetic.write_log(fd_frames(300), directory / 'synthetic_fd.asc'))
+    return paths
+
+
+def reference_frames(path):
+    _, reader_class = READERS[path.suffix]
+    with reader_class(str(path)) as reader:
+        return [frame_record(msg) for msg in reader]
+
+
+def fast_frames(path, **kwargs):
+    reader_class, _ = READERS[path.suffix]
+    reader = reader_class(str(path), **kwargs)
+    return list(reader), reader.skipped_count
+
+
+def is_listed(arbitration_id):
+    return arbitration_id % 3 != 0
+
+
+def log_ids(paths):
+    return [path.name for path in paths]
+
+
+def test_samples_have_frames(logs):
+    for path in logs:
+        assert reference_frames(path), path.name
+
+
+@pytest.mark.parametrize('block_size', [7, 1024 * 1024])
+def test_same_frames_as_python_can(logs, block_size):
+    for path in logs:
+        frames, skipped_count = fast_frames(path, block_size=block_size)
+        assert frames == reference_frames(path), path.name
+        assert skipped_count == 0
+
+
+@pytest.mark.parametrize('block_size', [7, 1024 * 1024])
+def test_filtered_frames(logs, block_size):
+    for path in logs:
+        expected = reference_frames(path)
+        frames, skipped_count = fast_frames(path, frame_filter=is_listed,
+                                            block_size=block_size)
+        # The frames parsed by python-can are not filtered, the others are
+        # only counted
+        assert [frame for frame in frames if is_listed(frame.arbitration_id)] == \
+            [frame for frame in expected if is_listed(frame.arbitration_id)], path.name
+        assert len(frames) + skipped_count == len(expected), path.name
+        assert all(frame in expected for frame in frames), path.name
+
+
+def test_filter_skips_frames_of_synthetic_logs(logs):
+    # All the frames of these logs are parsed directly
+    for path in logs:
+        if path.stem == 'synthetic':
+            _, skipped_count = fast_frames(path, frame_filter=is_listed)
+            assert skipped_count == sum(not is_listed(frame.arbitration_id)
+                                        for frame in reference_frames(path)), path.name
@@ -0,0 +1,55 @@
+import pytest
+from cantools.database.can.signal import Signal
+from cantools.database.conversion import BaseConversion, LinearConversion
+
+import synthetic
+from logdata import field_typecode
+from outputs import export_outputs, new_export
+
+STORAGE_OPTIONS = [
+    dict(use_time_grouping=True),
+    dict(use_time_grouping=True, use_relative_time=True),
+    dict(use_time_grouping=False),
+    dict(use_time_grouping=False, use_sample_and_hold=True),
+    dict(use_time_grouping=False, use_sample_and_hold=True, use_relative_time=True),
+]
+
+
+@pytest.fixture(scope='module')
+def frames():
+    dbc = synthetic.make_dbc(8)
+    return dbc, list(synthetic.generate_frames(dbc, 3000, error_rate=0.05))
+
+
+def run_export(dbc, frames, output_dir, **kwargs):
+    export = new_export(dbc, **kwargs)
+    for frame in frames:
+        export.process_frame(frame, allow_truncated=True)
+    return export_outputs(export, output_dir)
+
+
+@pytest.mark.parametrize('options', STORAGE_OPTIONS, ids=lambda options: '-'.join(options))
+def test_columnar_storage_gives_same_outputs(frames, tmp_path, options):
+    dbc, frames = frames
+    expected = run_export(dbc, frames, tmp_path / 'rows', **options)
+    assert run_export(dbc, frames, tmp_path / 'columns', use_columnar_storage=True,
+                      **options) == expected
+    assert run_export(dbc, frames, tmp_path / 'batch', use_columnar_storage=True,
+                      use_batch_decoding=True, **options) == expected
+
+
+@pytest.mark.parametrize('conversion', [
+    BaseConversion.factory(1, 0, None, False),
+    BaseConversion.factory(2, -40, None, False),
+    BaseConversion.factory(2.0, 0.0, None, False),
+    BaseConversion.factory(0.5, 0, None, False),
+    BaseConversion.factory(2, 0, {1: 'On'}, False),
+    # Built by the versions of cantools decoding integral float scales to floats
+    LinearConversion(2.0, 0.0, False),
+    BaseConversion.factory(1, 0, None, True),
+], ids=repr)
+def test_typecode_matches_decoded_type(conversion):
+    length = 32 if conversion.is_float else 8
+    signal = Signal('Value', 0, length, conversion=conversion)
+    decoded = conversion.raw_to_scaled(1.0 if conversion.is_float else 3, False)
+    assert field_typecode(signal) == ('q' if isinstance(decoded, int) else 'd')
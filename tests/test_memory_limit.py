@@ -0,0 +1,41 @@
+import pytest
+
+import logexport
+import synthetic
+from outputs import export_outputs, new_export
+
+EXPORT_OPTIONS = [
+    dict(use_time_grouping=True),
+    dict(use_time_grouping=True, use_relative_time=True),
+    dict(use_time_grouping=False, use_sample_and_hold=True),
+]
+
+
+@pytest.fixture(scope='module')
+def frames():
+    dbc = synthetic.make_dbc(8)
+    return dbc, list(synthetic.generate_frames(dbc, 3000, error_rate=0.05))
+
+
+def run_export(dbc, frames, output_dir, **kwargs):
+    export = new_export(dbc, use_columnar_storage=True, **kwargs)
+    for frame in frames:
+        export.process_frame(frame, allow_truncated=True)
+    return export, export_outputs(export, output_dir)
+
+
+@pytest.mark.parametrize('options', EXPORT_OPTIONS, ids=['tree', 'relative', 'held'])
+def test_spilled_export_gives_same_outputs(frames, tmp_path, monkeypatch, options):
+    dbc, frames = frames
+    _, expected = run_export(dbc, frames, tmp_path / 'memory', **options)
+
+    # The groups are checked often enough to be spilled several times
+    monkeypatch.setattr(logexport, 'MEMORY_CHECK_INTERVAL', 100)
+    spill_dir = tmp_path / 'spill'
+    spill_dir.mkdir()
+    export, outputs = run_export(dbc, frames, tmp_path / 'spilled', memory_limit=8000,
+                                 spill_dir=spill_dir, **options)
+    assert export.spill_count > len(export.get_active_groups())
+    # Only the summary tells the groups were spilled
+    assert outputs['summary'].pop('spill')['row_count'] > 0
+    assert outputs == expected
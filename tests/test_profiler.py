@@ -0,0 +1,34 @@
+import time
+
+import synthetic
+from outputs import new_export
+from profiler import Profiler
+
+FLUSH_DURATION = 0.01
+
+
+def test_crc_batches_timed_once():
+    dbc = synthetic.make_dbc(4)
+    export = new_export(dbc, use_batch_decoding=True, batch_size=1000)
+    verifier = export.crc_verifier
+    # The CRC batches are then flushed by check_frame
+    verifier.batch_size = 16
+    flush = verifier.flush
+    flush_count = 0
+
+    def slow_flush():
+        nonlocal flush_count
+        flush_count += 1
+        time.sleep(FLUSH_DURATION)
+        flush()
+
+    verifier.flush = slow_flush
+    profiler = Profiler().attach(export)
+    for frame in synthetic.generate_frames(dbc, 500):
+        export.process_frame(frame, allow_truncated=True)
+    export.flush()
+
+    # Batches flushed by check_frame and by LogExport.flush
+    assert flush_count > 2
+    _, elapsed = profiler.listeners['CrcVerifier']
+    assert FLUSH_DURATION * flush_count <= elapsed < 1.5 * FLUSH_DURATION * flush_count
@@ -0,0 +1,75 @@
+import cantools
+import pytest
+
+import synthetic
+from batch_decoder import BatchDecoder
+from logexport import DbcFilter
+from selective_decoder import SelectiveDecoder
+from test_batch_decoder import fd_message, random_payloads, same_values
+
+
+def messages():
+    return synthetic.make_dbc(4).messages + [fd_message()]
+
+
+def accepted_subsets(msg):
+    # Single signals, every other signal, and the multiplexed signals alone,
+    # so that the multiplexers are mostly not accepted themselves
+    names = [s.name for s in msg.signals]
+    subsets = [{name} for name in names]
+    subsets.append(set(names[::2]))
+    subsets.append(set(names[1::2]))
+    muxed = {s.name for s in msg.signals if s.multiplexer_signal is not None}
+    if muxed:
+        subsets.append(muxed)
+    return subsets
+
+
+def expected_values(msg, dbc_filter, payload):
+    # Accepted values given by Message.decode, or None when it raises
+    # DecodeError
+    try:
+        decoded = msg.decode(payload, decode_choices=False)
+    except cantools.database.errors.DecodeError:
+        return None
+    return dbc_filter.keep_accepted_signals(msg, decoded)
+
+
+def check_decoded(msg, dbc_filter, payload, decoded):
+    expected = expected_values(msg, dbc_filter, payload)
+    if len(payload) < msg.length or expected is None:
+        # Left to Message.decode, so that the error raised is unchanged
+        assert decoded is None
+    else:
+        assert decoded is not None
+        assert same_values(dbc_filter.keep_accepted_signals(msg, decoded), expected)
+
+
+@pytest.mark.parametrize('msg', messages(), ids=lambda msg: msg.name)
+def test_decode_matches_accepted_signals(msg):
+    payloads = random_payloads(msg, 300, seed=msg.frame_id)
+    for signal_names in accepted_subsets(msg):
+        dbc_filter = DbcFilter(partly_accepted={msg.name: sorted(signal_names)})
+        decoder = SelectiveDecoder(msg, signal_names)
+        for payload in payloads:
+            check_decoded(msg, dbc_filter, payload, decoder.decode(payload))
+
+
+@pytest.mark.parametrize('msg', messages(), ids=lambda msg: msg.name)
+def test_batch_decode_matches_accepted_signals(msg):
+    payloads = random_payloads(msg, 300, seed=msg.frame_id + 1)
+    for signal_names in accepted_subsets(msg):
+        dbc_filter = DbcFilter(partly_accepted={msg.name: sorted(signal_names)})
+        results = BatchDecoder(msg, signal_names).decode(payloads)
+        for payload, decoded in zip(payloads, results):
+            check_decoded(msg, dbc_filter, payload, decoded)
+
+
+def test_unaccepted_multiplexer_is_decoded():
+    msg = fd_message()
+    decoder = SelectiveDecoder(msg, {'MuxedA'})
+    payload = bytes([1]) + bytes(63)
+    assert decoder.decode(payload) == {'Mux': 1, 'MuxedA': 0}
+    assert decoder.decode(bytes([2]) + bytes(63)) == {'Mux': 2}
+    # Multiplexer value selecting no signal
+    assert decoder.decode(bytes([0]) + bytes(63)) is None
@@ -0,0 +1,34 @@
+import pytest
+
+import synthetic
+from outputs import export_outputs, new_export
+
+EXPORT_OPTIONS = [
+    dict(use_time_grouping=True),
+    dict(use_time_grouping=True, use_relative_time=True),
+    dict(use_time_grouping=False),
+    dict(use_time_grouping=False, use_sample_and_hold=True),
+]
+
+
+@pytest.fixture(scope='module')
+def frames():
+    dbc = synthetic.make_dbc(8)
+    return dbc, list(synthetic.generate_frames(dbc, 3000, error_rate=0.05))
+
+
+def run_export(dbc, frames, output_dir, **kwargs):
+    export = new_export(dbc, **kwargs)
+    for frame in frames:
+        export.process_frame(frame, allow_truncated=True)
+    return export_outputs(export, output_dir)
+
+
+@pytest.mark.parametrize('options', EXPORT_OPTIONS, ids=['tree', 'relative', 'table', 'held'])
+@pytest.mark.parametrize('chunk_size', [1, 37, 10000])
+def test_streamed_export_gives_same_outputs(frames, tmp_path, options, chunk_size):
+    dbc, frames = frames
+    expected = run_export(dbc, frames, tmp_path / 'memory', **options)
+    # Small chunks, so that the values held by sample-and-hold span chunks
+    assert run_export(dbc, frames, tmp_path / 'streamed', stream_dir=tmp_path / 'staging',
+                      stream_chunk_size=chunk_size, **options) == expected
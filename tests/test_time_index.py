@@ -0,0 +1,38 @@
+import can
+import pytest
+
+import synthetic
+from fast_readers import FastASCReader, FastTRCReader
+from logexport import get_sha
+from time_index import TimeIndex
+
+READERS = {'asc': FastASCReader, 'trc': FastTRCReader, 'blf': can.BLFReader}
+
+
+@pytest.fixture(scope='module')
+def logs(tmp_path_factory):
+    _, logs = synthetic.write_dataset(tmp_path_factory.mktemp('logs'), 3000)
+    return logs
+
+
+@pytest.mark.parametrize('file_format', sorted(READERS))
+def test_index_sha_is_sha_of_log(logs, file_format):
+    data_file = logs[file_format]
+    # Small segments, so that the log is read in many ranges
+    index = TimeIndex(data_file, READERS[file_format], step=16 * 1024)
+    index.build(show_progress=False)
+    assert len(index.segments) > 1
+    assert index.sha256 == get_sha(data_file)
+    assert sum(segment.frame_count for segment in index.segments) == \
+        sum(1 for _ in READERS[file_format](str(data_file)))
+
+
+@pytest.mark.parametrize('file_format', sorted(READERS))
+def test_window_reads_frames_of_window(logs, file_format):
+    data_file = logs[file_format]
+    index = TimeIndex(data_file, READERS[file_format], step=16 * 1024)
+    index.build(show_progress=False)
+    frames = list(READERS[file_format](str(data_file)))
+    start, end = frames[1000].timestamp, frames[2000].timestamp
+    window = [frame.timestamp for frame in index.window_reader(start, end)]
+    assert window == [frame.timestamp for frame in frames if start <= frame.timestamp <= end]
@@ -0,0 +1,39 @@
+import contextlib
+import io
+import zipfile
+
+import pytest
+
+import synthetic
+from outputs import new_export
+from zip_export import write_groups_to_zip
+
+
+@pytest.fixture(scope='module')
+def groups():
+    dbc = synthetic.make_dbc(8)
+    export = new_export(dbc, use_columnar_storage=True)
+    for frame in synthetic.generate_frames(dbc, 3000):
+        export.process_frame(frame, allow_truncated=True)
+    groups = list(export.get_active_groups().values())
+    for group in groups:
+        group.remove_empty_columns()
+    return groups
+
+
+def archive_entries(path):
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        return [(info.filename, info.compress_type, archive.read(info))
+                for info in archive.infolist()]
+
+
+@pytest.mark.parametrize('workers', [2, 3, 8])
+def test_parallel_rendering_gives_same_archive(groups, tmp_path, workers):
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = write_groups_to_zip(groups, tmp_path / 'sequential.zip')
+        archive = write_groups_to_zip(groups, tmp_path / 'parallel.zip', workers=workers)
+    entries = archive_entries(archive)
+    assert len(entries) == len(groups)
+    assert entries == archive_entries(expected)
+    assert all(compress_type == zipfile.ZIP_DEFLATED for _, compress_type, _ in entries)